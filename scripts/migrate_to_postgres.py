@@ -346,7 +346,7 @@ KIND_SPECS: List[KindSpec] = [
              ("id", "player0_id", "player1_id", "locale", "rack0", "rack1",
               "irack0", "irack1", "score0", "score1", "to_move", "robot_level",
               "over", "timestamp", "ts_last_move", "moves", "prefs",
-              "tile_count", "elo0", "elo1", "elo0_adj", "elo1_adj",
+              "tile_count", "snapshot", "elo0", "elo1", "elo0_adj", "elo1_adj",
               "human_elo0", "human_elo1", "human_elo0_adj", "human_elo1_adj",
               "manual_elo0", "manual_elo1", "manual_elo0_adj", "manual_elo1_adj"),
              conflict=("id",), shard="uuid", delta_prop="ts_last_move"),
@@ -620,6 +620,7 @@ class Migrator:
             utc_ts(e.timestamp) or SENTINEL_TS, utc_ts(e.ts_last_move),
             Json([move_to_dict(m) for m in e.moves]),
             None if e.prefs is None else Json(e.prefs), e.tile_count,
+            None if e.snapshot is None else Json(e.snapshot),
             e.elo0, e.elo1, e.elo0_adj, e.elo1_adj,
             e.human_elo0, e.human_elo1, e.human_elo0_adj, e.human_elo1_adj,
             e.manual_elo0, e.manual_elo1, e.manual_elo0_adj, e.manual_elo1_adj,
@@ -28,6 +28,10 @@ from languages import Alphabet
 from skrafldb import Client, EloDict, EloModel, iter_q, Query, UserModel, GameModel
 from skrafluser import User
 from skraflgame import Game
+from skraflplayer import leftpart_cache_stats
+from movecache import best_move_cache_stats
+from robotengine import robot_engine_stats
+from wordbase import Wordbase
 
 
 def admin_usercount() -> Response:
@@ -250,11 +254,11 @@ def admin_loadgame() -> Response:
             moves=[
                 (
                     m.player,
-                    m.move.summary(game.state),
+                    m.summary,
                     m.rack,
                     Alphabet.format_timestamp(m.ts or now),
                 )
-                for m in game.moves
+                for m in game.move_records()
             ],
         )
 
@@ -299,3 +303,16 @@ def admin_loaduser() -> Response:
         )
 
     return jsonify(user=u)
+
+
+def admin_dawgstats() -> Response:
+    """Return the resident vocabularies and their node cache statistics,
+    as well as the statistics of the left part cache, the move engine
+    of the robots and the best move cache"""
+    return jsonify(
+        resident=Wordbase.resident(),
+        caches=Wordbase.cache_stats(),
+        leftparts=leftpart_cache_stats(),
+        robots=robot_engine_stats(),
+        bestmoves=best_move_cache_stats(),
+    )
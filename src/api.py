@@ -388,7 +388,7 @@ def wordcheck_api() -> ResponseType:
 
     # Check the words against the dictionary
     wdb = Wordbase.dawg_for_locale(locale)
-    valid = [(w, w in wdb) for w in words]
+    valid = list(zip(words, wdb.find_many(words)))
     ok = all(v[1] for v in valid)
     return jsonify(word=word, ok=ok, valid=valid)
 
@@ -333,6 +333,96 @@ SKIP_TRANSITION: bool = os.environ.get("SKIP_TRANSITION", "").lower() in (
     "yes",
 )
 
+# By default, the DAWG vocabulary files are memory-mapped read-only, so that
+# all gunicorn workers on an instance share one copy of each dictionary in
+# the OS page cache instead of each reading a private copy into memory.
+# Set DAWG_MMAP=false to read the files into per-process buffers instead.
+DAWG_MMAP: bool = os.environ.get("DAWG_MMAP", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Set DAWG_LAZY=true to load vocabularies on demand, the first time they
+# are requested, instead of loading all of them at startup. This suits
+# instances that only serve a few locales. In lazy mode, the vocabularies
+# of the locales listed in DAWG_HOT_LOCALES (comma-separated, defaulting
+# to DEFAULT_LOCALE) are loaded at startup and kept resident, and at most
+# DAWG_MAX_RESIDENT vocabularies (0 = no limit) stay loaded at any time,
+# the least recently used ones being evicted first.
+DAWG_LAZY: bool = os.environ.get("DAWG_LAZY", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+DAWG_HOT_LOCALES: List[str] = [
+    lc.strip()
+    for lc in os.environ.get("DAWG_HOT_LOCALES", DEFAULT_LOCALE).split(",")
+    if lc.strip()
+]
+DAWG_MAX_RESIDENT: int = int(os.environ.get("DAWG_MAX_RESIDENT", "0"))
+# Byte budget for the decoded node cache of each vocabulary. This should be
+# well above the working set of a move search with a blank-heavy rack
+# (some 7,500 nodes, or about 4.6 MB), or the cache will thrash.
+DAWG_NODE_CACHE_BYTES: int = int(
+    os.environ.get("DAWG_NODE_CACHE_BYTES", str(16 * 1024 * 1024))
+)
+# Set DAWG_DECODE=true to decode each vocabulary eagerly at load time into
+# a flat, array-backed node table, trading some load time and memory for
+# faster navigation. The node cache is not used for decoded vocabularies.
+DAWG_DECODE: bool = os.environ.get("DAWG_DECODE", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Set DAWG_GADDAG=true to generate robot moves from a GADDAG of each
+# vocabulary (resources/<vocab>.gaddag.bin.dawg, built by dawgbuilder.py)
+# instead of from the DAWG. The candidate moves are exactly the same;
+# vocabularies without a GADDAG file fall back to the DAWG. A GADDAG is
+# loaded along with its DAWG and evicted with it (see DAWG_MAX_RESIDENT).
+DAWG_GADDAG: bool = os.environ.get("DAWG_GADDAG", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# The left parts of word placements that are possible with recently seen
+# racks are cached by the robots (see skraflplayer.py) in each process, for
+# up to LEFTPART_CACHE_ENTRIES racks within an approximate byte budget of
+# LEFTPART_CACHE_BYTES
+LEFTPART_CACHE_ENTRIES: int = int(os.environ.get("LEFTPART_CACHE_ENTRIES", "4096"))
+LEFTPART_CACHE_BYTES: int = int(
+    os.environ.get("LEFTPART_CACHE_BYTES", str(64 * 1024 * 1024))
+)
+
+# Set ROBOT_ENGINE_WORKERS to a positive number to generate robot moves in
+# a pool of that many worker processes (see robotengine.py), instead of in
+# the request thread. A worker plays the best move that it has found within
+# ROBOT_ENGINE_TIMEOUT seconds; if the pool does not deliver a move in time,
+# the move is generated in the request thread.
+ROBOT_ENGINE_WORKERS: int = int(os.environ.get("ROBOT_ENGINE_WORKERS", "0"))
+ROBOT_ENGINE_TIMEOUT: float = float(os.environ.get("ROBOT_ENGINE_TIMEOUT", "10"))
+# A robot that has been generating moves for ROBOT_MOVE_TIME_LIMIT seconds
+# plays the best move found so far (0 = no limit). This should be well
+# below the request timeout of the web server.
+ROBOT_MOVE_TIME_LIMIT: float = float(os.environ.get("ROBOT_MOVE_TIME_LIMIT", "20"))
+
+# The best moves found in game review positions are cached (see movecache.py)
+# in each process, for up to BEST_MOVES_CACHE_ENTRIES positions (0 = no cache).
+# Set BEST_MOVES_CACHE_REDIS=true to also share them between processes
+# through Redis, where they expire after BEST_MOVES_CACHE_TTL seconds.
+BEST_MOVES_CACHE_ENTRIES: int = int(os.environ.get("BEST_MOVES_CACHE_ENTRIES", "4096"))
+BEST_MOVES_CACHE_REDIS: bool = os.environ.get(
+    "BEST_MOVES_CACHE_REDIS", ""
+).lower() in (
+    "1",
+    "true",
+    "yes",
+)
+BEST_MOVES_CACHE_TTL: int = int(
+    os.environ.get("BEST_MOVES_CACHE_TTL", str(7 * 24 * 60 * 60))
+)
+
 
 class Error:
     """Error codes returned from server APIs"""
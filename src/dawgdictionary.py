@@ -16,12 +16,16 @@
     The graph is pre-built using the code in dawgbuilder.py and stored
     in a text-based file to be loaded at run-time by DawgDictionary.
 
-    The main class supports three fundamental query functions:
+    The main class supports the following fundamental query functions:
 
     DawgDictionary.find(word)
         Returns True if the word is found in the dictionary, or False if not.
         The __contains__ operator is supported, so "'myword' in dawgdict" also works.
 
+    DawgDictionary.find_many(words)
+        Returns a list of booleans, one for each word, telling whether it is
+        found in the dictionary. The words are looked up in a single traversal.
+
     DawgDictionary.find_matches(pattern)
         Returns a list of words that match the pattern. The pattern can contain
         wildcards ('?'). For example, result = dawgdict.find_matches("ex???") returns
@@ -35,6 +39,10 @@
         returns a list of all words from 1 to 3 characters that can be constructed from
         the letters "s" and "e" and any one additional letter.
 
+    All of the above query functions, as well as cross-checks, also take into
+    account any DawgOverlay of words that have been added to or removed from
+    the dictionary at run time, after the graph was built.
+
     All of the above query functions are built on top of a generic DAWG navigation function:
 
     DawgDictionary.navigate(navigator)
@@ -51,6 +59,11 @@
     DawgDictionary.MatchNavigator(rack, minlen)
         A navigation class to find words matching a pattern. Used by DawgDictionary.find_matches()
 
+    If requested at load time, the packed graph is decoded up front into
+    a DawgNodeTable of flat array columns. Lookups and pattern matches then
+    walk integer letter codes, and other navigations avoid decoding nodes
+    on the fly.
+
     See also comments in dawgbuilder.py
 
     Test code for this module is found in dawgtester.py
@@ -59,13 +72,29 @@
 
 from __future__ import annotations
 
-from functools import lru_cache
 import struct
-from typing import Callable, Iterator, Optional, Tuple, List
+from array import array
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    List,
+    TypedDict,
+    Union,
+)
 
 import os
+import mmap
+import hashlib
 import threading
 import abc
+from collections import OrderedDict
 
 from alphabets import Alphabet
 
@@ -75,44 +104,505 @@ IterTuple = Tuple[str, int]
 PrefixNodes = Tuple[IterTuple, ...]
 TwoLetterListTuple = Tuple[List[str], List[str]]
 SortKeyFunc = Callable[[str], List[int]]
+# The letter codes of an edge prefix, with final bits, and its next node
+CodeEdge = Tuple[bytes, int]
+CodeEdgeFunc = Callable[[int], Iterator[CodeEdge]]
+# The packed DAWG is either a private byte buffer or a read-only
+# memory map of the DAWG file, shared between processes via the page cache
+DawgBuffer = Union[bytes, mmap.mmap]
+# An array indexed by node, where final nodes have bit 0x80 set
+FinalFlags = Union[DawgBuffer, bytearray]
+
+
+class NodeCacheStats(TypedDict):
+    """Statistics for a NodeCache"""
+
+    hits: int
+    misses: int
+    evictions: int
+    pinned: int
+    entries: int
+    bytes: int
+    max_bytes: int
 
 
 # Base project directory path
 BASE_PATH = os.path.join(os.path.dirname(__file__), "..")
 
+# Default byte budget for the decoded node cache of each dictionary.
+# A permutation search for a rack with two blanks visits some 7,500 nodes
+# (about 4.6 MB) of a typical vocabulary; the budget must comfortably
+# exceed that, or the cache thrashes.
+DEFAULT_NODE_CACHE_BYTES = 16 * 1024 * 1024
+
+# Separates the reversed and forward parts of the strings in a GADDAG
+GADDAG_SEPARATOR = "+"
+
+# Maximum number of memoized cross-check bit patterns per dictionary
+CROSSCHECK_MEMO_SIZE = 16 * 1024
+
+# Maximum number of GADDAG nodes whose edges are kept indexed by letter
+GADDAG_EDGE_CACHE_SIZE = 64 * 1024
+
+
+class DawgOverlay:
+    """A small set of changes to a packed DAWG, i.e. words that have been
+    added to it or removed from it since it was built. The query functions
+    of PackedDawgDictionary consult the overlay transparently, until the
+    changes are folded into a freshly built DAWG by dawgbuilder.py."""
+
+    def __init__(self, added: Iterable[str], removed: Iterable[str]) -> None:
+        self.added: FrozenSet[str] = frozenset(added)
+        self.removed: FrozenSet[str] = frozenset(removed)
+        # The added and removed words, sorted and grouped by length
+        self._added_by_len = self._by_length(self.added)
+        self._removed_by_len = self._by_length(self.removed)
+        self._digest: Optional[str] = None
+
+    @staticmethod
+    def _by_length(words: Iterable[str]) -> Dict[int, List[str]]:
+        """Group words by length"""
+        result: Dict[int, List[str]] = dict()
+        for w in sorted(words):
+            result.setdefault(len(w), []).append(w)
+        return result
+
+    @staticmethod
+    def _matches(pattern: str, words: Iterable[str]) -> List[str]:
+        """Return the words that match a pattern of the same length"""
+        return [
+            w for w in words if all(p == "?" or p == c for p, c in zip(pattern, w))
+        ]
+
+    @staticmethod
+    def _fits(rack: str, word: str) -> bool:
+        """Return True if the word can be formed from the rack,
+        which may contain '?' wildcards"""
+        blanks = rack.count("?")
+        for c in set(word):
+            excess = word.count(c) - rack.count(c)
+            if excess > 0:
+                blanks -= excess
+                if blanks < 0:
+                    return False
+        return True
+
+    def __bool__(self) -> bool:
+        """Return True if the overlay changes anything"""
+        return bool(self.added or self.removed)
+
+    def digest(self) -> str:
+        """Return a short hex digest of the added and removed words,
+        identifying this set of changes to the dictionary"""
+        if self._digest is None:
+            h = hashlib.blake2b(digest_size=8)
+            for words in (self._added_by_len, self._removed_by_len):
+                for length in sorted(words):
+                    h.update("\n".join(words[length]).encode("utf-8"))
+                    h.update(b"\0")
+                h.update(b"\1")
+            self._digest = h.hexdigest()
+        return self._digest
+
+    def added_of_length(self, length: int) -> Sequence[str]:
+        """Return the added words of the given length, in sorted order"""
+        return self._added_by_len.get(length, [])
+
+    def apply(self, word: str, found: bool) -> bool:
+        """Apply the overlay to the result of looking up a word in the graph"""
+        if found:
+            return word not in self.removed
+        return word in self.added
+
+    def apply_matches(self, pattern: str, result: List[str]) -> List[str]:
+        """Apply the overlay to the words in the graph that match a pattern"""
+        length = len(pattern)
+        if length in self._removed_by_len:
+            result = [w for w in result if w not in self.removed]
+        added = self._added_by_len.get(length)
+        if added:
+            result = result + self._matches(pattern, added)
+        return result
+
+    def apply_permutations(
+        self, rack: str, minlen: int, result: List[str]
+    ) -> List[str]:
+        """Apply the overlay to the permutations of a rack found in the graph"""
+        if self.removed:
+            result = [w for w in result if w not in self.removed]
+        added = [
+            w
+            for w in self.added
+            if minlen <= len(w) <= len(rack) and self._fits(rack, w)
+        ]
+        return result + added if added else result
+
+    def apply_crosscheck(
+        self, above: str, below: str, bits: int, codes: Dict[str, int]
+    ) -> int:
+        """Apply the overlay to a cross-check bit pattern, as returned
+        from PackedDawgDictionary.crosscheck_bits()"""
+        pattern = above + "?" + below
+        ix = len(above)
+        for w in self._matches(pattern, self._removed_by_len.get(len(pattern), [])):
+            bits &= ~(1 << codes[w[ix]])
+        for w in self._matches(pattern, self._added_by_len.get(len(pattern), [])):
+            bits |= 1 << codes[w[ix]]
+        return bits
+
 
 class PackedDawgDictionary:
     """Encapsulates a DAWG dictionary that is initialized from a packed
     binary file on disk and navigated as a byte buffer."""
 
-    def __init__(self, alphabet: Alphabet) -> None:
+    def __init__(
+        self, alphabet: Alphabet, cache_bytes: int = DEFAULT_NODE_CACHE_BYTES
+    ) -> None:
         # The packed byte buffer
-        self.b: Optional[bytes] = None
+        self.b: Optional[DawgBuffer] = None
         # Lock to ensure that only one thread loads the dictionary
         self._lock = threading.Lock()
         self.alphabet = alphabet
         self.sortkey = alphabet.sortkey
         self.coding = alphabet.coding
+        # Map letters to their codes in the packed graph
+        self._codes = {c: i for i, c in enumerate(alphabet.order)}
+        # Cache of decoded nodes, owned by this dictionary
+        self._node_cache = NodeCache(self, cache_bytes)
+        # Eagerly decoded node table, if requested at load time
+        self._table: Optional[DawgNodeTable] = None
+        # Memo of cross-check bit patterns, in least-recently-used order
+        self._crosschecks: OrderedDict[Tuple[str, str], int] = OrderedDict()
+        self._crosscheck_lock = threading.Lock()
         # Cached list of two letter words in this DAWG,
         # sorted by first letter and second letter
         self._two_letter: Tuple[List[str], List[str]] = ([], [])
-
-    def load(self, fname: str) -> None:
-        """Load a packed DAWG from a binary file"""
+        # Words added and removed at run time, if any
+        self._overlay: Optional[DawgOverlay] = None
+
+    def load(self, fname: str, use_mmap: bool = False, decode: bool = False) -> None:
+        """Load a packed DAWG from a binary file. If use_mmap is True,
+        the file is memory-mapped read-only instead of being read into
+        a private buffer, so that all processes that map the same file
+        share a single copy of it in the OS page cache. If decode is True,
+        the whole graph is decoded up front into a DawgNodeTable, which
+        is then used for all navigation."""
         with self._lock:
             # Ensure that we don't have multiple threads trying to load simultaneously
             if self.b is not None:
                 # Already loaded
                 return
-            # Quickly gulp the file contents into the byte buffer
             with open(fname, mode="rb") as fin:
-                self.b = fin.read()
+                if use_mmap:
+                    # Map the file into our address space; pages are
+                    # faulted in on demand as the graph is navigated.
+                    # The mapping stays valid after the file is closed.
+                    self.b = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    # Quickly gulp the file contents into the byte buffer
+                    self.b = fin.read()
+            if decode:
+                self._table = DawgNodeTable(self.b, self.coding)
+
+    @property
+    def is_mmapped(self) -> bool:
+        """Return True if the DAWG is backed by a memory-mapped file"""
+        return isinstance(self.b, mmap.mmap)
+
+    @property
+    def is_decoded(self) -> bool:
+        """Return True if the DAWG has been decoded into a node table"""
+        return self._table is not None
+
+    def node_edges(self, offset: int, depth: int) -> PrefixNodes:
+        """Return a tuple of (prefix, next node offset) for the edges
+        of the node at the given offset, at the given depth in the graph"""
+        return self._node_cache.get(offset, depth)
+
+    def cache_stats(self) -> NodeCacheStats:
+        """Return statistics for the decoded node cache"""
+        return self._node_cache.stats()
+
+    @property
+    def overlay(self) -> Optional[DawgOverlay]:
+        """Return the overlay of words added and removed at run time, if any"""
+        return self._overlay
+
+    def set_overlay(self, added: Iterable[str], removed: Iterable[str]) -> None:
+        """Set the words that are added to and removed from the dictionary
+        at run time, on top of the packed graph, replacing any previous
+        overlay. Added words that are already in the graph and removed
+        words that are not are disregarded, as are words with letters
+        outside the alphabet."""
+        codes = self._codes
+
+        def valid(word: str) -> bool:
+            return bool(word) and all(c in codes for c in word)
+
+        overlay = DawgOverlay(
+            (w for w in added if valid(w) and not self._find_graph(w)),
+            (w for w in removed if valid(w) and self._find_graph(w)),
+        )
+        with self._crosscheck_lock:
+            self._overlay = overlay if overlay else None
+            # Discard results that were calculated without the overlay
+            self._crosschecks.clear()
+            self._two_letter = ([], [])
 
     def find(self, word: str) -> bool:
-        """Look for a word in the graph, returning True if it is found or False if not"""
-        nav = FindNavigator(word)
-        self.navigate(nav)
-        return nav.is_found()
+        """Look for a word, returning True if it is found or False if not"""
+        overlay = self._overlay
+        if overlay is not None:
+            return overlay.apply(word, self._find_graph(word))
+        return self._find_graph(word)
+
+    def _find_graph(self, word: str) -> bool:
+        """Look for a word in the graph, disregarding any overlay"""
+        if self._table is not None:
+            return self._table.find(word)
+        if self.b is None:
+            return False
+        return self._find_packed(word)
+
+    def find_many(self, words: Sequence[str]) -> List[bool]:
+        """Look for several words in the graph at once, returning a list
+        with True for each word that is found and False for each that
+        is not. The words are walked together from the root, so that
+        shared prefixes and nodes are only traversed once."""
+        if self._table is not None:
+            find = self._table.find
+            result = [find(w) for w in words]
+        elif self.b is None:
+            result = [False] * len(words)
+        else:
+            found = self._find_many_packed(words)
+            result = [w in found for w in words]
+        overlay = self._overlay
+        if overlay is not None:
+            return [overlay.apply(w, f) for w, f in zip(words, result)]
+        return result
+
+    def _find_many_packed(self, words: Sequence[str]) -> Set[str]:
+        """Return the set of the given words that are found in the
+        packed byte buffer, walking it once for the whole batch"""
+        b = self.b
+        assert b is not None
+        codes = self._codes
+        unpack_from = _UINT32.unpack_from
+        found: Set[str] = set()
+        batch: List[Tuple[str, List[int]]] = []
+        for w in set(words):
+            try:
+                wcodes = [codes[c] for c in w]
+            except KeyError:
+                # Letter not in the alphabet
+                continue
+            if wcodes:
+                batch.append((w, wcodes))
+
+        def walk(offset: int, items: List[Tuple[str, List[int]]], depth: int) -> None:
+            """Match a batch of words, all of which share the first depth
+            letters, against the edges of the node at the given offset"""
+            # Group the words by their next letter
+            groups: Dict[int, List[Tuple[str, List[int]]]] = dict()
+            for item in items:
+                groups.setdefault(item[1][depth], []).append(item)
+            num_edges = b[offset] & 0x7F
+            offset += 1
+            for _ in range(num_edges):
+                if not groups:
+                    # All words have found their edge
+                    break
+                len_byte = b[offset]
+                offset += 1
+                if len_byte & 0x40:
+                    # Single character prefix, possibly with a final bit
+                    prefix = bytes((len_byte & 0xBF,))
+                else:
+                    prefix = b[offset : offset + (len_byte & 0x3F)]
+                    offset += len_byte & 0x3F
+                if prefix[-1] & 0x80:
+                    nextnode = 0
+                else:
+                    (nextnode,) = unpack_from(b, offset)
+                    offset += 4
+                group = groups.pop(prefix[0] & 0x7F, None)
+                if group is None:
+                    continue
+                last = len(prefix) - 1
+                onward: List[Tuple[str, List[int]]] = []
+                for w, wcodes in group:
+                    i = depth
+                    len_w = len(wcodes)
+                    for j, code in enumerate(prefix):
+                        if code & 0x7F != wcodes[i]:
+                            break
+                        i += 1
+                        if i == len_w:
+                            # End of the word: it is found if this character
+                            # is marked final, or if it ends the prefix
+                            # and the next node is final
+                            if code & 0x80 or (j == last and b[nextnode] & 0x80):
+                                found.add(w)
+                            break
+                    else:
+                        # The word goes on beyond this edge
+                        if nextnode:
+                            onward.append((w, wcodes))
+                if onward:
+                    walk(nextnode, onward, depth + last + 1)
+
+        if batch:
+            walk(0, batch, 0)
+        return found
+
+    def crosscheck_bits(self, above: str, below: str) -> int:
+        """Return a bit pattern of the letters that can be placed between
+        the given fragments, i.e. for which above + letter + below is a
+        word in the dictionary. The bits are as in Alphabet.letter_bit.
+        Results are memoized, since the same fragments tend to recur
+        across axes, moves and games."""
+        key = (above, below)
+        memo = self._crosschecks
+        bits = memo.get(key)
+        if bits is not None:
+            try:
+                memo.move_to_end(key)
+            except KeyError:
+                # Evicted by another thread in the meantime: no problem
+                pass
+            return bits
+        codes = self._codes
+        try:
+            pattern = [codes[c] for c in above] + [-1] + [codes[c] for c in below]
+        except KeyError:
+            # Letter not in the alphabet
+            return 0
+        if self.b is None:
+            return 0
+        overlay = self._overlay
+        bits = _match_bits(*self.graph(), pattern)
+        if overlay is not None:
+            bits = overlay.apply_crosscheck(above, below, bits, codes)
+        with self._crosscheck_lock:
+            if overlay is not self._overlay:
+                # The overlay was changed in the meantime: don't memoize
+                return bits
+            memo[key] = bits
+            if len(memo) > CROSSCHECK_MEMO_SIZE:
+                memo.popitem(last=False)
+        return bits
+
+    def graph(self) -> Tuple[CodeEdgeFunc, FinalFlags]:
+        """Return a function that enumerates the edges of a node as
+        letter codes, and the final flags of the nodes, for walking
+        the graph without navigators. Node 0 is the root."""
+        if self._table is not None:
+            return self._table.edges, self._table.node_final
+        assert self.b is not None
+        return self._packed_edges, self.b
+
+    def _packed_edges(self, offset: int) -> Iterator[CodeEdge]:
+        """A generator for yielding the letter codes and next node offset
+        of each edge of the node at the given offset in the packed buffer"""
+        b = self.b
+        assert b is not None
+        num_edges = b[offset] & 0x7F
+        offset += 1
+        for _ in range(num_edges):
+            len_byte = b[offset]
+            offset += 1
+            if len_byte & 0x40:
+                # Single character prefix, possibly with a final bit
+                prefix = bytes((len_byte & 0xBF,))
+            else:
+                len_byte &= 0x3F
+                prefix = b[offset : offset + len_byte]
+                offset += len_byte
+            if prefix[-1] & 0x80:
+                yield prefix, 0
+            else:
+                yield prefix, _UINT32.unpack_from(b, offset)[0]
+                offset += 4
+
+    def _find_packed(self, word: str) -> bool:
+        """Look for a word by walking the packed byte buffer directly.
+        This gives the same result as navigating with a FindNavigator,
+        but avoids the navigator callbacks and the decoding of prefixes
+        into strings, since find() is by far the most frequently
+        called query function."""
+        b = self.b
+        assert b is not None
+        codes = self._codes
+        try:
+            wcodes = [codes[c] for c in word]
+        except KeyError:
+            # Letter not in the alphabet
+            return False
+        len_w = len(wcodes)
+        if len_w == 0:
+            return False
+        unpack_from = _UINT32.unpack_from
+        i = 0
+        offset = 0
+        while True:
+            # Look for the edge that starts with the next letter of the word
+            c = wcodes[i]
+            num_edges = b[offset] & 0x7F
+            offset += 1
+            for _ in range(num_edges):
+                len_byte = b[offset]
+                offset += 1
+                if len_byte & 0x40:
+                    # Single character prefix
+                    if len_byte & 0x3F == c:
+                        break
+                    if not len_byte & 0x80:
+                        # Skip the next node offset
+                        offset += 4
+                    continue
+                len_byte &= 0x3F
+                if b[offset] & 0x7F == c:
+                    break
+                offset += len_byte
+                if not b[offset - 1] & 0x80:
+                    offset += 4
+            else:
+                # No edge matches the word
+                return False
+            if len_byte & 0x40:
+                # Matched a single character prefix
+                i += 1
+                if len_byte & 0x80:
+                    # No next node, and the word is final here
+                    return i == len_w
+                (nextnode,) = unpack_from(b, offset)
+                if i == len_w:
+                    return bool(b[nextnode] & 0x80)
+            else:
+                # Match the rest of a multi-character prefix
+                last = offset + len_byte - 1
+                for j in range(offset, last + 1):
+                    code = b[j]
+                    if code & 0x7F != wcodes[i]:
+                        return False
+                    i += 1
+                    if i == len_w:
+                        # End of the word: it is found if this character
+                        # is marked final, or if it ends the prefix
+                        # and the next node is final
+                        if code & 0x80:
+                            return True
+                        if j < last:
+                            return False
+                        (nextnode,) = unpack_from(b, last + 1)
+                        return bool(b[nextnode] & 0x80)
+                if b[last] & 0x80:
+                    # No next node, but the word goes on
+                    return False
+                (nextnode,) = unpack_from(b, last + 1)
+            # Continue with the next node
+            offset = nextnode
 
     def __contains__(self, word: str) -> bool:
         """Enable simple lookup syntax: "word" in dawgdict"""
@@ -131,9 +621,18 @@ class PackedDawgDictionary:
         The pattern contains characters and '?'-signs denoting wildcards.
         Characters are matched exactly, while the wildcards match any character.
         """
-        nav = MatchNavigator(self.sortkey, pattern, sort)
-        self.navigate(nav)
-        return nav.result()
+        overlay = self._overlay
+        if self._table is not None:
+            result = self._table.find_matches(pattern)
+        else:
+            nav = MatchNavigator(self.sortkey, pattern, sort and overlay is None)
+            self.navigate(nav)
+            result = nav.result()
+        if overlay is not None:
+            result = overlay.apply_matches(pattern, result)
+        if sort and (self._table is not None or overlay is not None):
+            result.sort(key=self.sortkey)
+        return result
 
     def find_permutations(self, rack: str, minlen: int = 0) -> List[str]:
         """Returns a list of legal permutations of a rack of letters.
@@ -142,9 +641,16 @@ class PackedDawgDictionary:
         Question marks should be used carefully as they can
         yield very large result sets.
         """
-        nav = PermutationNavigator(self.sortkey, rack, minlen)
+        nav = PermutationNavigator(
+            self.sortkey, CountedRack(rack, self.alphabet), minlen
+        )
         self.navigate(nav)
-        return nav.result()
+        result = nav.result()
+        overlay = self._overlay
+        if overlay is not None:
+            result = overlay.apply_permutations(rack, minlen, result)
+            result.sort(key=lambda x: (-len(x), self.sortkey(x)))
+        return result
 
     def navigate(self, nav: Navigator) -> None:
         """A generic function to navigate through the DAWG under
@@ -165,10 +671,14 @@ class PackedDawgDictionary:
             if there is no need to visit other edges
         def done()
             called when the navigation is completed
+
+        Note that the navigation covers the packed graph only, not any overlay.
         """
         if self.b is None:
             # No graph: no navigation
             nav.done()
+        elif self._table is not None:
+            TableNavigation(nav, self, self._table).go()
         else:
             Navigation(nav, self).go()
 
@@ -178,7 +688,10 @@ class PackedDawgDictionary:
         """Continue a previous navigation of the DAWG, using saved
         state information"""
         assert self.b is not None
-        Navigation(nav, self).resume(prefix, nextnode, leftpart)
+        if self._table is not None:
+            TableNavigation(nav, self, self._table).resume(prefix, nextnode, leftpart)
+        else:
+            Navigation(nav, self).resume(prefix, nextnode, leftpart)
 
     def two_letter_words(self) -> TwoLetterListTuple:
         """Return the two letter words in this DAWG,
@@ -242,6 +755,112 @@ class Navigator(abc.ABC):
         pass
 
 
+class RackMoves(Dict[int, Dict[str, int]]):
+    """The moves out of the states of a CountedRack, by state number.
+    The moves out of a state are found when it is first looked up."""
+
+    __slots__ = ("_rack",)
+
+    def __init__(self, rack: CountedRack) -> None:
+        super().__init__()
+        self._rack = rack
+
+    def __missing__(self, state: int) -> Dict[str, int]:
+        return self._rack._expand(state)
+
+
+class CountedRack:
+    """A rack of tiles, held as a count of each letter and of blank
+    tiles ('?'), for use by navigators. Each combination of counts
+    that is reached by taking tiles from the rack is a numbered state,
+    the full rack being state 0. States are created as they are reached,
+    so that only the combinations that a navigation actually visits are
+    ever enumerated. For each state, the following tables give:
+
+    moves[state]
+        a dict mapping each letter that can be taken from the rack
+        to the state after taking it, where a blank tile is only
+        taken if the letter itself is not in the rack
+    bits[state]
+        a bit pattern of the letters that can be taken, i.e. all
+        letters if there is a blank tile in the rack
+    size[state]
+        the number of tiles left in the rack
+
+    A navigator thus takes a tile with a single dict lookup, and returns
+    it simply by going back to a previous state, which is an int."""
+
+    def __init__(self, rack: str, alphabet: Alphabet) -> None:
+        self._order = order = alphabet.order
+        self._letter_bit = alphabet.letter_bit
+        self._all_bits = alphabet.all_bits_set()
+        # The distinct letters in the rack, in alphabetical order
+        self._letters = [c for c in order if c in rack]
+        self._states: List[Tuple[int, ...]] = []
+        self._index: Dict[Tuple[int, ...], int] = {}
+        self.moves = RackMoves(self)
+        self.bits: List[int] = []
+        self.size: List[int] = []
+        # Racks may be shared between threads, e.g. in the left part
+        # cache, so states are created under a lock
+        self._lock = threading.Lock()
+        # The counts of the letters, followed by the count of blank tiles
+        self._state_of(
+            tuple(rack.count(c) for c in self._letters) + (rack.count("?"),)
+        )
+
+    def _state_of(self, counts: Tuple[int, ...]) -> int:
+        """Return the number of the state with the given counts,
+        creating it if required. Assumes that the caller holds the
+        lock, or is the constructor."""
+        state = self._index.get(counts)
+        if state is None:
+            state = self._index[counts] = len(self._states)
+            self._states.append(counts)
+            if counts[-1]:
+                bits = self._all_bits
+            else:
+                letter_bit = self._letter_bit
+                bits = 0
+                for c, n in zip(self._letters, counts):
+                    if n:
+                        bits |= letter_bit[c]
+            self.bits.append(bits)
+            self.size.append(sum(counts))
+        return state
+
+    def _expand(self, state: int) -> Dict[str, int]:
+        """Find the moves out of a state, creating the states that
+        they lead to, and store them in self.moves"""
+        with self._lock:
+            # Check again, now that we hold the lock
+            moves = self.moves.get(state)
+            if moves is not None:
+                return moves
+            counts = self._states[state]
+            moves = {}
+            for ix, c in enumerate(self._letters):
+                if counts[ix]:
+                    moves[c] = self._state_of(
+                        counts[:ix] + (counts[ix] - 1,) + counts[ix + 1 :]
+                    )
+            blanks = counts[-1]
+            if blanks:
+                after_blank = self._state_of(counts[:-1] + (blanks - 1,))
+                for c in self._order:
+                    if c not in moves:
+                        moves[c] = after_blank
+            self.moves[state] = moves
+            return moves
+
+    def contents(self, state: int) -> str:
+        """Return the tiles in the rack in the given state, as a string"""
+        counts = self._states[state]
+        return "".join(c * n for c, n in zip(self._letters, counts)) + (
+            "?" * counts[-1]
+        )
+
+
 class FindNavigator(Navigator):
     """A navigation class to be used with DawgDictionary.navigate()
     to find a particular word in the dictionary by exact match"""
@@ -289,10 +908,15 @@ class PermutationNavigator(Navigator):
     to find all permutations of a rack
     """
 
-    def __init__(self, sortkey: SortKeyFunc, rack: str, minlen: int = 0) -> None:
+    def __init__(
+        self, sortkey: SortKeyFunc, rack: CountedRack, minlen: int = 0
+    ) -> None:
         super().__init__()
-        self._rack = rack
-        self._stack: List[str] = []
+        self._moves = rack.moves
+        self._size = rack.size
+        # The state of the rack, starting out full
+        self._rack = 0
+        self._stack: List[int] = []
         self._result: List[str] = []
         self._minlen = minlen
         self._sortkey = sortkey
@@ -301,30 +925,26 @@ class PermutationNavigator(Navigator):
         """Returns True if the edge should be entered or False if not"""
         # Follow all edges that match a letter in the rack
         # (which can be '?', matching all edges)
-        rack = self._rack
-        if not ((firstchar in rack) or ("?" in rack)):
+        if firstchar not in self._moves[self._rack]:
             return False
         # Fit: save our rack and move into the edge
-        self._stack.append(rack)
+        self._stack.append(self._rack)
         return True
 
     def accepting(self) -> bool:
         """Returns False if the navigator does not want more characters"""
         # Continue as long as there is something left on the rack
-        return bool(self._rack)
+        return self._size[self._rack] > 0
 
     def accepts(self, newchar: str) -> bool:
         """Returns True if the navigator will accept the new character"""
-        rack = self._rack
-        exactmatch = newchar in rack
-        if (not exactmatch) and ("?" not in rack):
+        rack = self._moves[self._rack].get(newchar)
+        if rack is None:
             # Can't continue with this prefix - we no longer have rack letters matching it
             return False
-        # We're fine with this: accept the character and remove from the rack
-        if exactmatch:
-            self._rack = rack.replace(newchar, "", 1)
-        else:
-            self._rack = rack.replace("?", "", 1)
+        # We're fine with this: accept the character and remove it
+        # (or a wildcard) from the rack
+        self._rack = rack
         return True
 
     def accept(self, matched: str, final: bool) -> None:
@@ -416,6 +1036,80 @@ class MatchNavigator(Navigator):
 _UINT32 = struct.Struct("<L")
 
 
+class NodeCache:
+    """A cache of decoded DAWG nodes, owned by a single dictionary.
+    Nodes near the root of the graph, which are visited by practically
+    every navigation, are pinned in the cache. Deeper nodes are kept
+    in least-recently-used order, within an approximate byte budget."""
+
+    # Nodes reached by fewer than this many letters are pinned
+    PIN_DEPTH = 2
+    # Approximate memory footprint of a cached node tuple, and of each edge
+    NODE_BYTES = 120
+    EDGE_BYTES = 110
+
+    def __init__(self, pd: PackedDawgDictionary, max_bytes: int) -> None:
+        self._pd = pd
+        self._max_bytes = max_bytes
+        self._pinned: Dict[int, PrefixNodes] = dict()
+        self._lru: OrderedDict[int, PrefixNodes] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        # Lock for modifications of the LRU list; lookups don't need it
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _size(cls, edges: PrefixNodes) -> int:
+        """Return the approximate memory footprint of a decoded node"""
+        return cls.NODE_BYTES + sum(cls.EDGE_BYTES + len(p) for p, _ in edges)
+
+    def get(self, offset: int, depth: int) -> PrefixNodes:
+        """Return the decoded edges of the node at the given offset"""
+        edges = self._pinned.get(offset)
+        if edges is not None:
+            self._hits += 1
+            return edges
+        lru = self._lru
+        edges = lru.get(offset)
+        if edges is not None:
+            self._hits += 1
+            try:
+                lru.move_to_end(offset)
+            except KeyError:
+                # Evicted by another thread in the meantime: no problem
+                pass
+            return edges
+        self._misses += 1
+        edges = tuple(Navigation._iter_from_node(self._pd, offset))
+        if depth < self.PIN_DEPTH:
+            self._pinned[offset] = edges
+            return edges
+        size = self._size(edges)
+        with self._lock:
+            if offset not in lru:
+                lru[offset] = edges
+                self._bytes += size
+                while self._bytes > self._max_bytes and len(lru) > 1:
+                    _, evicted = lru.popitem(last=False)
+                    self._bytes -= self._size(evicted)
+                    self._evictions += 1
+        return edges
+
+    def stats(self) -> NodeCacheStats:
+        """Return the hit, miss and eviction counts, and the cache size"""
+        return NodeCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            pinned=len(self._pinned),
+            entries=len(self._lru),
+            bytes=self._bytes,
+            max_bytes=self._max_bytes,
+        )
+
+
 class Navigation:
     """Manages the state for a navigation while it is in progress"""
 
@@ -425,7 +1119,7 @@ class Navigation:
         # The DAWG dictionary we are navigating
         self._pd = pd
         assert pd.b is not None
-        self._b = pd.b
+        self._b: FinalFlags = pd.b
         # If the navigator implements accept_resumable(),
         # note it and call it with additional state information instead of
         # plain accept()
@@ -459,18 +1153,12 @@ class Navigation:
                 offset += 4
             yield prefix, nextnode
 
-    @staticmethod
-    @lru_cache(maxsize=8 * 1024)  # 8K entries seems to be plenty
-    def _tuple_from_node(pd: PackedDawgDictionary, offset: int) -> PrefixNodes:
-        """Return a cached tuple of prefixes and next node offsets along an edge"""
-        return tuple(Navigation._iter_from_node(pd, offset))
-
     def _navigate_from_node(self, offset: int, matched: str) -> None:
         """Starting from a given node, navigate outgoing edges"""
         # Go through the edges of this node and follow the ones
         # okayed by the navigator
         nav = self._nav
-        for prefix, nextnode in Navigation._tuple_from_node(self._pd, offset):
+        for prefix, nextnode in self._pd.node_edges(offset, len(matched)):
             if nav.push_edge(prefix[0]):
                 # This edge is a candidate: navigate through it
                 self._navigate_from_edge(prefix, nextnode, matched)
@@ -534,14 +1222,308 @@ class Navigation:
         """Resume navigation from a previously saved state"""
         self._navigate_from_edge(prefix, nextnode, matched)
 
-"""
-# Debug instrumentation:
-# Create a thread that runs every 30 seconds and logs the
-# cache statistics for the Navigation._tuple_from_node() method
-def _log_cache_stats() -> None:
-    while True:
-        time.sleep(30)
-        logging.info(Navigation._tuple_from_node.cache_info())
-
-threading.Thread(target=_log_cache_stats, daemon=True).start()
-"""
+
+class DawgNodeTable:
+    """The nodes and edges of a packed DAWG, eagerly decoded into flat
+    array columns. Nodes are numbered in the order in which they occur
+    in the packed buffer, the root being node 0. Since no edge leads
+    back to the root, a next node index of 0 means that an edge has
+    no continuation, just as offset 0 does in the packed format."""
+
+    # Array type code for the index columns: unsigned 32-bit ints on all
+    # supported platforms, whereas "L" is 64 bits wide on 64-bit Linux
+    INDEX_TYPE = "I"
+
+    def __init__(self, b: DawgBuffer, coding: Dict[int, str]) -> None:
+        # Index of the first edge of each node, plus a final sentinel
+        self.node_edges = array(self.INDEX_TYPE)
+        # 0x80 for final nodes, 0 otherwise, as in the packed node header
+        self.node_final = bytearray()
+        # Letter code of the first character of each edge
+        self.edge_letter = bytearray()
+        # Start of each edge's letter codes within self.codes, plus a sentinel
+        self.edge_codes = array(self.INDEX_TYPE)
+        # Index of the node that each edge leads to, or 0 if none
+        self.edge_next = array(self.INDEX_TYPE)
+        # The letter codes of all edge prefixes, with the final bit (0x80)
+        # set on characters that complete a word
+        self.codes = bytearray()
+        # The decoded prefix string of each edge, in the form that
+        # Navigation expects; identical prefixes share a single string
+        self.prefixes: List[str] = []
+        # Map letters to codes and vice versa
+        self.letters = [c for i, c in sorted(coding.items()) if i < 0x80]
+        self.index = {c: i for i, c in enumerate(self.letters)}
+        self._decode(b, coding)
+
+    def _decode(self, b: DawgBuffer, coding: Dict[int, str]) -> None:
+        """Decode the entire packed buffer, node by node"""
+        node_edges = self.node_edges
+        node_final = self.node_final
+        edge_letter = self.edge_letter
+        edge_codes = self.edge_codes
+        codes = self.codes
+        prefixes = self.prefixes
+        interned: Dict[str, str] = dict()
+        # Map node offsets to node indices, and collect
+        # next node offsets for subsequent translation
+        node_index: Dict[int, int] = dict()
+        next_offsets: List[int] = []
+        offset = 0
+        len_b = len(b)
+        while offset < len_b:
+            node_index[offset] = len(node_final)
+            header = b[offset]
+            offset += 1
+            node_final.append(header & 0x80)
+            node_edges.append(len(next_offsets))
+            for _ in range(header & 0x7F):
+                edge_codes.append(len(codes))
+                len_byte = b[offset]
+                offset += 1
+                if len_byte & 0x40:
+                    # Single character, possibly with a final bit
+                    codes.append(len_byte & 0xBF)
+                    prefix = coding[len_byte & 0x3F]
+                else:
+                    len_byte &= 0x3F
+                    codes += b[offset : offset + len_byte]
+                    prefix = "".join(coding[b[offset + j]] for j in range(len_byte))
+                    offset += len_byte
+                edge_letter.append(codes[edge_codes[-1]] & 0x7F)
+                if b[offset - 1] & 0x80:
+                    next_offsets.append(0)
+                else:
+                    (nextnode,) = _UINT32.unpack_from(b, offset)
+                    next_offsets.append(nextnode)
+                    offset += 4
+                prefixes.append(interned.setdefault(prefix, prefix))
+        node_edges.append(len(next_offsets))
+        edge_codes.append(len(codes))
+        self.edge_next = array(
+            self.INDEX_TYPE, (node_index[n] if n else 0 for n in next_offsets)
+        )
+
+    def edges(self, node: int) -> Iterator[CodeEdge]:
+        """A generator for yielding the letter codes and next node index
+        of each edge of the given node"""
+        codes = self.codes
+        edge_codes = self.edge_codes
+        edge_next = self.edge_next
+        for edge in range(self.node_edges[node], self.node_edges[node + 1]):
+            yield codes[edge_codes[edge] : edge_codes[edge + 1]], edge_next[edge]
+
+    def _encode(self, word: str) -> Optional[List[int]]:
+        """Convert a word to a list of letter codes, mapping '?' to -1.
+        Returns None if the word contains letters outside the alphabet."""
+        index = self.index
+        try:
+            return [-1 if c == "?" else index[c] for c in word]
+        except KeyError:
+            return None
+
+    def find(self, word: str) -> bool:
+        """Return True if the word is found in the graph"""
+        wcodes = self._encode(word)
+        if not wcodes or -1 in wcodes:
+            return False
+        node_edges = self.node_edges
+        edge_letter = self.edge_letter
+        edge_codes = self.edge_codes
+        codes = self.codes
+        len_w = len(wcodes)
+        node = 0
+        i = 0
+        while True:
+            # Find the edge out of this node that starts with the next letter
+            c = wcodes[i]
+            for edge in range(node_edges[node], node_edges[node + 1]):
+                if edge_letter[edge] == c:
+                    break
+            else:
+                return False
+            # Follow the edge as far as the word goes
+            end = edge_codes[edge + 1]
+            for j in range(edge_codes[edge], end):
+                code = codes[j]
+                if code & 0x7F != wcodes[i]:
+                    return False
+                i += 1
+                if i == len_w:
+                    # The word is complete: is this a final position?
+                    if code & 0x80:
+                        return True
+                    return j == end - 1 and bool(
+                        self.node_final[self.edge_next[edge]]
+                    )
+            node = self.edge_next[edge]
+            if node == 0:
+                return False
+
+    def find_matches(self, pattern: str) -> List[str]:
+        """Return a list of the words that match the pattern, which may
+        contain '?' wildcards, in graph order"""
+        pcodes = self._encode(pattern)
+        result: List[str] = []
+        if not pcodes:
+            return result
+        node_edges = self.node_edges
+        node_final = self.node_final
+        edge_letter = self.edge_letter
+        edge_codes = self.edge_codes
+        edge_next = self.edge_next
+        codes = self.codes
+        letters = self.letters
+        len_p = len(pcodes)
+
+        def walk(node: int, matched: str, i: int) -> None:
+            first = pcodes[i]
+            for edge in range(node_edges[node], node_edges[node + 1]):
+                if first >= 0 and edge_letter[edge] != first:
+                    continue
+                m = matched
+                k = i
+                end = edge_codes[edge + 1]
+                for j in range(edge_codes[edge], end):
+                    code = codes[j]
+                    c = code & 0x7F
+                    if pcodes[k] >= 0 and pcodes[k] != c:
+                        break
+                    m += letters[c]
+                    k += 1
+                    if k == len_p:
+                        if code & 0x80 or (
+                            j == end - 1 and node_final[edge_next[edge]]
+                        ):
+                            result.append(m)
+                        break
+                else:
+                    # Went through the entire edge: continue with the next node
+                    if edge_next[edge]:
+                        walk(edge_next[edge], m, k)
+                if first >= 0:
+                    # Only one edge can start with a given letter
+                    break
+
+        walk(0, "", 0)
+        return result
+
+
+def _match_bits(edges: CodeEdgeFunc, final: FinalFlags, pattern: List[int]) -> int:
+    """Match a pattern of letter codes, containing a single wildcard (-1),
+    against a graph whose nodes are enumerated by the edges function
+    and whose final nodes have bit 0x80 set in the final array.
+    Return a bit pattern of the letters that the wildcard can stand for."""
+    len_p = len(pattern)
+    bits = 0
+
+    def walk(node: int, i: int, letter: int) -> None:
+        nonlocal bits
+        first = pattern[i]
+        for prefix, nextnode in edges(node):
+            if first >= 0 and prefix[0] & 0x7F != first:
+                continue
+            last = len(prefix) - 1
+            k = i
+            ltr = letter
+            for j, code in enumerate(prefix):
+                c = code & 0x7F
+                if pattern[k] < 0:
+                    # The wildcard position: note the letter
+                    ltr = c
+                elif pattern[k] != c:
+                    break
+                k += 1
+                if k == len_p:
+                    if code & 0x80 or (j == last and final[nextnode] & 0x80):
+                        bits |= 1 << ltr
+                    break
+            else:
+                # Went through the entire edge: continue with the next node
+                if nextnode:
+                    walk(nextnode, k, ltr)
+            if first >= 0:
+                # Only one edge can start with a given letter
+                break
+
+    walk(0, 0, -1)
+    return bits
+
+
+class TableNavigation(Navigation):
+    """Manages a navigation through a DawgNodeTable. Navigators see
+    exactly the same sequence of calls as with the packed byte buffer,
+    but next nodes are identified by node indices instead of offsets."""
+
+    def __init__(
+        self, nav: Navigator, pd: PackedDawgDictionary, table: DawgNodeTable
+    ) -> None:
+        super().__init__(nav, pd)
+        self._table = table
+        # Navigation checks the finality of a next node via
+        # self._b[nextnode] & 0x80, which works for node_final as well
+        self._b = table.node_final
+
+    def _navigate_from_node(self, offset: int, matched: str) -> None:
+        """Starting from a given node, navigate outgoing edges"""
+        nav = self._nav
+        table = self._table
+        prefixes = table.prefixes
+        edge_next = table.edge_next
+        for edge in range(table.node_edges[offset], table.node_edges[offset + 1]):
+            prefix = prefixes[edge]
+            if nav.push_edge(prefix[0]):
+                # This edge is a candidate: navigate through it
+                self._navigate_from_edge(prefix, edge_next[edge], matched)
+                if not nav.pop_edge():
+                    # Short-circuit and finish the loop if pop_edge() returns False
+                    break
+
+
+class PackedGaddagDictionary(PackedDawgDictionary):
+    """A GADDAG, i.e. a graph that allows words to be grown in both
+    directions from any letter. It is stored in the same packed format
+    as a DAWG, built by dawgbuilder.py. For each word w of length n, the
+    graph contains the strings reversed(w[:i]) + GADDAG_SEPARATOR + w[i:]
+    for 1 <= i < n, and reversed(w). The separator has the letter code
+    that follows the last letter of the alphabet."""
+
+    def __init__(
+        self, alphabet: Alphabet, cache_bytes: int = DEFAULT_NODE_CACHE_BYTES
+    ) -> None:
+        super().__init__(alphabet, cache_bytes)
+        # The letter code of the separator
+        self.separator = len(alphabet.order)
+        self.coding = dict(alphabet.coding)
+        self.coding[self.separator] = GADDAG_SEPARATOR
+        self.coding[self.separator | 0x80] = GADDAG_SEPARATOR + "|"
+        self._codes[GADDAG_SEPARATOR] = self.separator
+        # Edges of recently visited nodes, indexed by their first letter code
+        self._edge_maps: Dict[int, Dict[int, CodeEdge]] = dict()
+
+    def edge_map(self, node: int) -> Dict[int, CodeEdge]:
+        """Return the edges of a node as a dictionary keyed by the
+        letter code that starts each edge. Move generation visits the
+        same nodes over and over, looking for a few particular letters,
+        so the dictionaries are cached. The cache is simply emptied
+        when it grows too large."""
+        emap = self._edge_maps.get(node)
+        if emap is None:
+            edges, _ = self.graph()
+            emap = {
+                prefix[0] & 0x7F: (prefix, nextnode) for prefix, nextnode in edges(node)
+            }
+            if len(self._edge_maps) >= GADDAG_EDGE_CACHE_SIZE:
+                self._edge_maps.clear()
+            self._edge_maps[node] = emap
+        return emap
+
+    @staticmethod
+    def strings(word: str) -> List[str]:
+        """Return the strings that represent a word in a GADDAG"""
+        result = [
+            word[i - 1 :: -1] + GADDAG_SEPARATOR + word[i:]
+            for i in range(1, len(word))
+        ]
+        result.append(word[::-1])
+        return result
@@ -235,6 +235,10 @@ class GameEntity:
     def tile_count(self) -> Optional[int]:
         return self._model.tile_count
 
+    @property
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        return self._model.snapshot
+
     @property
     def elo0(self) -> Optional[int]:
         return self._model.elo0
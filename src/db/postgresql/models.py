@@ -250,6 +250,9 @@ class Game(Base):
     # Tile count on board
     tile_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
+    # Snapshot of the game state after the moves (see State.snapshot())
+    snapshot: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, nullable=True)
+
     # Elo ratings at game end
     elo0: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     elo1: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
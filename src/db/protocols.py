@@ -538,6 +538,9 @@ class GameEntityProtocol(EntityProtocol, Protocol):
     @property
     def tile_count(self) -> Optional[int]: ...
 
+    @property
+    def snapshot(self) -> Optional[Dict[str, Any]]: ...
+
     # Elo fields at game end
     @property
     def elo0(self) -> Optional[int]: ...
@@ -82,6 +82,7 @@ from api import api_blueprint
 from web import STATIC_FOLDER, web_blueprint
 from skraflstats import stats_blueprint
 from riddle import riddle_blueprint
+from robotengine import start_robot_engine
 
 
 # App version used for cache busting in production.
@@ -200,6 +201,9 @@ app.register_blueprint(stats_blueprint)
 app.register_blueprint(riddle_blueprint)
 app.register_blueprint(connect_blueprint)
 
+# Start the worker processes of the robot engine, if enabled
+start_robot_engine()
+
 # Initialize the OAuth wrapper
 init_oauth(app)
 
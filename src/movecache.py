@@ -0,0 +1,190 @@
+"""
+
+    Best move cache
+
+    Copyright © 2026 Miðeind ehf.
+    Original author: Vilhjálmur Þorsteinsson
+
+    The Creative Commons Attribution-NonCommercial 4.0
+    International Public License (CC-BY-NC 4.0) applies to this software.
+    For further information, see https://github.com/mideind/Netskrafl
+
+    This module caches the best moves found in game positions, for
+    the game review feature (see Game.best_moves()). Reviewers step
+    back and forth over the moves of finished games, asking for the
+    best moves in the same positions again and again, and many users
+    review the same games.
+
+    An entry is keyed by the vocabulary, the edition of the vocabulary
+    (i.e. the words added to or removed from it at run time, if any)
+    and a 128-bit digest of the position of the player to move, in the
+    binary format of State.position_bytes(), which identifies the board
+    type, the tiles on the board and the rack. Unlike the 64-bit
+    State.position_key(), such a digest is not expected to collide, even
+    across the positions of all games shared through Redis. An entry
+    holds the summaries of the best moves, as returned for a given
+    maximum number of moves.
+
+    Entries are kept in least-recently-used order in each process, up to
+    BEST_MOVES_CACHE_ENTRIES positions. If BEST_MOVES_CACHE_REDIS is set,
+    entries are also stored in Redis, to be shared between processes,
+    where they expire after BEST_MOVES_CACHE_TTL seconds.
+
+"""
+
+from __future__ import annotations
+
+from typing import Any, List, Optional, Tuple, TypedDict
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from config import (
+    BEST_MOVES_CACHE_ENTRIES,
+    BEST_MOVES_CACHE_REDIS,
+    BEST_MOVES_CACHE_TTL,
+)
+from cache import memcache
+from languages import current_vocabulary
+from wordbase import Wordbase
+from skraflmechanics import State, SummaryTuple
+
+
+class BestMoveCacheStats(TypedDict):
+    """Statistics for the BestMoveCache"""
+
+    hits: int
+    redis_hits: int
+    misses: int
+    evictions: int
+    entries: int
+    max_entries: int
+
+
+# A cache entry: the maximum number of moves that was asked for
+# (0 = no limit), and the summaries of the best moves found
+BestMoveEntry = Tuple[int, List[SummaryTuple]]
+
+
+class BestMoveCache:
+
+    """A cache of the best moves in game positions, kept in
+    least-recently-used order in this process, and optionally
+    shared between processes through Redis"""
+
+    # The Redis namespace of the cache entries
+    NAMESPACE = "bestmoves"
+
+    def __init__(self, max_entries: int, use_redis: bool, ttl: int) -> None:
+        self._max_entries = max_entries
+        self._use_redis = use_redis
+        self._ttl = ttl
+        self._lru: OrderedDict[str, BestMoveEntry] = OrderedDict()
+        self._hits = 0
+        self._redis_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(state: State) -> str:
+        """Return the cache key of the position of the player to move"""
+        vocab = current_vocabulary()
+        overlay = Wordbase.dawg().overlay
+        if overlay:
+            # Words have been added to or removed from the vocabulary
+            vocab += "." + overlay.digest()
+        position = state.position_bytes(state.player_to_move())
+        return "{0}:{1}".format(
+            vocab, hashlib.blake2b(position, digest_size=16).hexdigest()
+        )
+
+    @staticmethod
+    def _covers(entry: BestMoveEntry, n: int) -> Optional[List[SummaryTuple]]:
+        """Return the n best moves (all moves if n is 0) from a cache
+        entry, or None if the entry does not contain them"""
+        limit, moves = entry
+        if limit == 0 or len(moves) < limit:
+            # The entry contains all moves in the position
+            return moves[0:n] if n > 0 else moves[:]
+        if 0 < n <= limit:
+            return moves[0:n]
+        return None
+
+    def _add(self, key: str, entry: BestMoveEntry) -> None:
+        """Add an entry to the in-process cache"""
+        with self._lock:
+            lru = self._lru
+            lru[key] = entry
+            lru.move_to_end(key)
+            while len(lru) > self._max_entries:
+                lru.popitem(last=False)
+                self._evictions += 1
+
+    def get(self, state: State, n: int) -> Optional[List[SummaryTuple]]:
+        """Return the n best moves (all moves if n is 0) of the player
+        to move in the given state, or None if they are not cached"""
+        if self._max_entries <= 0:
+            return None
+        key = self._key(state)
+        entry = self._lru.get(key)
+        if entry is not None and (moves := self._covers(entry, n)) is not None:
+            self._hits += 1
+            try:
+                self._lru.move_to_end(key)
+            except KeyError:
+                # Evicted by another thread in the meantime: no problem
+                pass
+            return moves
+        if self._use_redis:
+            d: Any = memcache.get(key, namespace=self.NAMESPACE)
+            if isinstance(d, dict):
+                entry = (
+                    int(d["n"]),
+                    [(str(c), str(t), int(s)) for c, t, s in d["moves"]],
+                )
+                if (moves := self._covers(entry, n)) is not None:
+                    self._redis_hits += 1
+                    self._add(key, entry)
+                    return moves
+        self._misses += 1
+        return None
+
+    def put(self, state: State, n: int, moves: List[SummaryTuple]) -> None:
+        """Store the n best moves (all moves if n is 0) of the player
+        to move in the given state"""
+        if self._max_entries <= 0:
+            return
+        key = self._key(state)
+        entry = (n, moves)
+        self._add(key, entry)
+        if self._use_redis:
+            memcache.set(
+                key,
+                dict(n=n, moves=moves),
+                time=self._ttl,
+                namespace=self.NAMESPACE,
+            )
+
+    def stats(self) -> BestMoveCacheStats:
+        """Return the hit, miss and eviction counts, and the cache size"""
+        return BestMoveCacheStats(
+            hits=self._hits,
+            redis_hits=self._redis_hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            entries=len(self._lru),
+            max_entries=self._max_entries,
+        )
+
+
+# The best moves in recently reviewed positions
+best_move_cache = BestMoveCache(
+    BEST_MOVES_CACHE_ENTRIES, BEST_MOVES_CACHE_REDIS, BEST_MOVES_CACHE_TTL
+)
+
+
+def best_move_cache_stats() -> BestMoveCacheStats:
+    """Return the statistics of the best move cache"""
+    return best_move_cache.stats()
@@ -0,0 +1,275 @@
+"""
+
+    Robot move engine
+
+    Copyright © 2026 Miðeind ehf.
+    Original author: Vilhjálmur Þorsteinsson
+
+    The Creative Commons Attribution-NonCommercial 4.0
+    International Public License (CC-BY-NC 4.0) applies to this software.
+    For further information, see https://github.com/mideind/Netskrafl
+
+    This module generates robot moves in a pool of worker processes,
+    so that the CPU-heavy move generation does not block the request
+    thread (and the GIL) of the web server process.
+
+    The pool is enabled by setting ROBOT_ENGINE_WORKERS (see config.py)
+    to a positive number. The worker processes are forked from a server
+    process that has imported this module and thus loaded the Wordbase
+    dictionaries, so the workers start up fast and share the dictionary
+    pages with it.
+
+    A job describes the position from the robot's point of view: the
+    board as row strings, the racks and scores of the robot and its
+    opponent, the locale, board type and tile set, and the robot level.
+    The worker rebuilds a State from the job, generates the robot's move
+    and returns its summary tuple (coordinate, tiles, score), which is
+    decoded into a move on the caller's side.
+
+    Robot moves are subject to a time limit, ROBOT_MOVE_TIME_LIMIT, after
+    which the robot plays the best move found so far. Within the pool,
+    a job is also limited to ROBOT_ENGINE_TIMEOUT seconds. If the pool is
+    disabled, broken or does not deliver a move in time, the move is
+    generated in the calling thread, within what remains of the time limit.
+
+"""
+
+from __future__ import annotations
+
+from typing import List, NamedTuple, Optional, Tuple, Type, TypedDict
+
+import logging
+import threading
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from config import (
+    ROBOT_ENGINE_TIMEOUT,
+    ROBOT_ENGINE_WORKERS,
+    ROBOT_MOVE_TIME_LIMIT,
+)
+from languages import TileSet, set_locale
+from skraflmechanics import (
+    MoveBase,
+    State,
+    SummaryTuple,
+    decode_move,
+)
+from autoplayers import autoplayer_create
+
+
+class RobotJob(NamedTuple):
+    """A move generation job, as sent to a worker process"""
+
+    locale: str
+    board_type: str
+    tileset: Optional[Type[TileSet]]
+    # The board, as returned by Board.row_strings()
+    board: List[str]
+    rack: str
+    opponent_rack: str
+    # The scores of the robot and its opponent, in that order
+    scores: Tuple[int, int]
+    robot_level: int
+    # Absolute time (as in time.time()) by which the move is needed.
+    # The worker plays the best move found by then, and skips the job
+    # altogether if it is already past.
+    deadline: float
+
+
+class RobotEngineStats(TypedDict):
+    """Statistics for the robot engine"""
+
+    workers: int
+    queue_depth: int
+    jobs: int
+    timeouts: int
+    errors: int
+    fallbacks: int
+    latency_total: float
+    latency_max: float
+
+
+# Additional time that the caller waits for a job to be finished
+# after its deadline, while the worker wraps up the move generation
+# and returns its result
+_RESULT_GRACE = 1.0
+
+_lock = threading.Lock()
+_executor: Optional[ProcessPoolExecutor] = None
+_stats: RobotEngineStats = RobotEngineStats(
+    workers=ROBOT_ENGINE_WORKERS,
+    queue_depth=0,
+    jobs=0,
+    timeouts=0,
+    errors=0,
+    fallbacks=0,
+    latency_total=0.0,
+    latency_max=0.0,
+)
+
+
+def _warmup() -> None:
+    """Executed in each worker process when the pool is started"""
+    pass
+
+
+def _run_job(job: RobotJob) -> Optional[SummaryTuple]:
+    """Generate a robot move for the position described by the job,
+    returning its summary, or None if the job has expired.
+    Executed in a worker process."""
+    if time.time() >= job.deadline:
+        # The caller has given up on this job: don't waste time on it
+        return None
+    set_locale(job.locale)
+    # The robot is always player 0 within the worker
+    state = State(
+        tileset=job.tileset,
+        drawtiles=False,
+        locale=job.locale,
+        board_type=job.board_type,  # type: ignore
+    )
+    state.board().load_row_strings(job.board)
+    state.set_rack(0, job.rack)
+    state.set_rack(1, job.opponent_rack)
+    state.recalc_bag()
+    state.set_scores(job.scores)
+    move = autoplayer_create(state, job.robot_level).generate_move(job.deadline)
+    return move.summary(state)
+
+
+def start_robot_engine() -> None:
+    """Start the worker pool, if enabled, and have its worker processes
+    forked right away so that they are ready when the first job arrives"""
+    global _executor
+    if ROBOT_ENGINE_WORKERS <= 0:
+        return
+    with _lock:
+        if _executor is not None:
+            return
+        # The worker processes are forked from a clean server process,
+        # not from this (possibly multithreaded) web server process.
+        # The server process preloads this module, and thereby the
+        # dictionaries, before forking.
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        _executor = ProcessPoolExecutor(
+            max_workers=ROBOT_ENGINE_WORKERS, mp_context=ctx
+        )
+        for _ in range(ROBOT_ENGINE_WORKERS):
+            _executor.submit(_warmup)
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """Discard a broken worker pool; a new one is started on next use"""
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _job_done(future: Future[Optional[SummaryTuple]]) -> None:
+    """Called when a job has completed or has been cancelled"""
+    with _lock:
+        _stats["queue_depth"] -= 1
+
+
+def _move_from_pool(
+    state: State, robot_level: int, deadline: Optional[float]
+) -> Optional[MoveBase]:
+    """Generate a robot move in the worker pool, returning None
+    if the pool did not deliver a move in time"""
+    start_robot_engine()
+    executor = _executor
+    if executor is None:
+        return None
+    p = state.player_to_move()
+    scores = state.scores()
+    now = time.time()
+    job_deadline = now + ROBOT_ENGINE_TIMEOUT
+    if deadline is not None:
+        job_deadline = min(job_deadline, deadline)
+    job = RobotJob(
+        locale=state.locale,
+        board_type=state.board_type,
+        tileset=state.tileset,
+        board=state.board().row_strings(),
+        rack=state.rack(p),
+        opponent_rack=state.rack(1 - p),
+        scores=(scores[p], scores[1 - p]),
+        robot_level=robot_level,
+        deadline=job_deadline,
+    )
+    t0 = time.monotonic()
+    try:
+        future = executor.submit(_run_job, job)
+    except (BrokenProcessPool, RuntimeError) as e:
+        logging.error(f"Robot engine unable to accept job: {repr(e)}")
+        _discard_executor(executor)
+        return None
+    with _lock:
+        _stats["queue_depth"] += 1
+        _stats["jobs"] += 1
+    future.add_done_callback(_job_done)
+    try:
+        summary = future.result(timeout=job_deadline - now + _RESULT_GRACE)
+    except FutureTimeoutError:
+        # Drop the job if it hasn't started yet; otherwise the
+        # worker finishes it and its result is ignored
+        future.cancel()
+        summary = None
+    except BrokenProcessPool as e:
+        logging.error(f"Robot engine worker pool is broken: {repr(e)}")
+        _discard_executor(executor)
+        with _lock:
+            _stats["errors"] += 1
+        return None
+    except Exception as e:
+        logging.error(f"Robot engine job failed: {repr(e)}")
+        with _lock:
+            _stats["errors"] += 1
+        return None
+    if summary is None:
+        logging.warning(
+            f"Robot engine job timed out after {time.time() - now:.1f} seconds"
+        )
+        with _lock:
+            _stats["timeouts"] += 1
+        return None
+    latency = time.monotonic() - t0
+    with _lock:
+        _stats["latency_total"] += latency
+        _stats["latency_max"] = max(_stats["latency_max"], latency)
+    return decode_move(state.board(), summary)
+
+
+def robot_move(state: State, robot_level: int) -> MoveBase:
+    """Generate a move for the robot, which is the player to move
+    in the given state, at the given robot level"""
+    deadline: Optional[float] = None
+    if ROBOT_MOVE_TIME_LIMIT > 0:
+        deadline = time.time() + ROBOT_MOVE_TIME_LIMIT
+    if ROBOT_ENGINE_WORKERS > 0:
+        move = _move_from_pool(state, robot_level, deadline)
+        if move is not None:
+            return move
+        with _lock:
+            _stats["fallbacks"] += 1
+    # Generate the move in the calling thread
+    apl = autoplayer_create(state, robot_level)
+    move = apl.generate_move(deadline)
+    if not apl.completed():
+        logging.warning(
+            f"Robot move generation ran out of time after {ROBOT_MOVE_TIME_LIMIT} seconds"
+        )
+    return move
+
+
+def robot_engine_stats() -> RobotEngineStats:
+    """Return the statistics of the robot engine"""
+    with _lock:
+        return RobotEngineStats(**_stats)
@@ -1272,6 +1272,12 @@ class GameModel(Model["GameModel"]):
     # Count of tiles that have been laid on the board
     tile_count = Model.OptionalInt()
 
+    # Snapshot of the game state after the moves (see State.snapshot()),
+    # so that the moves need not be replayed when the game is loaded
+    snapshot = cast(
+        Optional[Dict[str, Any]], ndb.JsonProperty(required=False, default=None)
+    )
+
     # Elo statistics properties - only defined for finished games
     # Elo points of both players when game finished, before adjustment
     elo0 = Model.OptionalInt()
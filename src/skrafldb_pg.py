@@ -1262,6 +1262,7 @@ class GameModel:
     irack1 = _model_property("irack1", None)
     prefs = _model_property("prefs", None)
     tile_count = _model_property("tile_count", None)
+    snapshot = _model_property("snapshot", None)
     elo0 = _model_property("elo0", None)
     elo1 = _model_property("elo1", None)
     elo0_adj = _model_property("elo0_adj", None)
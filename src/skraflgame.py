@@ -30,13 +30,14 @@ from typing import (
     Tuple,
     NamedTuple,
     Iterator,
+    Iterable,
     cast,
 )
 
 import logging
 from random import randint
 from datetime import UTC, datetime, timedelta
-from itertools import groupby
+from itertools import chain, groupby
 
 from config import DEFAULT_LOCALE, running_local, Error, BoardTypes, MOVES_SIDECAR
 
@@ -65,20 +66,20 @@ from skraflmechanics import (
     Board,
     Rack,
     MoveBase,
-    Move,
-    PassMove,
-    ExchangeMove,
-    ChallengeMove,
     ResponseMove,
-    ResignMove,
     MoveSummaryTuple,
     SummaryTuple,
+    StateSnapshot,
+    decode_move,
+    unique_moves,
 )
 from skraflplayer import AutoPlayer
 from movesservice import best_moves_from_service
+from movecache import best_move_cache
 from skrafluser import User
 from skraflelo import compute_elo_for_game, compute_locale_elo_for_game
-from autoplayers import autoplayer_create, autoplayer_name
+from autoplayers import autoplayer_name
+from robotengine import robot_move
 
 
 # Type definitions
@@ -93,6 +94,15 @@ class MoveTuple(NamedTuple):
     ts: Optional[datetime]
 
 
+# Tuple for storing the summary of a move within a Game, i.e. the move
+# as it is stored in the database, without the MoveBase instance
+class MoveRecord(NamedTuple):
+    player: int
+    summary: SummaryTuple
+    rack: str
+    ts: Optional[datetime]
+
+
 TwoLetterGroupList = List[Tuple[str, List[str]]]
 TwoLetterGroupTuple = Tuple[TwoLetterGroupList, TwoLetterGroupList]
 
@@ -218,7 +228,13 @@ class Game:
         # The timestamp of the last move made in the game
         self.ts_last_move: Optional[datetime] = None
         # History of moves in this game so far, as a list of MoveTuple namedtuples
-        self.moves: List[MoveTuple] = []
+        # (see the moves property)
+        self._moves: List[MoveTuple] = []
+        # Stored moves that have not been replayed, if the game state was
+        # loaded from a snapshot. They precede the moves in self._moves.
+        self._stored_moves: List[MoveRecord] = []
+        # Count of tiles laid on the board by the stored moves
+        self._stored_tile_count = 0
         # Initial rack contents
         self.initial_racks: List[Optional[str]] = [None, None]
         # Preferences (such as time limit, alternative bag or board, etc.)
@@ -344,6 +360,22 @@ class Game:
         if gm is None:
             # A game with this uuid is not found in the database: give up
             return None
+        return cls._from_model(
+            uuid, gm, set_locale=set_locale, force_locale=force_locale
+        )
+
+    @classmethod
+    def _from_model(
+        cls,
+        uuid: str,
+        gm: GameModel,
+        *,
+        set_locale: bool = False,
+        force_locale: str = "",
+    ) -> Game:
+        """Create a Game instance from its GameModel entity, restoring
+        its state from the stored snapshot if possible, or otherwise
+        by replaying the stored moves"""
 
         # Initialize a new Game instance with a pre-existing uuid
         game = cls(uuid=uuid, locale=gm.locale or "")
@@ -393,71 +425,34 @@ class Game:
         game.state.set_rack(0, gm.irack0 or "")
         game.state.set_rack(1, gm.irack1 or "")
 
-        # Process the moves
-        player = 0
+        # The stored moves, with the player who made each of them
         now = datetime.now(UTC)
+        stored_moves = [
+            MoveRecord(
+                ix % 2,
+                (mm.coord or "", mm.tiles or "", mm.score),
+                mm.rack or "",
+                mm.timestamp or now,
+            )
+            for ix, mm in enumerate(gm.moves)
+        ]
 
-        for mm in gm.moves:
-            m: Optional[MoveBase] = None
-
-            if mm.coord:
-                # Normal tile move
-                # Decode the coordinate: A15 = horizontal, 15A = vertical
-                if mm.coord[0] in Board.ROWIDS:
-                    row = Board.ROWIDS.index(mm.coord[0])
-                    col = int(mm.coord[1:]) - 1
-                    horiz = True
-                else:
-                    row = Board.ROWIDS.index(mm.coord[-1])
-                    col = int(mm.coord[0:-1]) - 1
-                    horiz = False
-                # The tiles string may contain wildcards followed by their meaning
-                # Remove the ? marks to get the "plain" word formed
-                if mm.tiles:
-                    m = Move(mm.tiles.replace("?", ""), row, col, horiz)
-                    m.make_covers(game.state.board(), mm.tiles)
-
-            elif not mm.tiles:
-                # Degenerate (error) case: this game is stored incorrectly
-                # in the NDB datastore. Probably an artifact of the move to
-                # Google Cloud NDB.
-                pass
-
-            elif mm.tiles[0:4] == "EXCH":
-                # Exchange move
-                m = ExchangeMove(mm.tiles[5:])
-
-            elif mm.tiles == "PASS":
-                # Pass move
-                m = PassMove()
-
-            elif mm.tiles == "RSGN":
-                # Game resigned
-                m = ResignMove(-mm.score)
-
-            elif mm.tiles == "CHALL":
-                # Last move challenged
-                m = ChallengeMove()
-
-            elif mm.tiles == "RESP":
-                # Response to challenge
-                m = ResponseMove(mm.score)
-
-            if m is None:
-                # Something is wrong: mark the game as erroneous
-                game._erroneous = True
+        snapshot = cast(Optional[StateSnapshot], gm.snapshot)
+        if snapshot is not None and snapshot.get("moves") == len(stored_moves):
+            # The game was stored with a snapshot of its state after
+            # the stored moves: use it instead of replaying the moves,
+            # which are then only replayed if the move history is needed
+            try:
+                game.state.restore_snapshot(snapshot)
+            except ValueError as e:
+                logging.warning(f"Game {uuid}: {e}")
             else:
-                # Do a "shallow apply" of the move, which updates
-                # the board and internal state variables but does
-                # not modify the bag or the racks
-                game.state.apply_move(m, shallow=True)
-                # Append to the move history
-                game.moves.append(
-                    MoveTuple(player, m, mm.rack or "", mm.timestamp or now)
-                )
-                game.state.set_rack(player, mm.rack or "")
+                game._stored_moves = stored_moves
+                game._stored_tile_count = gm.tile_count or 0
 
-            player = 1 - player
+        if not game._stored_moves:
+            # Process the moves
+            game._moves = game._replay_moves(game.state, stored_moves)
 
         # Load the current racks
         game.state.set_rack(0, gm.rack0)
@@ -481,8 +476,69 @@ class Game:
 
         return game
 
-    def _do_store(self, *, calc_elo_points: bool) -> None:
-        """Store the game in persistent storage"""
+    def _replay_moves(
+        self, state: State, stored_moves: Iterable[MoveRecord]
+    ) -> List[MoveTuple]:
+        """Apply stored moves to the given state, returning the
+        corresponding move history"""
+        moves: List[MoveTuple] = []
+        for mr in stored_moves:
+            m = decode_move(state.board(), mr.summary)
+            if m is None:
+                # Something is wrong: mark the game as erroneous
+                self._erroneous = True
+                continue
+            # Do a "shallow apply" of the move, which updates
+            # the board and internal state variables but does
+            # not modify the bag or the racks
+            state.apply_move(m, shallow=True)
+            # Append to the move history
+            moves.append(MoveTuple(mr.player, m, mr.rack, mr.ts))
+            state.set_rack(mr.player, mr.rack)
+        return moves
+
+    @property
+    def moves(self) -> List[MoveTuple]:
+        """Return the history of moves in this game so far. If the game
+        state was loaded from a snapshot, the stored moves are replayed
+        when this property is first accessed."""
+        if self._stored_moves:
+            # Replay the stored moves in a fresh state, starting from
+            # the initial racks, as if the game had been loaded without
+            # a snapshot
+            s = State(
+                drawtiles=False,
+                manual_wordcheck=self.manual_wordcheck(),
+                tileset=self.tileset,
+                locale=self.locale,
+                board_type=self.board_type,
+            )
+            s.set_rack(0, self.initial_racks[0] or "")
+            s.set_rack(1, self.initial_racks[1] or "")
+            self._moves = self._replay_moves(s, self._stored_moves) + self._moves
+            self._stored_moves = []
+            self._stored_tile_count = 0
+        return self._moves
+
+    def move_records(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> List[MoveRecord]:
+        """Return the player, summary, rack and timestamp of the moves
+        in the slice [start:stop] of the move history, without
+        replaying any stored moves"""
+        assert self.state is not None
+        start, stop, _ = slice(start, stop).indices(self.num_moves())
+        n = len(self._stored_moves)
+        records = self._stored_moves[start:stop]
+        records.extend(
+            MoveRecord(m.player, m.move.summary(self.state), m.rack, m.ts)
+            for m in self._moves[max(start - n, 0) : max(stop - n, 0)]
+        )
+        return records
+
+    def _to_model(self) -> GameModel:
+        """Return a GameModel entity for the game, with its moves
+        and a snapshot of its state"""
 
         assert self.uuid is not None
 
@@ -503,25 +559,39 @@ class Game:
         sc = self.final_scores()  # Includes adjustments if game is over
         gm.score0 = sc[0]
         gm.score1 = sc[1]
-        gm.to_move = len(self.moves) % 2
+        gm.to_move = self.num_moves() % 2
         gm.robot_level = self.robot_level
         gm.prefs = self._preferences
-        tile_count = 0
+        # Count the tiles actually laid down
+        # Can be negative for a successful challenge
+        tile_count = self._stored_tile_count + sum(
+            m.move.num_covers() for m in self._moves
+        )
         movelist: List[MoveModel] = []
-        for m in self.moves:
+        for m in self.move_records():
             mm = MoveModel()
-            coord, tiles, score = m.move.summary(self.state)
-            # Count the tiles actually laid down
-            # Can be negative for a successful challenge
-            tile_count += m.move.num_covers()
-            mm.coord = coord
-            mm.tiles = tiles
-            mm.score = score
+            mm.coord, mm.tiles, mm.score = m.summary
             mm.rack = m.rack
             mm.timestamp = m.ts
             movelist.append(mm)
         gm.moves = movelist
         gm.tile_count = tile_count
+        # Store a snapshot of the state after the moves, so that
+        # they need not be replayed when the game is loaded
+        gm.snapshot = (
+            self.state.snapshot()
+            if not self._erroneous and self.state.num_moves() == len(movelist)
+            else None
+        )
+        return gm
+
+    def _do_store(self, *, calc_elo_points: bool) -> None:
+        """Store the game in persistent storage"""
+
+        assert self.uuid is not None
+        assert self.state is not None
+        gm = self._to_model()
+        sc = self.final_scores()  # Includes adjustments if game is over
 
         # Storing a game that is now over: update the player statistics as well
         # (with the exception that if both scores are zero, the game is
@@ -836,7 +906,7 @@ class Game:
         in seconds, as a tuple"""
         elapsed = [0.0, 0.0]
         last_ts = self.timestamp or datetime.now(UTC)
-        for m in self.moves:
+        for m in chain(self._stored_moves, self._moves):
             if m.ts is not None:
                 delta = m.ts - last_ts
                 last_ts = m.ts
@@ -960,16 +1030,16 @@ class Game:
         mt = MoveTuple(
             player_index, move, self.state.rack(player_index), self.ts_last_move
         )
-        self.moves.append(mt)
+        self._moves.append(mt)
         self.last_move = None  # No response move yet
 
     def autoplayer_move(self) -> None:
         """Generate an AutoPlayer move and register it"""
-        # Create an appropriate AutoPlayer subclass instance
-        # depending on the robot level in question
+        # Generate the move using an appropriate AutoPlayer subclass
+        # for the robot level in question, in the robot engine's worker
+        # pool if it is enabled
         assert self.state is not None
-        apl = autoplayer_create(self.state, self.robot_level)
-        move = apl.generate_move()
+        move = robot_move(self.state, self.robot_level)
         self.register_move(move)
         self.last_move = move  # Store a response move
 
@@ -979,6 +1049,31 @@ class Game:
         self.register_move(move)
         self.last_move = move  # Store the response move
 
+    def _best_moves_from_service(
+        self, state: State, n: int
+    ) -> Optional[List[SummaryTuple]]:
+        """Obtain the n best moves (all moves if n is 0) from the moves
+        sidecar, without duplicate single-tile moves, or None if the
+        sidecar is not available"""
+        board = state.board()
+        limit = n
+        while True:
+            moves = best_moves_from_service(
+                locale=self.locale,
+                board_type=self.board_type,
+                board=board.row_strings(),
+                rack=state.rack(state.player_to_move()),
+                limit=limit,
+            )
+            if moves is None:
+                return None
+            unique = unique_moves(board, moves)
+            if n == 0 or len(unique) >= n or len(moves) < limit:
+                return unique[0:n] if n else unique
+            # Duplicates were removed: ask for enough additional
+            # moves to make up for them
+            limit += n - len(unique)
+
     def best_moves(self, state: State, n: int) -> BestMoveList:
         """Returns a list of the n best moves available in the game,
         at the point described by the state parameter."""
@@ -987,26 +1082,28 @@ class Game:
             # querying for best moves is prohibited
             return []
         player_index = state.player_to_move()
-        if MOVES_SIDECAR:
-            # A GoSkrafl moves sidecar runs alongside this process:
-            # delegate the CPU-heavy move generation to it. The Go engine
-            # and the in-process Python engine use the same vocabularies
-            # and return identical (coordinate, tiles, score) summaries.
-            moves = best_moves_from_service(
-                locale=self.locale,
-                board_type=self.board_type,
-                board=state.board().row_strings(),
-                rack=state.rack(player_index),
-                limit=n,
-            )
-            if moves is not None:
-                return [(player_index, m) for m in moves]
-            logging.warning(
-                "Moves sidecar unavailable; falling back to in-process engine"
-            )
-        # Create an AutoPlayer instance that always finds the top-scoring moves
-        apl = AutoPlayer(0, state)
-        return [(player_index, m.summary(state)) for m, _ in apl.generate_best_moves(n)]
+        # Reviewed positions recur, and finished games don't change:
+        # see whether the best moves in this position are already known
+        moves = best_move_cache.get(state, n)
+        if moves is None:
+            if MOVES_SIDECAR:
+                # A GoSkrafl moves sidecar runs alongside this process:
+                # delegate the CPU-heavy move generation to it. The Go engine
+                # and the in-process Python engine use the same vocabularies
+                # and return identical (coordinate, tiles, score) summaries,
+                # except that the sidecar may return a single-tile move
+                # in both directions (see unique_moves()).
+                moves = self._best_moves_from_service(state, n)
+                if moves is None:
+                    logging.warning(
+                        "Moves sidecar unavailable; falling back to in-process engine"
+                    )
+            if moves is None:
+                # Create an AutoPlayer instance that always finds the top-scoring moves
+                apl = AutoPlayer(0, state)
+                moves = [m.summary(state) for m, _ in apl.generate_best_moves(n)]
+            best_move_cache.put(state, n, moves)
+        return [(player_index, m) for m in moves]
 
     def enum_tiles(
         self, state: Optional[State] = None
@@ -1061,7 +1158,7 @@ class Game:
 
     def num_moves(self) -> int:
         """Returns the number of moves in the game so far"""
-        return len(self.moves)
+        return len(self._stored_moves) + len(self._moves)
 
     def is_erroneous(self) -> bool:
         """Return True if this game object is incorrectly serialized"""
@@ -1142,7 +1239,8 @@ class Game:
         to the given movelist"""
 
         # Lastplayer is the player who finished the game
-        lastplayer = self.moves[-1].player if self.moves else 0
+        last = self._moves or self._stored_moves
+        lastplayer = last[-1].player if last else 0
         assert self.state is not None
 
         if not self.state.is_resigned():
@@ -1241,7 +1339,7 @@ class Game:
             # Successful challenge?
             succ_chall = lm.is_successful_challenge(self.state)
         newmoves: List[Tuple[int, SummaryTuple]] = [
-            (m.player, m.move.summary(self.state)) for m in self.moves[-num_moves:]
+            (m.player, m.summary) for m in self.move_records(-num_moves)
         ]
 
         assert self.state is not None
@@ -1276,7 +1374,7 @@ class Game:
             reply["rack"] = []
         else:
             reply["rack"] = self.state.rack_details(player_index)
-        reply["num_moves"] = len(self.moves)
+        reply["num_moves"] = self.num_moves()
         reply["newmoves"] = newmoves
         reply["scores"] = self.final_scores()
         reply["progress"] = self.state.progress()
@@ -1294,7 +1392,7 @@ class Game:
         if deep:
             # Send all moves so far to the client
             reply["moves"] = [
-                (m.player, m.move.summary(self.state)) for m in self.moves[0:-num_moves]
+                (m.player, m.summary) for m in self.move_records(0, -num_moves)
             ]
             if self.is_over():
                 # The game is over and this may be a game review:
@@ -1302,7 +1400,7 @@ class Game:
                 reply["racks"] = [
                     self.initial_racks[0] or self.state.rack(0),
                     self.initial_racks[1] or self.state.rack(1),
-                ] + [m.rack for m in self.moves]
+                ] + [m.rack for m in chain(self._stored_moves, self._moves)]
             # Player information
             reply["autoplayer"] = [self.is_autoplayer(0), self.is_autoplayer(1)]
             reply["nickname"] = [self.player_nickname(0), self.player_nickname(1)]
@@ -1358,8 +1456,8 @@ class Game:
         # Manual wordcheck?
         reply["manual"] = self.manual_wordcheck()
         # Number of moves made
-        reply["moves0"] = m0 = (len(self.moves) + 1) // 2  # Floor division
-        reply["moves1"] = m1 = (len(self.moves) + 0) // 2  # Floor division
+        reply["moves0"] = m0 = (self.num_moves() + 1) // 2  # Floor division
+        reply["moves1"] = m1 = (self.num_moves() + 0) // 2  # Floor division
         # Count bingoes and covers for moves that were not successfully challenged
         net_moves = self.net_moves
         ncovers = [(m.player, m.move.num_covers()) for m in net_moves]
@@ -22,13 +22,16 @@
 
 from __future__ import annotations
 
-from typing import Callable, List, Mapping, NamedTuple, Tuple, Iterator, Union, Optional, Type
+from typing import Callable, Dict, List, Mapping, NamedTuple, Sequence, Set, Tuple, Iterator, TypedDict, Union, Optional, Type
 
 import abc
+import base64
+import hashlib
 from random import SystemRandom
 
 from config import DEFAULT_LOCALE, Error, BoardType, BoardTypes
 from wordbase import Wordbase
+from dawgdictionary import PackedDawgDictionary
 from languages import (
     TileSet,
     Alphabet,
@@ -150,6 +153,49 @@ _xlt: Callable[[List[str]], List[List[int]]] = lambda arr: [
 _WORDSCORE: Mapping[BoardTypes, List[List[int]]] = {key: _xlt(val) for key, val in _WSC.items()}
 _LETTERSCORE: Mapping[BoardTypes, List[List[int]]] = {key: _xlt(val) for key, val in _LSC.items()}
 
+# Bit patterns of the squares in each column, indexed as the squares of a Board
+_COLUMN_BITS = [
+    sum(1 << (row * BOARD_SIZE + col) for row in range(BOARD_SIZE))
+    for col in range(BOARD_SIZE)
+]
+
+
+# Zobrist keys, by (index, character), calculated on first use.
+# The index is a square on the board (row * BOARD_SIZE + col),
+# _RACK_KEY_INDEX plus the occurrence number of a tile in a rack,
+# or _BOARD_TYPE_KEY_INDEX for the board type.
+_ZOBRIST_KEYS: Dict[Tuple[int, str], int] = {}
+_RACK_KEY_INDEX = BOARD_SIZE * BOARD_SIZE
+_BOARD_TYPE_KEY_INDEX = -1
+# The number of bytes in a bit pattern of the squares of a board
+_BOARD_MASK_BYTES = (BOARD_SIZE * BOARD_SIZE + 7) // 8
+
+
+def zobrist_key(index: int, char: str) -> int:
+    """Return the 64-bit Zobrist key of a character at an index.
+    The keys are derived from a cryptographic hash rather than from
+    a random number generator, so they are the same in all processes
+    and position hashes can be shared between them."""
+    key = _ZOBRIST_KEYS.get((index, char))
+    if key is None:
+        digest = hashlib.blake2b(
+            f"{index}:{char}".encode("utf-8"), digest_size=8
+        ).digest()
+        key = _ZOBRIST_KEYS[(index, char)] = int.from_bytes(digest, "little")
+    return key
+
+
+def rack_hash(rack: str) -> int:
+    """Return a 64-bit Zobrist hash of the tiles in a rack,
+    regardless of their order"""
+    h = 0
+    counts: Dict[str, int] = {}
+    for tile in rack:
+        n = counts.get(tile, 0)
+        counts[tile] = n + 1
+        h ^= zobrist_key(_RACK_KEY_INDEX + n, tile)
+    return h
+
 
 def enum_covers(tiles: str) -> Iterator[Tuple[str, str]]:
     """Generator to enumerate through a tiles string,
@@ -199,23 +245,36 @@ class Board:
         # pylint: disable=protected-access
         # noinspection PyProtectedMember
         self._letters: List[str]
-        self._tiles: List[str]
+        self._blanks: int
+        self._rows: List[int]
+        self._cols: List[int]
         self._board_type: BoardTypes
         if copy is None:
-            # Store letters on the board in list of strings
-            self._letters = [" " * BOARD_SIZE for _ in range(BOARD_SIZE)]
-            # Store tiles on the board in list of strings
-            self._tiles = [" " * BOARD_SIZE for _ in range(BOARD_SIZE)]
-            # The two counts below should always stay in sync
+            # Store the letters on the board in a flat list of single
+            # characters, indexed by row * BOARD_SIZE + col, with ' '
+            # for empty squares
+            self._letters = [" "] * (BOARD_SIZE * BOARD_SIZE)
+            # Bit pattern of the squares (bit = index into _letters) that
+            # are covered by a blank tile. The tile on any other covered
+            # square is the same as its letter.
+            self._blanks = 0
+            # Bit patterns of the covered squares in each row (bit = col)
+            # and in each column (bit = row)
+            self._rows = [0] * BOARD_SIZE
+            self._cols = [0] * BOARD_SIZE
             self._numletters = 0
-            self._numtiles = 0
+            # Zobrist hash of the letters and blank tiles on the board,
+            # kept up to date by set_letter() and set_tile()
+            self._hash = 0
             self._board_type = board_type or "standard"
         else:
             # Copy constructor: initialize from another Board
             self._letters = copy._letters[:]
-            self._tiles = copy._tiles[:]
+            self._blanks = copy._blanks
+            self._rows = copy._rows[:]
+            self._cols = copy._cols[:]
             self._numletters = copy._numletters
-            self._numtiles = copy._numtiles
+            self._hash = copy._hash
             self._board_type = copy._board_type or "standard"
         self._wordscore = _WORDSCORE[self._board_type]
         self._letterscore = _LETTERSCORE[self._board_type]
@@ -240,12 +299,16 @@ class Board:
 
     def is_empty(self) -> bool:
         """Is the board empty, i.e. contains no tiles?"""
-        # One of those checks should actually be enough
-        return self._numletters == 0 and self._numtiles == 0
+        return self._numletters == 0
 
     def is_covered(self, row: int, col: int) -> bool:
         """Is the specified square already covered (taken)?"""
-        return self._letters[row][col] != " "
+        return self._letters[row * BOARD_SIZE + col] != " "
+
+    def covered_bits(self, index: int, horizontal: bool) -> int:
+        """Return a bit pattern of the covered squares along a row
+        (if horizontal) or a column (if vertical)"""
+        return self._rows[index] if horizontal else self._cols[index]
 
     def has_adjacent(self, row: int, col: int) -> bool:
         """Check whether there are any tiles on the board adjacent to this square"""
@@ -261,7 +324,16 @@ class Board:
 
     def letter_at(self, row: int, col: int) -> str:
         """Return the letter at the specified co-ordinate"""
-        return self._letters[row][col]
+        return self._letters[row * BOARD_SIZE + col]
+
+    def axis_letters(self, index: int, horizontal: bool) -> str:
+        """Return the letters along a row (if horizontal) or a column
+        (if vertical) as a string, with ' ' for empty squares"""
+        if horizontal:
+            return "".join(
+                self._letters[index * BOARD_SIZE : (index + 1) * BOARD_SIZE]
+            )
+        return "".join(self._letters[index::BOARD_SIZE])
 
     def row_strings(self) -> List[str]:
         """Return the board contents as a list of strings, one per row,
@@ -271,63 +343,120 @@ class Board:
         letter (stored here as tile '?' with the letter as its meaning)"""
         rows: List[str] = []
         for row in range(BOARD_SIZE):
-            chars: List[str] = []
-            for col in range(BOARD_SIZE):
-                tile = self._tiles[row][col]
-                if tile == " ":
-                    chars.append(".")
-                elif tile == "?":
-                    chars.append(self._letters[row][col].upper())
-                else:
-                    chars.append(tile)
+            chars = self._letters[row * BOARD_SIZE : (row + 1) * BOARD_SIZE]
+            blanks = self._blanks >> (row * BOARD_SIZE)
+            for col, letter in enumerate(chars):
+                if letter == " ":
+                    chars[col] = "."
+                elif blanks & (1 << col):
+                    chars[col] = letter.upper()
             rows.append("".join(chars))
         return rows
 
+    def load_row_strings(self, rows: Sequence[str]) -> None:
+        """Place tiles on the board from a list of row strings,
+        in the format returned by row_strings()"""
+        for row, chars in enumerate(rows):
+            for col, c in enumerate(chars):
+                if c == ".":
+                    continue
+                if c.isupper():
+                    # Blank tile, assigned the corresponding lowercase letter
+                    self.set_tile(row, col, "?")
+                    self.set_letter(row, col, c.lower())
+                else:
+                    self.set_tile(row, col, c)
+                    self.set_letter(row, col, c)
+
+    def position_hash(self) -> int:
+        """Return a 64-bit Zobrist hash of the letters and blank tiles
+        on the board. Boards with the same contents have the same hash,
+        regardless of the order in which the tiles were placed."""
+        return self._hash
+
+    def position_bytes(self) -> bytes:
+        """Return the contents of the board in a compact binary format:
+        a bit pattern of the covered squares, followed by the letters
+        on those squares in UTF-8, uppercase for blank tiles"""
+        covered = 0
+        chars: List[str] = []
+        for ix, letter in enumerate(self._letters):
+            if letter != " ":
+                covered |= 1 << ix
+                chars.append(letter.upper() if self._blanks & (1 << ix) else letter)
+        return covered.to_bytes(_BOARD_MASK_BYTES, "little") + "".join(
+            chars
+        ).encode("utf-8")
+
+    def load_position_bytes(self, data: bytes) -> None:
+        """Place tiles on the board from the binary format
+        returned by position_bytes()"""
+        covered = int.from_bytes(data[:_BOARD_MASK_BYTES], "little")
+        chars = iter(data[_BOARD_MASK_BYTES:].decode("utf-8"))
+        while covered:
+            ix = (covered & -covered).bit_length() - 1
+            covered &= covered - 1
+            row, col = divmod(ix, BOARD_SIZE)
+            c = next(chars)
+            if c.isupper():
+                # Blank tile, assigned the corresponding lowercase letter
+                self.set_tile(row, col, "?")
+                self.set_letter(row, col, c.lower())
+            else:
+                self.set_tile(row, col, c)
+                self.set_letter(row, col, c)
+
     def tile_at(self, row: int, col: int) -> str:
         """Return the tile at the specified co-ordinate (may be '?' for blank tile)"""
-        return self._tiles[row][col]
+        ix = row * BOARD_SIZE + col
+        if self._blanks & (1 << ix):
+            return "?"
+        return self._letters[ix]
 
     def set_letter(self, row: int, col: int, letter: str) -> None:
         """Set the letter at the specified co-ordinate"""
         # assert letter is not None
         # assert len(letter) == 1
-        prev = self._letters[row][col]
+        ix = row * BOARD_SIZE + col
+        prev = self._letters[ix]
         if prev == letter:
             # Unchanged square: we're done
             return
-        if prev == " " and letter != " ":
+        if prev == " ":
             # Putting a letter into a previously empty square
             self._numletters += 1
-        elif prev != " " and letter == " ":
-            # Removing a letter from a previously filled square
-            self._numletters -= 1
-        r = self._letters[row]
-        self._letters[row] = r[0:col] + letter + r[col + 1 :]
+            self._rows[row] |= 1 << col
+            self._cols[col] |= 1 << row
+        else:
+            self._hash ^= zobrist_key(ix, prev)
+            if letter == " ":
+                # Removing a letter from a previously filled square
+                self._numletters -= 1
+                self._rows[row] &= ~(1 << col)
+                self._cols[col] &= ~(1 << row)
+        if letter != " ":
+            self._hash ^= zobrist_key(ix, letter)
+        self._letters[ix] = letter
 
     def set_tile(self, row: int, col: int, tile: str) -> None:
         """Set the tile at the specified co-ordinate"""
         # assert tile is not None
         # assert len(tile) == 1
-        prev = self._tiles[row][col]
-        if prev == tile:
-            # Unchanged square: we're done
-            return
-        if prev == " " and tile != " ":
-            # Putting a tile into a previously empty square
-            self._numtiles += 1
-        elif prev != " " and tile == " ":
-            # Removing a tile from a previously filled square
-            self._numtiles -= 1
-        r = self._tiles[row]
-        self._tiles[row] = r[0:col] + tile + r[col + 1 :]
+        # The square itself is covered or emptied by set_letter(),
+        # so all that needs to be recorded here is whether the tile is blank
+        ix = row * BOARD_SIZE + col
+        blank = 1 << ix
+        if (tile == "?") != bool(self._blanks & blank):
+            self._blanks ^= blank
+            self._hash ^= zobrist_key(ix, "?")
 
     def enum_tiles(self) -> Iterator[Tuple[int, int, str, str]]:
         """Enumerate the tiles on the board with their coordinates"""
-        for x in range(BOARD_SIZE):
-            for y in range(BOARD_SIZE):
-                t = self.tile_at(x, y)
-                if t != " ":
-                    yield (x, y, t, self.letter_at(x, y))
+        for ix, letter in enumerate(self._letters):
+            if letter != " ":
+                row, col = divmod(ix, BOARD_SIZE)
+                tile = "?" if self._blanks & (1 << ix) else letter
+                yield (row, col, tile, letter)
 
     @staticmethod
     def adjacent(
@@ -352,42 +481,79 @@ class Board:
             col += yd
         return result
 
+    @staticmethod
+    def _run_start(bits: int, index: int) -> int:
+        """Return the index where the run of covered squares that ends
+        just before the given index starts, in a bit pattern of covered squares"""
+        return (~bits & ((1 << index) - 1)).bit_length()
+
+    @staticmethod
+    def _run_end(bits: int, index: int) -> int:
+        """Return the index just past the end of the run of covered squares
+        that starts just after the given index, in a bit pattern of covered squares"""
+        empty = ~bits >> (index + 1)
+        return index + (empty & -empty).bit_length()
+
+    def _column_run(self, col: int, start: int, end: int, tiles: bool) -> str:
+        """Return the letters, or tiles, in rows start...end-1 of a column"""
+        first = start * BOARD_SIZE + col
+        last = end * BOARD_SIZE + col
+        run = "".join(self._letters[first:last:BOARD_SIZE])
+        if tiles and self._blanks & _COLUMN_BITS[col] & ((1 << last) - (1 << first)):
+            run = "".join(
+                "?" if self._blanks & (1 << (first + i * BOARD_SIZE)) else c
+                for i, c in enumerate(run)
+            )
+        return run
+
+    def _row_run(self, row: int, start: int, end: int, tiles: bool) -> str:
+        """Return the letters, or tiles, in columns start...end-1 of a row"""
+        first = row * BOARD_SIZE + start
+        run = "".join(self._letters[first : first + end - start])
+        blanks = self._blanks >> first
+        if tiles and blanks & ((1 << (end - start)) - 1):
+            run = "".join(
+                "?" if blanks & (1 << i) else c for i, c in enumerate(run)
+            )
+        return run
+
     def letters_above(self, row: int, col: int) -> str:
         """Return the letters immediately above the given square, if any"""
-        return self.adjacent(row, col, -1, 0, self.letter_at)
+        return self._column_run(col, self._run_start(self._cols[col], row), row, False)
 
     def letters_below(self, row: int, col: int) -> str:
         """Return the letters immediately below the given square, if any"""
-        return self.adjacent(row, col, 1, 0, self.letter_at)
+        return self._column_run(col, row + 1, self._run_end(self._cols[col], row), False)
 
     def letters_left(self, row: int, col: int) -> str:
         """Return the letters immediately to the left of the given square, if any"""
-        return self.adjacent(row, col, 0, -1, self.letter_at)
+        return self._row_run(row, self._run_start(self._rows[row], col), col, False)
 
     def letters_right(self, row: int, col: int) -> str:
         """Return the letters immediately to the right of the given square, if any"""
-        return self.adjacent(row, col, 0, 1, self.letter_at)
+        return self._row_run(row, col + 1, self._run_end(self._rows[row], col), False)
 
     def tiles_above(self, row: int, col: int) -> str:
         """Return the tiles immediately above the given square, if any"""
-        return self.adjacent(row, col, -1, 0, self.tile_at)
+        return self._column_run(col, self._run_start(self._cols[col], row), row, True)
 
     def tiles_below(self, row: int, col: int) -> str:
         """Return the tiles immediately below the given square, if any"""
-        return self.adjacent(row, col, 1, 0, self.tile_at)
+        return self._column_run(col, row + 1, self._run_end(self._cols[col], row), True)
 
     def tiles_left(self, row: int, col: int) -> str:
         """Return the tiles immediately to the left of the given square, if any"""
-        return self.adjacent(row, col, 0, -1, self.tile_at)
+        return self._row_run(row, self._run_start(self._rows[row], col), col, True)
 
     def tiles_right(self, row: int, col: int) -> str:
         """Return the tiles immediately to the right of the given square, if any"""
-        return self.adjacent(row, col, 0, 1, self.tile_at)
+        return self._row_run(row, col + 1, self._run_end(self._rows[row], col), True)
 
     def __str__(self) -> str:
         """Simple text dump of the contents of the board"""
         board = ["   1 2 3 4 5 6 7 8 9 0 1 2 3 4 5"]
-        for y, row in enumerate(self._letters):
+        for y in range(BOARD_SIZE):
+            row = self._letters[y * BOARD_SIZE : (y + 1) * BOARD_SIZE]
             board.append(
                 Board.ROWIDS[y] + ": " + " ".join(["." if c == " " else c for c in row])
             )
@@ -402,6 +568,123 @@ class Board:
         return self._letterscore[row][col]
 
 
+class CrossChecks:
+    """The cross-check sets and potential anchor squares of a board,
+    for use in move generation. The cross-check set of a square is
+    a bit pattern of the letters that form valid words with the tiles
+    above and below it (for horizontal moves) or to its left and right
+    (for vertical moves). The sets do not depend on the rack, so they
+    are calculated once for a board and then updated incrementally,
+    in the rows and columns where tiles have been added or removed."""
+
+    def __init__(
+        self, board: Optional[Board] = None, copy: Optional[CrossChecks] = None
+    ) -> None:
+        if copy is None:
+            assert board is not None
+            self._reset(Wordbase.dawg())
+            self.update(board)
+        else:
+            # Copy constructor: initialize from another CrossChecks instance
+            # pylint: disable=protected-access
+            self._dawg = copy._dawg
+            self._overlay = copy._overlay
+            self._all_bits = copy._all_bits
+            self._letters = copy._letters[:]
+            self._horiz = [r[:] for r in copy._horiz]
+            self._vert = [c[:] for c in copy._vert]
+            self._adj_rows = copy._adj_rows[:]
+            self._adj_cols = copy._adj_cols[:]
+
+    def _reset(self, dawg: PackedDawgDictionary) -> None:
+        """Reset to the cross-checks of an empty board"""
+        self._dawg = dawg
+        self._overlay = dawg.overlay
+        self._all_bits = dawg.alphabet.all_bits_set()
+        # The letters on the board when the cross-checks were last updated,
+        # in the same flat format as Board._letters
+        self._letters = [" "] * (BOARD_SIZE * BOARD_SIZE)
+        # Cross-checks for horizontal moves, indexed by [row][col],
+        # and for vertical moves, indexed by [col][row]
+        self._horiz = [[self._all_bits] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+        self._vert = [[self._all_bits] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+        # Bit patterns of the empty squares that are adjacent
+        # to a tile on the board, by row and by column
+        self._adj_rows = [0] * BOARD_SIZE
+        self._adj_cols = [0] * BOARD_SIZE
+
+    def update(self, board: Board) -> None:
+        """Bring the cross-checks up to date with the contents of the board"""
+        dawg = Wordbase.dawg()
+        if dawg is not self._dawg or dawg.overlay is not self._overlay:
+            # The dictionary, or the words in it, have changed: start over
+            self._reset(dawg)
+        # pylint: disable=protected-access
+        letters = board._letters
+        if letters == self._letters:
+            # No change
+            return
+        rows: Set[int] = set()
+        cols: Set[int] = set()
+        for ix, (old, new) in enumerate(zip(self._letters, letters)):
+            if old != new:
+                row, col = divmod(ix, BOARD_SIZE)
+                rows.add(row)
+                cols.add(col)
+        self._letters = letters[:]
+        # A changed square affects the horizontal cross-checks of the squares
+        # in its column, and the vertical cross-checks of those in its row
+        for col in cols:
+            for row in range(BOARD_SIZE):
+                self._horiz[row][col] = self._calc(board, row, col, True)
+        for row in rows:
+            vert = self._vert
+            for col in range(BOARD_SIZE):
+                vert[col][row] = self._calc(board, row, col, False)
+        # It also affects whether its neighbors are adjacent to tiles
+        for row in range(max(min(rows) - 1, 0), min(max(rows) + 2, BOARD_SIZE)):
+            self._adj_rows[row] = self._calc_adjacent(board, row, True)
+        for col in range(max(min(cols) - 1, 0), min(max(cols) + 2, BOARD_SIZE)):
+            self._adj_cols[col] = self._calc_adjacent(board, col, False)
+
+    @staticmethod
+    def _calc_adjacent(board: Board, index: int, horizontal: bool) -> int:
+        """Calculate the bit pattern of the empty squares along a row
+        or a column that are adjacent to a tile on the board"""
+        covered = board.covered_bits(index, horizontal)
+        neighbors = (covered << 1) | (covered >> 1)
+        if index > 0:
+            neighbors |= board.covered_bits(index - 1, horizontal)
+        if index < BOARD_SIZE - 1:
+            neighbors |= board.covered_bits(index + 1, horizontal)
+        return neighbors & ~covered & ((1 << BOARD_SIZE) - 1)
+
+    def _calc(self, board: Board, row: int, col: int, horizontal: bool) -> int:
+        """Calculate the cross-check set of a square"""
+        if board.is_covered(row, col):
+            return self._all_bits
+        if horizontal:
+            above = board.letters_above(row, col)
+            below = board.letters_below(row, col)
+        else:
+            above = board.letters_left(row, col)
+            below = board.letters_right(row, col)
+        if not (above or below):
+            # No cross word: any letter will do
+            return self._all_bits
+        return self._dawg.crosscheck_bits(above, below)
+
+    def axis(self, index: int, horizontal: bool) -> List[int]:
+        """Return the cross-checks of the squares along a row
+        (if horizontal) or a column (if vertical)"""
+        return self._horiz[index] if horizontal else self._vert[index]
+
+    def adjacent(self, index: int, horizontal: bool) -> int:
+        """Return a bit pattern of the empty squares along a row (if horizontal)
+        or a column (if vertical) that are adjacent to a tile on the board"""
+        return self._adj_rows[index] if horizontal else self._adj_cols[index]
+
+
 class Bag:
     """Represents a bag of tiles"""
 
@@ -575,10 +858,52 @@ class Rack:
         self._tiles = "".join(tiles)
 
 
+class UndoRecord(NamedTuple):
+    """The parts of a State that a move may change, as they stood
+    before the move was applied, for State.undo_move()"""
+
+    move: MoveBase
+    player_to_move: int
+    scores: Tuple[int, int]
+    num_passes: int
+    num_moves: int
+    game_resigned: bool
+    racks: Tuple[str, str]
+    bag: str
+    challenge_score: int
+    last_rack: Optional[str]
+    last_covers: Optional[List[Cover]]
+
+
+class StateSnapshot(TypedDict):
+    """A compact snapshot of the parts of a State that are determined
+    by the moves made in a game (see State.snapshot()), in a form
+    that can be stored as JSON"""
+
+    # The version of the snapshot format
+    v: int
+    # The board, as returned by Board.position_bytes(), base64-encoded
+    board: str
+    scores: List[int]
+    to_move: int
+    moves: int
+    passes: int
+    resigned: bool
+    # The challengeable state: the score of a challenge (0 if the last
+    # move is not challengeable), the rack before the last move and the
+    # covers it laid down, as (row, col, tile, letter) tuples
+    chall: int
+    last_rack: Optional[str]
+    last_covers: Optional[List[Tuple[int, int, str, str]]]
+
+
 class State:
     """Represents the state of a game at a particular point.
     Contains the current board, the racks, scores, etc."""
 
+    # The version of the format returned by snapshot()
+    SNAPSHOT_VERSION = 1
+
     def __init__(
         self,
         tileset: Optional[Type[TileSet]] = None,
@@ -592,6 +917,11 @@ class State:
         # The covers laid down in the last challengeable move
         self._last_covers: Optional[List[Cover]] = None
         self._board_type: BoardTypes
+        # The cross-checks of the board, calculated on demand
+        # for move generation (see crosschecks())
+        self._crosschecks: Optional[CrossChecks] = None
+        # The moves that can be taken back with undo_move(), most recent last
+        self._undo: List[UndoRecord] = []
 
         # pylint: disable=protected-access
         if copy is None:
@@ -640,6 +970,8 @@ class State:
             self._board_type = copy._board_type
             self._vocabulary = copy._vocabulary
             self._bag = Bag(tileset=None, copy=copy._bag)
+            if copy._crosschecks is not None:
+                self._crosschecks = CrossChecks(copy=copy._crosschecks)
 
     def load_board(self, board: Board) -> None:
         """Load a Board into this state"""
@@ -651,17 +983,40 @@ class State:
             return Error.NULL_MOVE
         return move.check_legality(self, validate)
 
-    def apply_move(self, move: MoveBase, shallow: bool = False) -> bool:
-        """Apply the given move, assumed to be legal, to this state"""
+    def apply_move(
+        self, move: MoveBase, shallow: bool = False, undoable: bool = False
+    ) -> bool:
+        """Apply the given move, assumed to be legal, to this state.
+        If undoable is True, the move can later be taken back
+        with undo_move()."""
         # A shallow apply is one that does not modify the racks or the bag.
         # It is used when loading game state from persistent storage.
         if not shallow and self.is_game_over():
             # Game is over, moves are not accepted any more
             return False
+        if undoable:
+            self._undo.append(
+                UndoRecord(
+                    move=move,
+                    player_to_move=self._player_to_move,
+                    scores=self.scores(),
+                    num_passes=self._num_passes,
+                    num_moves=self._num_moves,
+                    game_resigned=self._game_resigned,
+                    racks=(self.rack(0), self.rack(1)),
+                    bag=self._bag.contents(),
+                    challenge_score=self._challenge_score,
+                    last_rack=self._last_rack,
+                    last_covers=self._last_covers,
+                )
+            )
         # Update the player's score
         self._scores[self._player_to_move] += self.score(move)
         # Apply the move to the board state
         move.apply(self, shallow)
+        if self._crosschecks is not None:
+            # Update the cross-checks in the rows and columns touched by the move
+            self._crosschecks.update(self._board)
         # Increment the move count
         self._num_moves += 1
         if not (self._game_resigned or self._num_passes >= 6):
@@ -673,6 +1028,31 @@ class State:
         self._player_to_move = 1 - self._player_to_move
         return True
 
+    def undo_move(self) -> MoveBase:
+        """Take back the most recent move applied with undoable=True,
+        restoring this state to what it was before the move, including
+        the racks and the bag. Any changes made to the racks or the bag
+        after the move, such as drawing a random rack, are also undone.
+        Returns the move that was taken back."""
+        undo = self._undo.pop()
+        self._player_to_move = undo.player_to_move
+        self._scores = list(undo.scores)
+        self._num_passes = undo.num_passes
+        self._num_moves = undo.num_moves
+        self._game_resigned = undo.game_resigned
+        self._racks[0].set_tiles(undo.racks[0])
+        self._racks[1].set_tiles(undo.racks[1])
+        self._bag.set_contents(undo.bag)
+        self._challenge_score = undo.challenge_score
+        self._last_rack = undo.last_rack
+        self._last_covers = undo.last_covers
+        # Restore the board (the challengeable state has been restored
+        # above, as a ResponseMove needs the covers of the challenged move)
+        undo.move.unapply(self)
+        if self._crosschecks is not None:
+            self._crosschecks.update(self._board)
+        return undo.move
+
     @property
     def tileset(self) -> Optional[Type[TileSet]]:
         """Return the tileset for this game state"""
@@ -706,6 +1086,10 @@ class State:
         """Return the current score for both players"""
         return self._scores[0], self._scores[1]
 
+    def set_scores(self, scores: Tuple[int, int]) -> None:
+        """Set the current score for both players"""
+        self._scores = list(scores)
+
     def final_scores(self) -> Tuple[int, int]:
         """Return the final scores including adjustments, if any"""
         f0 = max(self._scores[0] + self._adj_scores[0], 0)
@@ -805,6 +1189,103 @@ class State:
         """Return the Board object of this state"""
         return self._board
 
+    def position_key(self, player: int) -> int:
+        """Return a 64-bit key that identifies the position as seen by
+        the given player, i.e. the board type, the tiles on the board
+        and the player's rack. Scores, the bag and the opponent's rack
+        are not part of the key."""
+        return (
+            self._board.position_hash()
+            ^ zobrist_key(_BOARD_TYPE_KEY_INDEX, self._board_type)
+            ^ rack_hash(self.rack(player))
+        )
+
+    def position_bytes(self, player: int) -> bytes:
+        """Return the position as seen by the given player in a compact
+        binary format: the board type and the player's rack (sorted),
+        each terminated by a zero byte, followed by the board contents
+        as returned by Board.position_bytes()"""
+        rack = "".join(sorted(self.rack(player)))
+        return (
+            f"{self._board_type}\0{rack}\0".encode("utf-8")
+            + self._board.position_bytes()
+        )
+
+    def snapshot(self) -> StateSnapshot:
+        """Return a snapshot of the board, the scores and the other parts
+        of this state that are determined by the moves made so far. The
+        racks, the bag (which follows from the board and the racks, see
+        recalc_bag()) and the final score adjustments are not included."""
+        covers = self._last_covers
+        return StateSnapshot(
+            v=State.SNAPSHOT_VERSION,
+            board=base64.b64encode(self._board.position_bytes()).decode("ascii"),
+            scores=list(self._scores),
+            to_move=self._player_to_move,
+            moves=self._num_moves,
+            passes=self._num_passes,
+            resigned=self._game_resigned,
+            chall=self._challenge_score,
+            last_rack=self._last_rack,
+            last_covers=(
+                None
+                if covers is None
+                else [(c.row, c.col, c.tile, c.letter) for c in covers]
+            ),
+        )
+
+    def restore_snapshot(self, snapshot: StateSnapshot) -> None:
+        """Restore a snapshot returned by snapshot() into this state,
+        which must not have had any moves applied to it. Raises
+        ValueError, leaving the state unchanged, if the snapshot
+        is not valid."""
+        try:
+            if snapshot["v"] != State.SNAPSHOT_VERSION:
+                raise ValueError(f"unknown version {snapshot['v']}")
+            board = Board(board_type=self._board_type)
+            board.load_position_bytes(
+                base64.b64decode(snapshot["board"], validate=True)
+            )
+            score0, score1 = snapshot["scores"]
+            covers = snapshot["last_covers"]
+            last_covers = (
+                None
+                if covers is None
+                else [
+                    Cover(int(row), int(col), str(tile), str(letter))
+                    for row, col, tile, letter in covers
+                ]
+            )
+            to_move = int(snapshot["to_move"])
+            num_moves = int(snapshot["moves"])
+            num_passes = int(snapshot["passes"])
+            resigned = bool(snapshot["resigned"])
+            challenge_score = int(snapshot["chall"])
+            last_rack = snapshot["last_rack"]
+        except (KeyError, TypeError, ValueError, IndexError, StopIteration) as e:
+            raise ValueError(f"Invalid state snapshot: {e!r}") from e
+        self._board = board
+        self._crosschecks = None
+        self._scores = [int(score0), int(score1)]
+        self._player_to_move = to_move
+        self._num_moves = num_moves
+        self._num_passes = num_passes
+        self._game_resigned = resigned
+        self._challenge_score = challenge_score
+        self._last_rack = last_rack
+        self._last_covers = last_covers
+
+    def crosschecks(self) -> CrossChecks:
+        """Return the cross-checks of the board, for move generation.
+        They are calculated on first use and then kept up to date
+        as moves are applied, for the lifetime of this state."""
+        if self._crosschecks is None:
+            self._crosschecks = CrossChecks(self._board)
+        else:
+            # Catch any changes made to the board outside of apply_move()
+            self._crosschecks.update(self._board)
+        return self._crosschecks
+
     def bag(self) -> Bag:
         """Return the current Bag"""
         return self._bag
@@ -959,6 +1440,14 @@ class MoveBase(abc.ABC):
         """Should be overridden in derived classes"""
         raise NotImplementedError
 
+    # noinspection PyMethodMayBeStatic,PyUnusedLocal
+    def unapply(self, state: State) -> None:
+        """Take back the changes that apply() made to the board.
+        The rest of the state is restored by State.undo_move(),
+        which calls this method."""
+        # No changes to the board unless overridden in derived classes
+        pass
+
     @abc.abstractmethod
     def summary(self, state: State) -> SummaryTuple:
         """Return a summary of the move, as a tuple: (coordinate, tiles, score)"""
@@ -1022,6 +1511,11 @@ class Move(MoveBase):
         """
         self._tiles = tiles
 
+    def set_score(self, score: int) -> None:
+        """Set the score of the move, if it has already been calculated,
+        e.g. by the move generator"""
+        self._score = score
+
     def replenish(self) -> bool:
         """Return True if the player's rack should be replenished after the move"""
         return True
@@ -1280,13 +1774,17 @@ class Move(MoveBase):
                     self._word += ltr
                     self._tiles += ltr
 
-        def is_valid_word(word: str) -> bool:
-            """Check whether a word is in the dictionary,
-            unless this is a manual game"""
-            return state.manual_wordcheck or not validate or (word in self._dawg)
+        # Collect the cross words formed by the new tiles, if any, so that
+        # they can be checked against the dictionary along with the main word
+        crosses = [] if board.is_empty() else self._cross_words(board)
+        invalid: Set[str] = set()
+        if validate and not state.manual_wordcheck:
+            # Not a manual game: check all the words in one go
+            words = [self._word] + crosses
+            invalid = {w for w, ok in zip(words, self._dawg.find_many(words)) if not ok}
 
         # Check whether the word is in the dictionary
-        if not is_valid_word(self._word):
+        if self._word in invalid:
             return (Error.WORD_NOT_IN_DICTIONARY, self._word)
 
         # Check that the play is adjacent to some previously placed tile
@@ -1304,36 +1802,17 @@ class Move(MoveBase):
             if not any([board.has_adjacent(c.row, c.col) for c in self._covers]):
                 return Error.NOT_ADJACENT
             # Check all cross words formed by the new tiles
-            for c in self._covers:
-                if self._horizontal:
-                    cross = (
-                        board.letters_above(c.row, c.col)
-                        + c.letter
-                        + board.letters_below(c.row, c.col)
-                    )
-                else:
-                    cross = (
-                        board.letters_left(c.row, c.col)
-                        + c.letter
-                        + board.letters_right(c.row, c.col)
-                    )
-                if len(cross) > 1 and not is_valid_word(cross):
+            for cross in crosses:
+                if cross in invalid:
                     return (Error.CROSS_WORD_NOT_IN_DICTIONARY, cross)
 
         # All checks pass: the play is legal
         return Error.LEGAL
 
-    def check_words(self, board: Board) -> List[str]:
-        """Do simple word validation on this move, returning
-        a list of invalid words formed"""
-
-        invalid: List[str] = []
-
-        # Check whether the main word is in the dictionary
-        if self._word not in self._dawg:
-            invalid.append(self._word)
-
-        # Check all cross words formed by the new tiles
+    def _cross_words(self, board: Board) -> List[str]:
+        """Return the cross words, of two or more letters,
+        formed by the new tiles of this move"""
+        crosses: List[str] = []
         for c in self._covers:
             if self._horizontal:
                 cross = (
@@ -1347,10 +1826,18 @@ class Move(MoveBase):
                     + c.letter
                     + board.letters_right(c.row, c.col)
                 )
-            if len(cross) > 1 and cross not in self._dawg:
-                invalid.append(cross)
+            if len(cross) > 1:
+                crosses.append(cross)
+        return crosses
 
-        return invalid  # Returns an empty list if all words are valid
+    def check_words(self, board: Board) -> List[str]:
+        """Do simple word validation on this move, returning
+        a list of invalid words formed"""
+        # Check the main word and all cross words formed
+        # by the new tiles in a single dictionary traversal
+        words = [self._word] + self._cross_words(board)
+        # Returns an empty list if all words are valid
+        return [w for w, ok in zip(words, self._dawg.find_many(words)) if not ok]
 
     def score(self, state: State) -> int:
         """Calculate the score of this move, which is assumed to be legal"""
@@ -1443,6 +1930,13 @@ class Move(MoveBase):
             # Automatic wordcheck: not challengeable
             state.clear_challengeable()
 
+    def unapply(self, state: State) -> None:
+        """Remove the tiles of this move from the board"""
+        board = state.board()
+        for c in self._covers:
+            board.set_letter(c.row, c.col, " ")
+            board.set_tile(c.row, c.col, " ")
+
 
 class ExchangeMove(MoveBase):
     """Represents an exchange move, where tiles are returned to the bag
@@ -1623,6 +2117,16 @@ class ResponseMove(MoveBase):
                 bag.subtract_rack(rack.contents())
         state.clear_challengeable()
 
+    def unapply(self, state: State) -> None:
+        """Put the tiles of a successfully challenged move back on the board"""
+        if self._num_covers < 0:
+            board = state.board()
+            last_covers = state.last_covers
+            assert last_covers is not None
+            for c in last_covers:
+                board.set_letter(c.row, c.col, c.letter)
+                board.set_tile(c.row, c.col, c.tile)
+
 
 class PassMove(MoveBase):
     """Represents a pass move, where the player does nothing"""
@@ -1687,3 +2191,82 @@ class ResignMove(MoveBase):
     def check_legality(self, state: State, validate: bool) -> Union[int, Tuple[int, str]]:
         """A ResignMove is always legal"""
         return Error.LEGAL
+
+
+def decode_move(board: Board, summary: SummaryTuple) -> Optional[MoveBase]:
+    """Recreate a move on the given board from its summary tuple,
+    as returned by MoveBase.summary(), returning None if the
+    summary is not valid"""
+    coord, tiles, score = summary
+
+    if coord:
+        # Normal tile move
+        # Decode the coordinate: A15 = horizontal, 15A = vertical
+        if coord[0] in Board.ROWIDS:
+            row = Board.ROWIDS.index(coord[0])
+            col = int(coord[1:]) - 1
+            horiz = True
+        else:
+            row = Board.ROWIDS.index(coord[-1])
+            col = int(coord[0:-1]) - 1
+            horiz = False
+        # The tiles string may contain wildcards followed by their meaning
+        # Remove the ? marks to get the "plain" word formed
+        if tiles:
+            m = Move(tiles.replace("?", ""), row, col, horiz)
+            m.make_covers(board, tiles)
+            return m
+        return None
+
+    if not tiles:
+        # Degenerate (error) case: this game is stored incorrectly
+        # in the NDB datastore. Probably an artifact of the move to
+        # Google Cloud NDB.
+        return None
+
+    if tiles[0:4] == "EXCH":
+        # Exchange move
+        return ExchangeMove(tiles[5:])
+
+    if tiles == "PASS":
+        # Pass move
+        return PassMove()
+
+    if tiles == "RSGN":
+        # Game resigned
+        return ResignMove(-score)
+
+    if tiles == "CHALL":
+        # Last move challenged
+        return ChallengeMove()
+
+    if tiles == "RESP":
+        # Response to challenge
+        return ResponseMove(score)
+
+    return None
+
+
+def unique_moves(board: Board, summaries: List[SummaryTuple]) -> List[SummaryTuple]:
+    """Remove duplicate single-tile moves from a list of move summaries.
+    A single tile that forms words in both directions can be described
+    as a horizontal or as a vertical move; only the horizontal one is
+    kept, at the position of the first of the two in the list."""
+    result: List[SummaryTuple] = []
+    # The index in the result of each single-tile placement found so far
+    placed: Dict[Cover, int] = {}
+    for summary in summaries:
+        move = decode_move(board, summary)
+        if not isinstance(move, Move) or move.num_covers() != 1:
+            result.append(summary)
+            continue
+        cover = move.covers()[0]
+        ix = placed.get(cover)
+        if ix is None:
+            placed[cover] = len(result)
+            result.append(summary)
+        elif summary[0][0] in Board.ROWIDS:
+            # Horizontal move (A15, not 15A): keep it
+            # in place of the vertical one
+            result[ix] = summary
+    return result
@@ -22,9 +22,11 @@
 
     Moves are found by examining each one-dimensional Axis of the board
     in turn, i.e. 15 rows and 15 columns for a total of 30 axes.
-    For each Axis an array of Squares is constructed. The cross-check set
-    of each empty Square is calculated, i.e. the set of letters that form
-    valid words by connecting with word parts across the square's Axis.
+    For each Axis, the letters and cross-check sets of its squares are
+    looked up. The cross-check set of an empty square is the set of letters
+    that form valid words by connecting with word parts across the Axis.
+    The cross-check sets are kept with the game State and updated
+    incrementally as moves are made (see CrossChecks in skraflmechanics.py).
     To save processing time, the cross-check sets are also intersected with
     the letters in the rack, unless the rack contains a blank tile.
 
@@ -63,6 +65,14 @@
     while steps 4)-7) are found in ExtendRightNavigator. These classes
     correspond to the Appel & Jacobson LeftPart and ExtendRight functions.
 
+    If a GADDAG is available for the vocabulary (see the DAWG_GADDAG
+    setting in config.py), Axis.generate_moves_gaddag() is used instead.
+    Following Gordon, "A Faster Scrabble Move Generation Algorithm",
+    it grows words from each anchor square leftwards and then, after
+    a separator in the graph, rightwards, so that left parts need not
+    be permuted up front. It finds exactly the same moves, in the same
+    order, as the Appel & Jacobson algorithm.
+
     Note: SCRABBLE is a registered trademark. This software or its author
     are in no way affiliated with or endorsed by the owners or licensees
     of the SCRABBLE trademark.
@@ -73,6 +83,7 @@ from __future__ import annotations
 
 from typing import (
     Any,
+    Iterable,
     NamedTuple,
     Optional,
     List,
@@ -82,28 +93,38 @@ from typing import (
     cast,
 )
 
+from array import array
+import heapq
 import random
+import time
+import threading
+from collections import OrderedDict
 from enum import Enum
 
-from dawgdictionary import PackedDawgDictionary
+from config import LEFTPART_CACHE_ENTRIES, LEFTPART_CACHE_BYTES
+from dawgdictionary import PackedDawgDictionary, PackedGaddagDictionary
 from wordbase import Wordbase
-from languages import current_alphabet
+from languages import current_alphabet, current_vocabulary
 from skraflmechanics import (
     State,
     Board,
     BOARD_SIZE,
     Cover,
+    CrossChecks,
     MoveBase,
     Move,
+    Rack,
     ExchangeMove,
     PassMove,
 )
-from dawgdictionary import Navigator
+from dawgdictionary import CountedRack, Navigator
 
 
 # Type definitions
 
-LeftPart = Tuple[str, str, str, int]
+# A left part: the matched letters, the state of the CountedRack
+# after placing them, and the edge prefix and next node of the graph
+LeftPart = Tuple[str, int, str, int]
 
 
 class MoveTuple(NamedTuple):
@@ -114,6 +135,18 @@ class MoveTuple(NamedTuple):
 MoveList = List[MoveTuple]
 
 
+class LeftPartCacheStats(TypedDict):
+    """Statistics for the LeftPartCache"""
+
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+    max_entries: int
+    max_bytes: int
+
+
 class AutoPlayerKwargs(TypedDict, total=False):
 
     """ kwargs optionally passed to an autoplayer constructor """
@@ -131,80 +164,46 @@ class AutoPlayerKwargs(TypedDict, total=False):
     discard_best_ratio_losing: float
 
 
-class Square:
-
-    """Represents a single square within an axis.
-    A square knows about its cross-checks, i.e. which letters can be
-    legally placed in the square while matching correctly with word
-    parts above and/or below the square.
-    """
-
-    def __init__(self) -> None:
-        # Cross checks, i.e. possible letters to be placed here,
-        # represented as a bit pattern
-        self._cc = 0
-        # The tile located here, '?' if blank tile
-        self._tile: Optional[str] = None
-        # The letter located here, including meaning of blank tile
-        self._letter: Optional[str] = None
-        # Is this an anchor square?
-        self._anchor = False
-
-    def init(self, autoplayer: AutoPlayer, row: int, col: int, crosscheck: int) -> None:
-        """ Initialize this square from the board """
-        board = autoplayer.board()
-        self._tile = board.tile_at(row, col)
-        self._letter = board.letter_at(row, col)
-        # Cross checks and anchors
-        self._cc = crosscheck
-        if self.is_open() and board.has_adjacent(row, col):
-            # Empty square with adjacent covered squares and nonzero cross-checks:
-            # mark as anchor
-            self.mark_anchor()
-
-    def is_empty(self) -> bool:
-        """ Is this square empty? """
-        return self._letter == " "
-
-    def is_open(self) -> bool:
-        """ Can a new tile from the rack be placed here? """
-        return self.is_empty() and bool(self._cc)
-
-    def is_open_for(self, letter_bit: int) -> bool:
-        """ Can this letter be placed here? """
-        return bool(self._cc & letter_bit)
-
-    @property
-    def letter(self) -> str:
-        """ Return the letter at this square """
-        return self._letter or ""
-
-    def mark_anchor(self) -> None:
-        """ Mark this square as an anchor """
-        self._anchor = True
-
-    def is_anchor(self) -> bool:
-        """ Is this an anchor square? """
-        return self._anchor
-
-
 class Axis:
 
     """Represents a one-dimensional axis on the board, either
     horizontal or vertical. This is used to find legal moves
     for an AutoPlayer.
+
+    The state of the squares on the axis is kept in a compact form:
+    the letters as a string (with ' ' for empty squares), the cross-check
+    bit pattern of each square in a fixed-size list, and bit patterns of
+    the empty, open and anchor squares, with bit i denoting square i.
     """
 
     def __init__(self, autoplayer: AutoPlayer, index: int, horizontal: bool) -> None:
 
         self._autoplayer = autoplayer
-        self._sq = [Square() for _ in range(BOARD_SIZE)]
         self._index = index
         self._horizontal = horizontal
         self._rack = autoplayer.rack()
+        # The letters on this axis, including the meaning of blank tiles
+        self._letters = " " * BOARD_SIZE
+        # Cross checks, i.e. possible letters to be placed in each square,
+        # represented as bit patterns
+        self._cc = [0] * BOARD_SIZE
         # Bit pattern representing empty squares on this axis
         self._empty_bits = 0
-        self._dawg = Wordbase.dawg()
+        # Bit pattern representing open squares, i.e. empty squares
+        # where a tile from the rack can be placed
+        self._open_bits = 0
+        # Bit pattern representing anchor squares
+        self._anchor_bits = 0
+        # Scoring data for each square: the letter and word multipliers,
+        # the score of the tile on the board (if any), and the score of
+        # the tiles that would form a cross word with a tile placed there
+        # (or -1 if no cross word would be formed)
+        self._lm = [1] * BOARD_SIZE
+        self._wm = [1] * BOARD_SIZE
+        self._tile_score = [0] * BOARD_SIZE
+        self._cross_score = [-1] * BOARD_SIZE
+        # The dictionary that the words formed along the axis are taken from
+        self._dawg = autoplayer.dawg()
 
     def is_horizontal(self) -> bool:
         """ Is this a horizontal (row) axis? """
@@ -222,22 +221,36 @@ class Axis:
         """ How to move along this axis on the board, (row,col) """
         return (0, 1) if self._horizontal else (1, 0)
 
+    @property
+    def letters(self) -> str:
+        """ Return the letters on this axis, with ' ' for empty squares """
+        return self._letters
+
+    @property
+    def crosschecks(self) -> List[int]:
+        """ Return the cross-check bit patterns of the squares on this axis """
+        return self._cc
+
     def letter_at(self, index: int) -> str:
         """ Return the letter at the index """
-        return self._sq[index].letter
+        return self._letters[index]
 
     def is_open(self, index: int) -> bool:
         """ Is the square at the index open (i.e. can a tile be placed there?) """
-        return self._sq[index].is_open()
+        return bool(self._open_bits & (1 << index))
 
     def is_open_for(self, index: int, letter_bit: int) -> bool:
         """ Is the square at the index open for this letter? """
-        return self._sq[index].is_open_for(letter_bit)
+        return bool(self._cc[index] & letter_bit)
 
     def is_empty(self, index: int) -> bool:
         """ Is the square at the index empty? """
         return bool(self._empty_bits & (1 << index))
 
+    def is_anchor(self, index: int) -> bool:
+        """ Is the square at the index an anchor? """
+        return bool(self._anchor_bits & (1 << index))
+
     @property
     def autoplayer(self) -> AutoPlayer:
         """ Return the associated Autoplayer instance """
@@ -246,60 +259,170 @@ class Axis:
     def mark_anchor(self, index: int) -> None:
         """Force the indicated square to be an anchor. Used in first move
         to mark the start square."""
-        self._sq[index].mark_anchor()
+        self._anchor_bits |= 1 << index
+
+    def add_candidate(self, word: str, ix: int) -> None:
+        """Add a word starting at the given index within the axis
+        to the AutoPlayer's candidate list"""
+        overlay = self._dawg.overlay
+        if overlay is not None and word in overlay.removed:
+            # The word is in the graph but has been removed at run time
+            return
+        # Fetch the rack as it was at the beginning of move generation
+        autoplayer = self._autoplayer
+        rack = autoplayer.rack()
+        scores = autoplayer.tile_scores()
+        # Bit mask of the positions within the word that are covered
+        # by blank tiles, and the number of squares covered
+        blanks = 0
+        covers = 0
+        # Calculate the score of the move as we go, in the same way
+        # as Move.score(): the letter score sum and the word multiplier
+        # of the main word, and the total score of the cross words
+        main_score = 0
+        word_mult = 1
+        cross_score = 0
+        for i, c in enumerate(word, start=ix):
+            if self.is_empty(i):
+                # Empty square that is being covered by this move
+                # Find out whether it is a blank or normal letter tile
+                if c in rack:
+                    rack = rack.replace(c, "", 1)
+                    tile = c
+                else:
+                    # Must be a wildcard match
+                    rack = rack.replace("?", "", 1)
+                    tile = "?"
+                    blanks |= 1 << (i - ix)
+                covers += 1
+                last = i
+                lscore = scores[tile] * self._lm[i]
+                main_score += lscore
+                word_mult *= self._wm[i]
+                if self._cross_score[i] >= 0:
+                    cross_score += (lscore + self._cross_score[i]) * self._wm[i]
+            else:
+                main_score += self._tile_score[i]
+        if covers == 1 and not self._horizontal and self._cross_score[last] >= 0:
+            # A single tile that also forms a word across this (vertical)
+            # axis: the same move is found on the horizontal axis of its row
+            row, col = self.coordinate_of(last)
+            if autoplayer.is_found_horizontally(row, col, word[last - ix]):
+                return
+        score = main_score * word_mult + cross_score
+        if covers == Rack.MAX_TILES:
+            score += Move.BINGO_BONUS
+        row, col = self.coordinate_of(ix)
+        autoplayer.add_candidate(
+            row, col, self._horizontal, word, blanks, covers, score
+        )
+
+    def _upper_bound(self, lo: int) -> int:
+        """Return an upper bound on the score of any move on this axis
+        that places its tiles at or to the right of the index lo,
+        where lo is the start of the words that are formed"""
+        open_bits = self._open_bits
+        squares = [ix for ix in range(lo, BOARD_SIZE) if open_bits & (1 << ix)]
+        rack_scores = self._autoplayer.rack_scores()
+        # The number of tiles that can be placed
+        n = min(len(rack_scores), len(squares))
+        lm = self._lm
+        wm = self._wm
+        # Place the highest-scoring tiles on the highest letter multipliers
+        # and assume that all the highest word multipliers are covered
+        letter_mults = sorted((lm[ix] for ix in squares), reverse=True)
+        letters = sum(sc * m for sc, m in zip(rack_scores, letter_mults))
+        word_mult = 1
+        for m in sorted((wm[ix] for ix in squares), reverse=True)[:n]:
+            word_mult *= m
+        tiles = sum(self._tile_score[lo:])
+        # Assume that the highest-scoring cross words are formed,
+        # with the highest-scoring tile
+        top = rack_scores[0] if rack_scores else 0
+        cross = sorted(
+            (
+                (top * lm[ix] + self._cross_score[ix]) * wm[ix]
+                for ix in squares
+                if self._cross_score[ix] >= 0
+            ),
+            reverse=True,
+        )
+        bound = (tiles + letters) * word_mult + sum(cross[:n])
+        if n >= Rack.MAX_TILES:
+            bound += Move.BINGO_BONUS
+        return bound
+
+    def score_bound(self) -> int:
+        """Return an upper bound on the score of any move on this axis"""
+        return self._upper_bound(0)
+
+    def _can_improve(self, anchor: int, maxleft: int) -> bool:
+        """Return False if no move from the given anchor, with a left
+        part of at most maxleft rack tiles, can score high enough to
+        make it into the AutoPlayer's list of top candidates"""
+        threshold = self._autoplayer.score_threshold()
+        if threshold is None:
+            return True
+        lo = anchor - maxleft
+        # Include any tiles on the board that are part of the left part
+        while lo > 0 and not self.is_empty(lo - 1):
+            lo -= 1
+        return self._upper_bound(lo) >= threshold
 
     def init_crosschecks(self) -> None:
-        """Calculate and return a list of cross-check
-        bit patterns for the indicated axis"""
+        """Initialize the squares of the axis from the board,
+        with cross-check bit patterns intersected with the rack"""
 
-        alphabet = current_alphabet()
         # The cross-check set is the set of letters that can appear in a square
-        # and make cross words (above/left and/or below/right of the square) valid
-        board = self._autoplayer.board()
-        # Prepare to visit all squares on the axis
-        x, y = self.coordinate_of(0)
-        xd, yd = self.coordinate_step()
+        # and make cross words (above/left and/or below/right of the square) valid.
+        # These are maintained for the board as a whole, in the game state.
+        autoplayer = self._autoplayer
+        crosschecks = autoplayer.crosschecks()
+        axis_cc = crosschecks.axis(self._index, self._horizontal)
+        letters = autoplayer.board().axis_letters(self._index, self._horizontal)
+        self._letters = letters
         # Fetch the default cross-check bits, which depend on the rack.
         # If the rack contains a wildcard (blank tile), the default cc set
         # contains all letters in the Alphabet. Otherwise, it contains the
         # letters in the rack.
-        all_cc = self._autoplayer.rack_bit_pattern()
-        # Go through the open squares and calculate their cross-checks
+        all_cc = autoplayer.rack_bit_pattern()
+        # Reduce the cross-check sets by intersecting them with the rack.
+        # If a cross-check set and the rack have nothing in common, this
+        # will lead to the square being marked as closed, which saves
+        # calculation later on
+        cc = self._cc = [all_cc & bits for bits in axis_cc]
+        empty_bits = open_bits = 0
+        for ix, letter in enumerate(letters):
+            if letter == " ":
+                empty_bits |= 1 << ix
+                if cc[ix]:
+                    open_bits |= 1 << ix
+        self._empty_bits = empty_bits
+        self._open_bits = open_bits
+        # Open squares that are adjacent to covered squares are anchors
+        self._anchor_bits = open_bits & crosschecks.adjacent(
+            self._index, self._horizontal
+        )
+        # Collect the scoring data of the squares
+        board = autoplayer.board()
+        scores = autoplayer.tile_scores()
+        x, y = self.coordinate_of(0)
+        xd, yd = self.coordinate_step()
         for ix in range(BOARD_SIZE):
-            cc = all_cc  # Start with the default cross-check set
-            if not board.is_covered(x, y):
-                if self.is_horizontal():
-                    above = board.letters_above(x, y)
-                    below = board.letters_below(x, y)
+            self._lm[ix] = board.letterscore(x, y)
+            self._wm[ix] = board.wordscore(x, y)
+            if empty_bits & (1 << ix):
+                if self._horizontal:
+                    cross = board.tiles_above(x, y) + board.tiles_below(x, y)
                 else:
-                    above = board.letters_left(x, y)
-                    below = board.letters_right(x, y)
-                query = above or ""
-                query += "?"
-                if below:
-                    query += below
-                if len(query) > 1:
-                    # Nontrivial cross-check: Query the word database
-                    # for words that fit this pattern
-                    # Don't need a sorted result
-                    matches = self._dawg.find_matches(query, sort=False)
-                    bits = 0
-                    if matches:
-                        cix = len(above) if above else 0
-                        # Note the set of allowed letters here
-                        bits = alphabet.bit_pattern(
-                            "".join(wrd[cix] for wrd in matches)
-                        )
-                    # Reduce the cross-check set by intersecting it with the allowed set.
-                    # If the cross-check set and the rack have nothing in common, this
-                    # will lead to the square being marked as closed, which saves
-                    # calculation later on
-                    cc &= bits
-            # Initialize the square
-            self._sq[ix].init(self._autoplayer, x, y, cc)
-            # Keep track of empty squares within the axis in a bit pattern for speed
-            if self._sq[ix].is_empty():
-                self._empty_bits |= 1 << ix
+                    cross = board.tiles_left(x, y) + board.tiles_right(x, y)
+                self._tile_score[ix] = 0
+                self._cross_score[ix] = (
+                    sum(scores[tile] for tile in cross) if cross else -1
+                )
+            else:
+                self._tile_score[ix] = scores[board.tile_at(x, y)]
+                self._cross_score[ix] = -1
             x += xd
             y += yd
 
@@ -307,13 +430,14 @@ class Axis:
         self, index: int, maxleft: int, lpn: Optional[LeftPermutationNavigator]
     ) -> None:
         """ Find valid moves emanating (on the left and right) from this anchor """
+        # The rack, as tile counts shared by the navigators
+        rack = self._autoplayer.counted_rack()
         if maxleft == 0 and index > 0 and not self.is_empty(index - 1):
             # We have a left part already on the board: try to complete it
-            leftpart = ""
             ix = index
             while ix > 0 and not self.is_empty(ix - 1):
-                leftpart = self._sq[ix - 1].letter + leftpart
                 ix -= 1
+            leftpart = self._letters[ix:index]
             # Use the ExtendRightNavigator to find valid words with this left part
             nav = LeftFindNavigator(leftpart)
             self._dawg.navigate(nav)
@@ -322,14 +446,14 @@ class Axis:
                 # We found a matching prefix in the graph
                 _, prefix, next_node = ns
                 # assert matched == leftpart
-                rnav = ExtendRightNavigator(self, index, self._rack)
+                rnav = ExtendRightNavigator(self, index, rack, 0)
                 self._dawg.resume_navigation(rnav, prefix, next_node, leftpart)
             return
 
         # We are not completing an existing left part
         # Begin by extending an empty prefix to the right, i.e. placing
         # tiles on the anchor square itself and to its right
-        rnav = ExtendRightNavigator(self, index, self._rack)
+        rnav = ExtendRightNavigator(self, index, rack, 0)
         self._dawg.navigate(rnav)
 
         if maxleft > 0 and lpn is not None:
@@ -338,8 +462,8 @@ class Axis:
             for left_len in range(1, maxleft + 1):
                 lp_list = lpn.leftparts(left_len)
                 if lp_list is not None:
-                    for leftpart, rack_leave, prefix, next_node in lp_list:
-                        rnav = ExtendRightNavigator(self, index, rack_leave)
+                    for leftpart, leave, prefix, next_node in lp_list:
+                        rnav = ExtendRightNavigator(self, index, rack, leave)
                         self._dawg.resume_navigation(rnav, prefix, next_node, leftpart)
 
     def generate_moves(self, lpn: Optional[LeftPermutationNavigator]) -> None:
@@ -347,8 +471,10 @@ class Axis:
         at and around all anchor squares"""
         last_anchor = -1
         len_rack = len(self._rack)
+        anchor_bits = self._anchor_bits
+        open_bits = self._open_bits
         for i in range(BOARD_SIZE):
-            if self._sq[i].is_anchor():
+            if anchor_bits & (1 << i):
                 # Count the consecutive open, non-anchor squares on the left of the anchor
                 open_sq = 0
                 left = i
@@ -356,14 +482,251 @@ class Axis:
                 while (
                     left > 0
                     and left > (last_anchor + 1)
-                    and self._sq[left - 1].is_open()
+                    and open_bits & (1 << (left - 1))
                 ):
                     open_sq += 1
                     left -= 1
                 # We have a maximum left part length of min(open_sq, len_rack-1) as the anchor
                 # square itself must always be filled from the rack
-                self._gen_moves_from_anchor(i, min(open_sq, len_rack - 1), lpn)
+                maxleft = max(0, min(open_sq, len_rack - 1))
+                if self._autoplayer.out_of_time():
+                    break
+                if self._can_improve(i, maxleft):
+                    self._gen_moves_from_anchor(i, maxleft, lpn)
+                last_anchor = i
+
+    def generate_moves_gaddag(self, gaddag: PackedGaddagDictionary) -> None:
+        """Find all valid moves on this axis by growing words outwards
+        from each anchor square through a GADDAG, first leftwards from
+        the anchor and then, after the separator, rightwards. This finds
+        exactly the same moves as generate_moves(), in the same order."""
+        _, final = gaddag.graph()
+        edge_map = gaddag.edge_map
+        sep = gaddag.separator
+        order = current_alphabet().order
+        # The letter code in each square, or -1 if the square is empty
+        board = [-1 if c == " " else order.index(c) for c in self._letters]
+        crosscheck = self._cc
+        anchor_bits = self._anchor_bits
+        open_bits = self._open_bits
+        # The rack, as a count of each letter and of blank tiles,
+        # and a bit pattern of the letters with a nonzero count
+        counts = [0] * len(order)
+        blanks = 0
+        rack_bits = 0
+        for tile in self._rack:
+            if tile == "?":
+                blanks += 1
+            else:
+                code = order.index(tile)
+                counts[code] += 1
+                rack_bits |= 1 << code
+        all_bits = (1 << len(order)) - 1
+        sep_bit = 1 << sep
+        # The letter codes placed on and to the left of the anchor, from
+        # right to left, and those placed to the right of the anchor
+        left: List[int] = []
+        right: List[int] = []
+        # Words found from the current anchor, as (left part length, codes)
+        found: List[Tuple[int, List[int]]] = []
+        anchor = 0
+        # The leftmost square that may be covered by a rack tile
+        lowest = 0
+        # True if the anchor is preceded by tiles on the board,
+        # which must then all be part of the word
+        forced = False
+
+        def walk(node: int, pos: int, leftward: bool) -> None:
+            """Follow the edges of a GADDAG node, the next letter
+            going into the square at pos"""
+            nonlocal blanks, rack_bits
+            # Find the letter codes that can start an edge from here,
+            # so that most edges can be skipped without further ado
+            allowed = 0
+            if 0 <= pos < BOARD_SIZE:
+                b = board[pos]
+                if b >= 0:
+                    if not leftward or pos >= anchor or forced:
+                        allowed = 1 << b
+                elif not leftward or pos >= lowest:
+                    allowed = crosscheck[pos] & (all_bits if blanks else rack_bits)
+            if leftward and (pos < 0 or board[pos] < 0) and anchor + 1 < BOARD_SIZE:
+                allowed |= sep_bit
+            if not allowed:
+                return
+            emap = edge_map(node)
+            while allowed:
+                bit = allowed & -allowed
+                allowed ^= bit
+                edge = emap.get(bit.bit_length() - 1)
+                if edge is None:
+                    continue
+                prefix, nextnode = edge
+                p = pos
+                lw = leftward
+                len_left = len(left)
+                len_right = len(right)
+                # The rack tiles that we use, for restoring them afterwards
+                used: List[int] = []
+                last = len(prefix) - 1
+                for j, code in enumerate(prefix):
+                    c = code & 0x7F
+                    if c == sep:
+                        # Switch to the right part, if the left part is complete
+                        if (
+                            not lw
+                            or (p >= 0 and board[p] >= 0)
+                            or anchor + 1 >= BOARD_SIZE
+                        ):
+                            break
+                        lw = False
+                        p = anchor + 1
+                        continue
+                    if p < 0 or p >= BOARD_SIZE:
+                        break
+                    b = board[p]
+                    if b >= 0:
+                        # A tile on the board: the letter must match it
+                        if b != c or (lw and p < anchor and not forced):
+                            break
+                    else:
+                        if lw and p < lowest:
+                            break
+                        if not crosscheck[p] & (1 << c):
+                            break
+                        # Use a letter tile from the rack if we have one,
+                        # otherwise a blank tile
+                        if counts[c]:
+                            counts[c] -= 1
+                            if not counts[c]:
+                                rack_bits &= ~(1 << c)
+                            used.append(c)
+                        elif blanks:
+                            blanks -= 1
+                            used.append(-1)
+                        else:
+                            break
+                    if lw:
+                        left.append(c)
+                        p -= 1
+                    else:
+                        right.append(c)
+                        p += 1
+                    if (code & 0x80 or (j == last and final[nextnode] & 0x80)) and (
+                        len(left) + len(right) > 1
+                    ):
+                        # A complete word: check that it is delimited
+                        # by empty squares (or the board edge) on both ends
+                        if lw:
+                            if (p < 0 or board[p] < 0) and (
+                                anchor + 1 >= BOARD_SIZE or board[anchor + 1] < 0
+                            ):
+                                found.append((len(left) - 1, left[::-1]))
+                        elif p >= BOARD_SIZE or board[p] < 0:
+                            found.append((len(left) - 1, left[::-1] + right))
+                else:
+                    # Went through the entire edge: continue with the next node
+                    if nextnode:
+                        walk(nextnode, p, lw)
+                # Restore the state as it was before this edge
+                del left[len_left:]
+                del right[len_right:]
+                for c in used:
+                    if c < 0:
+                        blanks += 1
+                    else:
+                        counts[c] += 1
+                        rack_bits |= 1 << c
+
+        last_anchor = -1
+        len_rack = len(self._rack)
+        for i in range(BOARD_SIZE):
+            if anchor_bits & (1 << i):
+                # Count the open squares to the left of the anchor,
+                # as in generate_moves()
+                open_sq = 0
+                left_ix = i
+                while (
+                    left_ix > 0
+                    and left_ix > (last_anchor + 1)
+                    and open_bits & (1 << (left_ix - 1))
+                ):
+                    open_sq += 1
+                    left_ix -= 1
                 last_anchor = i
+                maxleft = max(0, min(open_sq, len_rack - 1))
+                if self._autoplayer.out_of_time():
+                    break
+                if not self._can_improve(i, maxleft):
+                    # No move from this anchor can make the cut
+                    continue
+                anchor = i
+                lowest = i - maxleft
+                forced = i > 0 and board[i - 1] >= 0
+                walk(0, i, True)
+                # Add the moves in the order in which generate_moves()
+                # finds them, i.e. by length of the left part and then
+                # in alphabetical (graph) order
+                found.sort()
+                for left_len, codes in found:
+                    self.add_candidate("".join(order[c] for c in codes), i - left_len)
+                found.clear()
+
+    def generate_overlay_moves(self) -> None:
+        """Find the moves on this axis that form words which have been
+        added to the dictionary at run time, in its overlay. Such words
+        are not in the graph and are thus not found by generate_moves()
+        or generate_moves_gaddag(), so we simply place them using
+        place_words()."""
+        overlay = self._dawg.overlay
+        if overlay is None or not overlay.added:
+            return
+        self.place_words(
+            word
+            for length in range(2, BOARD_SIZE + 1)
+            for word in overlay.added_of_length(length)
+        )
+
+    def place_words(self, words: Iterable[str]) -> None:
+        """Find the moves on this axis that form any of the given words,
+        by trying to place each of them, covering at least one anchor
+        square, at every position. This is only suitable for short
+        lists of words."""
+        anchor_bits = self._anchor_bits
+        if not anchor_bits:
+            return
+        # Empty squares, with the board edges counting as empty
+        empty_bits = (self._empty_bits << 1) | 1 | (1 << (BOARD_SIZE + 1))
+        letter_bit = current_alphabet().letter_bit
+        for word in words:
+            length = len(word)
+            span = (1 << length) - 1
+            for start in range(BOARD_SIZE - length + 1):
+                if not anchor_bits & (span << start):
+                    # The word must cover at least one anchor square
+                    continue
+                if not empty_bits & (1 << start) or not empty_bits & (
+                    1 << (start + length + 1)
+                ):
+                    # The word must not be adjacent to other tiles
+                    continue
+                rack = self._rack
+                for ix, c in enumerate(word, start=start):
+                    letter = self._letters[ix]
+                    if letter != " ":
+                        # The word must match the tiles on the board
+                        if letter != c:
+                            break
+                    elif not self._cc[ix] & letter_bit[c]:
+                        break
+                    elif c in rack:
+                        rack = rack.replace(c, "", 1)
+                    elif "?" in rack:
+                        rack = rack.replace("?", "", 1)
+                    else:
+                        break
+                else:
+                    self.add_candidate(word, start)
 
 
 class LeftPermutationNavigator(Navigator):
@@ -377,17 +740,28 @@ class LeftPermutationNavigator(Navigator):
 
     is_resumable = True
 
-    def __init__(self, rack: str) -> None:
+    def __init__(self, rack: CountedRack) -> None:
         super().__init__()
-        self._rack = rack
-        self._stack: List[Tuple[str, int]] = []
-        self._maxleft = len(rack) - 1  # One tile on the anchor itself
+        self._counted_rack = rack
+        self._moves = rack.moves
+        # The state of the rack, starting out full
+        self._rack = 0
+        self._stack: List[Tuple[int, int]] = []
+        self._maxleft = rack.size[0] - 1  # One tile on the anchor itself
         # assert self._maxleft > 0
         self._leftparts: List[Optional[List[LeftPart]]] = [
             None for _ in range(self._maxleft)
         ]
         self._index = 0
 
+    def rack(self) -> CountedRack:
+        """ Returns the rack whose left parts are being found """
+        return self._counted_rack
+
+    def num_leftparts(self) -> int:
+        """ Returns the total number of left parts found """
+        return sum(len(lp) for lp in self._leftparts if lp is not None)
+
     def leftparts(self, length: int) -> Optional[List[LeftPart]]:
         """ Returns a list of leftparts of the length requested """
         return self._leftparts[length - 1] if 0 < length <= self._maxleft else None
@@ -396,7 +770,7 @@ class LeftPermutationNavigator(Navigator):
         """ Returns True if the edge should be entered or False if not """
         # Follow all edges that match a letter in the rack
         # (which can be '?', matching all edges)
-        if not ((firstchar in self._rack) or ("?" in self._rack)):
+        if firstchar not in self._moves[self._rack]:
             return False
         # Fit: save our rack and move into the edge
         self._stack.append((self._rack, self._index))
@@ -410,16 +784,14 @@ class LeftPermutationNavigator(Navigator):
 
     def accepts(self, newchar: str) -> bool:
         """ Returns True if the navigator will accept the new character """
-        exact_match = newchar in self._rack
-        if (not exact_match) and ("?" not in self._rack):
+        rack = self._moves[self._rack].get(newchar)
+        if rack is None:
             # Can't continue with this prefix - we no longer have rack letters matching it
             return False
-        # We're fine with this: accept the character and remove from the rack
+        # We're fine with this: accept the character and remove it
+        # (or a wildcard) from the rack
         self._index += 1
-        if exact_match:
-            self._rack = self._rack.replace(newchar, "", 1)
-        else:
-            self._rack = self._rack.replace("?", "", 1)
+        self._rack = rack
         return True
 
     def accept(self, matched: str, final: bool) -> None:
@@ -437,8 +809,8 @@ class LeftPermutationNavigator(Navigator):
             # Satisfy Pylance
             empty_list: List[LeftPart] = []
             self._leftparts[lm] = empty_list
-        # Store the matched word part as well as the remaining part
-        # of the prefix of the edge we were on, and the next node.
+        # Store the matched word part and the state of the rack after it,
+        # as well as the remaining part of the prefix of the edge we were on, and the next node.
         # This gives us the ability to resume the navigation later at
         # the saved point, to generate right parts.
         lp = self._leftparts[lm]
@@ -452,6 +824,105 @@ class LeftPermutationNavigator(Navigator):
         return True
 
 
+class LeftPartCache:
+
+    """A per-process cache of the left parts that are possible with
+    a rack, as found by a LeftPermutationNavigator. The left parts
+    depend only on the vocabulary and on the tiles in the rack,
+    regardless of their order, and the same racks recur constantly
+    across games. Racks are kept in least-recently-used order,
+    within a maximum number of entries and an approximate byte budget."""
+
+    # Approximate memory footprint of a left part tuple,
+    # of a rack state, and of each of the moves out of a rack state
+    LEFTPART_BYTES = 200
+    STATE_BYTES = 250
+    MOVE_BYTES = 40
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        # Cached navigators, with the dictionary they were generated from
+        # and their approximate size, keyed by vocabulary and sorted rack
+        self._lru: OrderedDict[
+            Tuple[str, str],
+            Tuple[PackedDawgDictionary, LeftPermutationNavigator, int],
+        ] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _size(cls, lpn: LeftPermutationNavigator) -> int:
+        """Return the approximate memory footprint of a navigator's results"""
+        rack = lpn.rack()
+        return (
+            cls.LEFTPART_BYTES * lpn.num_leftparts()
+            + cls.STATE_BYTES * len(rack.moves)
+            + cls.MOVE_BYTES * sum(len(m) for m in rack.moves.values())
+        )
+
+    def get(
+        self, vocab: str, dawg: PackedDawgDictionary, rack: str
+    ) -> LeftPermutationNavigator:
+        """Return a navigator that has found the left parts that are
+        possible with the given rack, in the given dictionary of
+        the given vocabulary"""
+        key = (vocab, "".join(sorted(rack)))
+        lru = self._lru
+        entry = lru.get(key)
+        # The dictionary may have been reloaded, in which case the
+        # graph positions of the cached left parts no longer apply
+        if entry is not None and entry[0] is dawg:
+            self._hits += 1
+            try:
+                lru.move_to_end(key)
+            except KeyError:
+                # Evicted by another thread in the meantime: no problem
+                pass
+            return entry[1]
+        self._misses += 1
+        lpn = LeftPermutationNavigator(CountedRack(key[1], current_alphabet()))
+        dawg.navigate(lpn)
+        size = self._size(lpn)
+        with self._lock:
+            old = lru.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            lru[key] = (dawg, lpn, size)
+            self._bytes += size
+            while len(lru) > 1 and (
+                len(lru) > self._max_entries or self._bytes > self._max_bytes
+            ):
+                _, (_, _, evicted) = lru.popitem(last=False)
+                self._bytes -= evicted
+                self._evictions += 1
+        return lpn
+
+    def stats(self) -> LeftPartCacheStats:
+        """Return the hit, miss and eviction counts, and the cache size"""
+        return LeftPartCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            entries=len(self._lru),
+            bytes=self._bytes,
+            max_entries=self._max_entries,
+            max_bytes=self._max_bytes,
+        )
+
+
+# The left parts of recently seen racks
+_LEFTPART_CACHE = LeftPartCache(LEFTPART_CACHE_ENTRIES, LEFTPART_CACHE_BYTES)
+
+
+def leftpart_cache_stats() -> LeftPartCacheStats:
+    """Return the statistics of the per-process left part cache"""
+    return _LEFTPART_CACHE.stats()
+
+
 class LeftFindNavigator(Navigator):
 
     """A navigation class to trace a left part that is
@@ -524,37 +995,38 @@ class ExtendRightNavigator(Navigator):
     the board.
     """
 
-    def __init__(self, axis: Axis, anchor: int, rack: str) -> None:
+    def __init__(
+        self, axis: Axis, anchor: int, rack: CountedRack, state: int
+    ) -> None:
         super().__init__()
         self._axis = axis
-        self._rack = rack
+        self._moves = rack.moves
+        self._rack_bits = rack.bits
+        self._rack_size = rack.size
+        # The state of the rack
+        self._rack = state
         self._anchor = anchor
         # The tile we are placing next
         self._index = anchor
-        self._stack: List[Tuple[str, int, bool]] = []
-        self._wildcard_in_rack = "?" in rack
+        self._stack: List[Tuple[int, int]] = []
         # Cache the initial check we do when pushing into an edge
         self._last_check: Optional[Match] = None
         self._letter_bit = current_alphabet().letter_bit
+        # The letters and cross-checks of the axis, read directly
+        self._letters = axis.letters
+        self._cc = axis.crosschecks
 
     def _check(self, ch: str) -> Match:
         """Check whether the letter ch could be placed at the
         current square, given the cross-checks and the rack"""
-        axis = self._axis
-        l_at_sq = axis.letter_at(self._index)
+        l_at_sq = self._letters[self._index]
         if l_at_sq != " ":
             # There is a tile already in the square: we must match it exactly
             return Match.BOARD_TILE if ch == l_at_sq else Match.NO
-        # Does the current rack allow this letter?
-        if not (self._wildcard_in_rack or ch in self._rack):
-            return Match.NO
-        # Open square: apply cross-check constraints to the rack
-        # Would this character pass the cross-checks?
-        return (
-            Match.RACK_TILE
-            if axis.is_open_for(self._index, self._letter_bit[ch])
-            else Match.NO
-        )
+        # Open square: does the current rack allow this letter,
+        # and would it pass the cross-checks?
+        allowed = self._rack_bits[self._rack] & self._cc[self._index]
+        return Match.RACK_TILE if allowed & self._letter_bit[ch] else Match.NO
 
     def push_edge(self, firstchar: str) -> bool:
         """ Returns True if the edge should be entered or False if not """
@@ -563,7 +1035,7 @@ class ExtendRightNavigator(Navigator):
         if self._last_check is Match.NO:
             return False
         # Match: save our rack and our index and move into the edge
-        self._stack.append((self._rack, self._index, self._wildcard_in_rack))
+        self._stack.append((self._rack, self._index))
         return True
 
     def accepting(self) -> bool:
@@ -574,7 +1046,7 @@ class ExtendRightNavigator(Navigator):
             return False
         # Otherwise, continue while we have something on the rack
         # or we're at an occupied square
-        return bool(self._rack) or not self._axis.is_empty(self._index)
+        return self._rack_size[self._rack] > 0 or self._letters[self._index] != " "
 
     def accepts(self, newchar: str) -> bool:
         """ Returns True if the navigator will accept the new character """
@@ -588,14 +1060,8 @@ class ExtendRightNavigator(Navigator):
         # We're fine with this: accept the character and remove from the rack
         self._index += 1
         if match is Match.RACK_TILE:
-            # We used a rack tile: remove it from the rack before continuing
-            if newchar in self._rack:
-                self._rack = self._rack.replace(newchar, "", 1)
-            else:
-                # Must be wildcard: remove it
-                # assert "?" in self._rack
-                self._rack = self._rack.replace("?", "", 1)
-            self._wildcard_in_rack = "?" in self._rack
+            # We used a rack tile (or a wildcard): remove it from the rack
+            self._rack = self._moves[self._rack][newchar]
         return True
 
     def accept(self, matched: str, final: bool) -> None:
@@ -605,54 +1071,108 @@ class ExtendRightNavigator(Navigator):
         if (
             final
             and len(matched) > 1
-            and (self._index >= BOARD_SIZE or self._axis.is_empty(self._index))
+            and (self._index >= BOARD_SIZE or self._letters[self._index] == " ")
         ):
 
-            # Solution found - make a Move object for it
-            # and add it to the AutoPlayer's list
-            ix = self._index - len(matched)  # The word's starting index within the axis
-            row, col = self._axis.coordinate_of(ix)
-            xd, yd = self._axis.coordinate_step()
-            move = Move(matched, row, col, self._axis.is_horizontal())
-            # Fetch the rack as it was at the beginning of move generation
-            autoplayer = self._axis.autoplayer
-            rack = autoplayer.rack()
-            tiles = ""
-            for c in matched:
-                if self._axis.is_empty(ix):
-                    # Empty square that is being covered by this move
-                    # Find out whether it is a blank or normal letter tile
-                    if c in rack:
-                        rack = rack.replace(c, "", 1)
-                        tile = c
-                        tiles += c
-                    else:
-                        # Must be a wildcard match
-                        rack = rack.replace("?", "", 1)
-                        tile = "?"
-                        tiles += tile + c
-                    # assert row in range(BOARD_SIZE)
-                    # assert col in range(BOARD_SIZE)
-                    # Add this cover to the Move object
-                    move.add_validated_cover(Cover(row, col, tile, c))
-                else:
-                    tiles += c
-                ix += 1
-                row += xd
-                col += yd
-            # Note the tiles played in the move
-            move.set_tiles(tiles)
-            # Check that we've picked off the correct number of tiles
-            # assert len(rack) == len(self._rack)
-            autoplayer.add_candidate(move)
+            # Solution found - add it to the AutoPlayer's list
+            self._axis.add_candidate(matched, self._index - len(matched))
 
     def pop_edge(self):
         """ Called when leaving an edge that has been navigated """
-        self._rack, self._index, self._wildcard_in_rack = self._stack.pop()
+        self._rack, self._index = self._stack.pop()
         # Once past the prefix, we need to visit all outgoing edges, so return True
         return True
 
 
+class CandidateList:
+
+    """An array-backed list of candidate moves. Each candidate is stored
+    as a compact record of its start square, direction, word, blank tile
+    mask, number of covered squares and score. Move objects are only
+    created on demand, for the candidates that are returned or played."""
+
+    def __init__(self) -> None:
+        # The start square of each candidate, as a board square index
+        # times two, plus one if the candidate is horizontal
+        self._position = array("H")
+        # Bit masks of the positions within each word that are covered
+        # by blank tiles
+        self._blanks = array("H")
+        # The number of empty squares covered by each candidate
+        self._covers = array("B")
+        self._scores = array("l")
+        self._words: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def append(
+        self,
+        row: int,
+        col: int,
+        horizontal: bool,
+        word: str,
+        blanks: int,
+        covers: int,
+        score: int,
+    ) -> int:
+        """Add a candidate to the list, returning its index"""
+        self._position.append((row * BOARD_SIZE + col) * 2 + int(horizontal))
+        self._blanks.append(blanks)
+        self._covers.append(covers)
+        self._scores.append(score)
+        self._words.append(word)
+        return len(self._words) - 1
+
+    def word(self, index: int) -> str:
+        """Return the word formed by the candidate at the given index"""
+        return self._words[index]
+
+    def score(self, index: int) -> int:
+        """Return the score of the candidate at the given index"""
+        return self._scores[index]
+
+    def num_covers(self, index: int) -> int:
+        """Return the number of squares covered by the candidate"""
+        return self._covers[index]
+
+    def row(self, index: int) -> int:
+        """Return the starting row of the candidate"""
+        return self._position[index] // (2 * BOARD_SIZE)
+
+    def axis(self, index: int) -> int:
+        """Return the number of the axis of the candidate, with the rows
+        numbered before the columns, in top to bottom and left to right
+        order"""
+        position = self._position[index]
+        row, col = divmod(position >> 1, BOARD_SIZE)
+        return row if position & 1 else BOARD_SIZE + col
+
+    def move(self, index: int, board: Board) -> Move:
+        """Create a Move object for the candidate at the given index,
+        on the board that it was generated from"""
+        word = self._words[index]
+        position = self._position[index]
+        horizontal = bool(position & 1)
+        row, col = divmod(position >> 1, BOARD_SIZE)
+        xd, yd = (0, 1) if horizontal else (1, 0)
+        move = Move(word, row, col, horizontal)
+        blanks = self._blanks[index]
+        tiles = ""
+        for i, c in enumerate(word):
+            if board.is_covered(row, col):
+                tiles += c
+            else:
+                tile = "?" if blanks & (1 << i) else c
+                move.add_validated_cover(Cover(row, col, tile, c))
+                tiles += tile if tile == c else tile + c
+            row += xd
+            col += yd
+        move.set_tiles(tiles)
+        move.set_score(self._scores[index])
+        return move
+
+
 class AutoPlayer:
 
     """Implements an automatic, computer-controlled player.
@@ -671,12 +1191,27 @@ class AutoPlayer:
 
     """
 
+    # The number of top-scoring candidates that this class needs in order
+    # to pick a move, or 0 if it needs all of them
+    CANDIDATE_LIMIT = 1
+
     def __init__(self, robot_level: int, state: State, **kwargs: Any) -> None:
         self._level = robot_level
         self._state = state
         self._board = state.board()
         # The rack that the autoplayer has to work with
         self._rack = state.player_rack().contents()
+        # The tile scores, and the scores of the tiles in the rack
+        # in descending order, used to calculate the scores of candidates
+        # and upper bounds on them
+        assert state.tileset is not None
+        self._tile_scores = state.tileset.scores
+        self._rack_scores = sorted(
+            (self._tile_scores[tile] for tile in self._rack), reverse=True
+        )
+        # The rack as counts of each letter and of blank tiles,
+        # shared by the navigators that generate moves
+        self._counted_rack = CountedRack(self._rack, current_alphabet())
         # Calculate a bit pattern representation of the rack
         if "?" in self._rack:
             # Wildcard in rack: all letters allowed
@@ -684,8 +1219,31 @@ class AutoPlayer:
         else:
             # No wildcard: limits the possibilities of covering squares
             self._rack_bit_pattern = current_alphabet().bit_pattern(self._rack)
-        # List of valid, candidate moves
-        self._candidates: List[MoveBase] = []
+        # List of valid, candidate moves, as compact records
+        self._records = CandidateList()
+        # The indices of the candidates, best first
+        self._ranked: List[int] = []
+        # The candidates as Move objects, once they have been requested
+        self._candidates: Optional[List[MoveBase]] = None
+        # If only the top-scoring candidates are needed, their number,
+        # and a min-heap of (score, -tiebreak, -axis, -index) tuples
+        # holding them while they are being generated
+        self._limit = 0
+        self._heap: List[Tuple[int, int, int, int]] = []
+        # The time (as in time.time()) by which move generation should
+        # be finished, if any, and whether it went through all axes
+        self._deadline: Optional[float] = None
+        self._completed = True
+        # The vocabulary that the words of the moves are taken from,
+        # its DAWG and its GADDAG, if available, to generate moves from
+        self._vocab = current_vocabulary()
+        self._dawg = Wordbase.dawg()
+        self._gaddag = Wordbase.gaddag()
+        # Words that are not in the vocabulary but are nevertheless
+        # playable, and are placed on the board separately
+        self._extra_words: List[str] = []
+        # The cross-checks of the board, kept up to date by the state
+        self._crosschecks = state.crosschecks()
 
     def board(self) -> Board:
         """ Return the board """
@@ -695,17 +1253,109 @@ class AutoPlayer:
         """ Return the rack, as a string of tiles """
         return self._rack
 
+    def dawg(self) -> PackedDawgDictionary:
+        """ Return the dictionary that the words of the moves are taken from """
+        return self._dawg
+
+    def counted_rack(self) -> CountedRack:
+        """ Return the rack, as counts of each letter and of blank tiles """
+        return self._counted_rack
+
     def rack_bit_pattern(self) -> int:
         """ Return the bit pattern corresponding to the rack """
         return self._rack_bit_pattern
 
+    def tile_scores(self) -> Dict[str, int]:
+        """ Return the scores of the tiles in the tile set """
+        return self._tile_scores
+
+    def rack_scores(self) -> List[int]:
+        """ Return the scores of the tiles in the rack, in descending order """
+        return self._rack_scores
+
+    def crosschecks(self) -> CrossChecks:
+        """ Return the cross-checks of the board """
+        return self._crosschecks
+
     def candidates(self) -> List[MoveBase]:
-        """ The list of valid, candidate moves """
+        """ The list of valid, candidate moves, in the order of their axes """
+        if self._candidates is None:
+            records = self._records
+            self._candidates = [
+                self._candidate_move(index)
+                for index in sorted(
+                    self._ranked, key=lambda index: (records.axis(index), index)
+                )
+            ]
         return self._candidates
 
-    def add_candidate(self, move: MoveBase) -> None:
+    def completed(self) -> bool:
+        """Return True if the last move generation went through the
+        whole board, i.e. did not run out of time"""
+        return self._completed
+
+    def out_of_time(self) -> bool:
+        """Return True if move generation should stop, as its deadline
+        has passed and at least one candidate has been found. In that
+        case, the generation is marked as incomplete."""
+        if self._deadline is None or not len(self._records):
+            return False
+        if time.time() < self._deadline:
+            return False
+        self._completed = False
+        return True
+
+    def add_candidate(
+        self,
+        row: int,
+        col: int,
+        horizontal: bool,
+        word: str,
+        blanks: int,
+        covers: int,
+        score: int,
+    ) -> None:
         """ Add a candidate move to the AutoPlayer's list """
-        self._candidates.append(move)
+        records = self._records
+        if not self._limit:
+            records.append(row, col, horizontal, word, blanks, covers, score)
+            return
+        # Only the top-scoring candidates are being kept:
+        # order them in the same way as _rank_candidates() does
+        tiebreak = row if self._board.is_empty() else covers
+        axis = row if horizontal else BOARD_SIZE + col
+        entry = (score, -tiebreak, -axis, -len(records))
+        heap = self._heap
+        if len(heap) < self._limit:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+        else:
+            return
+        records.append(row, col, horizontal, word, blanks, covers, score)
+
+    def is_found_horizontally(self, row: int, col: int, letter: str) -> bool:
+        """Return True if a move that places a single tile with the given
+        letter on the given square, forming words in both directions,
+        is found as a horizontal move"""
+        return True
+
+    def _candidate_move(self, index: int) -> Move:
+        """ Create a Move object for the candidate at the given index """
+        return self._records.move(index, self._board)
+
+    def candidate_limit(self) -> int:
+        """Return the number of top-scoring candidates that this robot
+        needs in order to pick a move, or 0 if it needs all of them"""
+        return self.CANDIDATE_LIMIT
+
+    def score_threshold(self) -> Optional[int]:
+        """Return the lowest score that a new candidate must reach
+        to make it into the list of top candidates, or None if
+        there is no such threshold"""
+        if not self._limit or len(self._heap) < self._limit:
+            return None
+        return self._heap[0][0]
 
     def _axis_from_row(self, row: int) -> Axis:
         """ Create and initialize an Axis from a board row """
@@ -715,34 +1365,60 @@ class AutoPlayer:
         """ Create and initialize an Axis from a board column """
         return Axis(self, col, False)  # Vertical
 
-    def generate_move(self) -> MoveBase:
-        """ Finds and returns a Move object to be played """
-        return self._generate_move(depth=1)
+    def generate_move(self, deadline: Optional[float] = None) -> MoveBase:
+        """Finds and returns a Move object to be played. If a deadline
+        (as in time.time()) is given, the move is picked from the
+        candidates found by then."""
+        return self._generate_move(depth=1, deadline=deadline)
 
-    def generate_best_moves(self, max_number: int = 0) -> MoveList:
+    def generate_best_moves(
+        self, max_number: int = 0, deadline: Optional[float] = None
+    ) -> MoveList:
         """Returns a list in descending order of the n best moves,
-        or all moves if n <= 0"""
-        self._generate_candidates()
-        if not self._candidates:
-            # No candidates: no best move
-            return []
-        sorted_candidates = self._score_candidates()
-        if max_number <= 0:
-            # Return entire list if max_number <= 0
-            return sorted_candidates
-        # Return the top candidates
-        return sorted_candidates[0:max_number]
-
-    def _generate_candidates(self) -> None:
-        """ Generate a fresh candidate list """
-
-        self._candidates = []
-        # Start by generating all possible permutations of the
-        # rack that form left parts of words, ordering them by length
+        or all moves if n <= 0, found by the deadline if given"""
+        self._generate_candidates(max(0, max_number), deadline)
+        # Return the top candidates, or the entire list if max_number <= 0
+        return self._score_candidates(max_number)
+
+    def _generate_candidates(
+        self, limit: int = 0, deadline: Optional[float] = None
+    ) -> None:
+        """Generate a fresh candidate list, containing only the
+        top-scoring candidates if limit > 0. If a deadline is given,
+        the generation stops once it has passed, keeping the candidates
+        found so far."""
+
+        self._records = CandidateList()
+        self._ranked = []
+        self._candidates = None
+        self._limit = limit
+        self._heap = []
+        self._deadline = deadline
+        self._completed = True
+        gaddag = self._gaddag
+        # Unless we have a GADDAG, start by generating all possible
+        # permutations of the rack that form left parts of words,
+        # ordering them by length. These are usually found in the
+        # cache, as the same racks recur across games.
         lpn: Optional[LeftPermutationNavigator] = None
-        if len(self._rack) > 1:
-            lpn = LeftPermutationNavigator(self._rack)
-            Wordbase.dawg().navigate(lpn)
+        if gaddag is None and len(self._rack) > 1:
+            lpn = _LEFTPART_CACHE.get(self._vocab, self._dawg, self._rack)
+            # The navigators share the rack states of the left parts
+            self._counted_rack = lpn.rack()
+
+        extra_words = self._extra_words
+
+        def generate_moves(axis: Axis) -> None:
+            """Generate the moves on an axis, using the GADDAG if we have one,
+            and also the moves that form words added to the dictionary at
+            run time, and any extra words"""
+            if gaddag is None:
+                axis.generate_moves(lpn)
+            else:
+                axis.generate_moves_gaddag(gaddag)
+            axis.generate_overlay_moves()
+            if extra_words:
+                axis.place_words(extra_words)
 
         # Generate moves in one-dimensional space by looking at each axis
         # (row or column) on the board separately
@@ -765,25 +1441,41 @@ class AutoPlayer:
                 axis.init_crosschecks()
                 # Mark the starting anchor
                 axis.mark_anchor(ssq_col)
-            axis.generate_moves(lpn)
+            generate_moves(axis)
         else:
             # Normal move: go through all 15 (row) + 15 (column) axes and generate
-            # valid moves within each of them
+            # valid moves within each of them. Axes where no empty square is
+            # adjacent to a tile have no anchors, and thus no moves.
+            crosschecks = self._crosschecks
+            axes: List[Axis] = []
             for r in range(BOARD_SIZE):
-                axis = self._axis_from_row(r)
-                axis.init_crosschecks()
-                axis.generate_moves(lpn)
+                if crosschecks.adjacent(r, True):
+                    axes.append(self._axis_from_row(r))
             for c in range(BOARD_SIZE):
-                axis = self._axis_from_column(c)
+                if crosschecks.adjacent(c, False):
+                    axes.append(self._axis_from_column(c))
+            for axis in axes:
                 axis.init_crosschecks()
-                axis.generate_moves(lpn)
-
-    def _generate_move(self, depth: int) -> MoveBase:
+            # Visit the axes with the most promising premium squares and
+            # open lines first. High-scoring moves are then found early,
+            # raising the score threshold for the top candidates sooner
+            # and making for good candidates if we run out of time.
+            # Candidates are ranked by axis order in case of ties, so the
+            # order of visiting the axes does not affect the result.
+            axes.sort(key=lambda axis: axis.score_bound(), reverse=True)
+            for axis in axes:
+                if self.out_of_time():
+                    break
+                generate_moves(axis)
+
+        self._rank_candidates()
+
+    def _generate_move(self, depth: int, deadline: Optional[float] = None) -> MoveBase:
         """Finds and returns a Move object to be played,
         eventually weighted by countermoves"""
 
         # Generate a fresh list of candidate moves
-        self._generate_candidates()
+        self._generate_candidates(self.candidate_limit(), deadline)
 
         # Pick the best move from the candidate list
         move = self._find_best_move(depth)
@@ -797,66 +1489,91 @@ class AutoPlayer:
         # If we can't exchange tiles, we have to pass
         return PassMove()
 
-    def _score_candidates(self) -> MoveList:
-        """ Calculate the score of each candidate """
+    def _rank_candidates(self) -> None:
+        """ Order the generated candidates, best first """
 
-        scored_candidates: MoveList = [
-            MoveTuple(m, self._state.score(m)) for m in self._candidates
-        ]
+        records = self._records
+        if self._limit:
+            # The heap holds the top candidates
+            self._ranked = [
+                -index for _, _, _, index in sorted(self._heap, reverse=True)
+            ]
+            self._heap = []
+            return
 
-        def keyfunc(x: MoveTuple) -> Tuple[int, int]:
+        def keyfunc(index: int) -> Tuple[int, int, int]:
             """Sort moves first by descending score;
-            in case of ties prefer shorter words"""
+            in case of ties prefer shorter words, and then
+            the order of the axes on the board"""
             # More sophisticated logic can be inserted here,
             # including whether triple-word-score opportunities
             # are being opened for the opponent, minimal use
             # of blank tiles, leaving a good vowel/consonant
             # balance on the rack, etc.
-            return (-x.score, x.move.num_covers())
+            return (
+                -records.score(index),
+                records.num_covers(index),
+                records.axis(index),
+            )
 
-        def keyfunc_firstmove(x: MoveTuple) -> Tuple[int, int]:
+        def keyfunc_firstmove(index: int) -> Tuple[int, int]:
             """Special case for first move:
             Sort moves first by descending score, and in case of ties,
             try to go to the upper half of the board for a more open game
             """
             # Note: for the Explo board, this extra twist is
             # not strictly necessary
-            m, sc = x
-            assert isinstance(m, Move)
-            return (-sc, m.row)
+            return (-records.score(index), records.row(index))
 
         # Sort the candidate moves using the appropriate key function
-        if self._board.is_empty():
-            # First move
-            scored_candidates.sort(key=keyfunc_firstmove)
-        else:
-            # Subsequent moves
-            scored_candidates.sort(key=keyfunc)
-        return scored_candidates
+        self._ranked = sorted(
+            range(len(records)),
+            key=keyfunc_firstmove if self._board.is_empty() else keyfunc,
+        )
 
-    def _pick_candidate(self, scored_candidates: MoveList) -> Optional[MoveBase]:
-        """ From a sorted list of >1 scored candidates, pick a move to make """
-        return scored_candidates[0].move
+    def _score_candidates(self, max_number: int = 0) -> MoveList:
+        """Return the top max_number candidates, or all of them if
+        max_number <= 0, as Move objects with their scores, best first"""
+        ranked = self._ranked if max_number <= 0 else self._ranked[0:max_number]
+        return [
+            MoveTuple(self._candidate_move(index), self._records.score(index))
+            for index in ranked
+        ]
+
+    def _pick_candidate(self) -> Optional[MoveBase]:
+        """ From the ranked list of >1 candidates, pick a move to make """
+        return self._candidate_move(self._ranked[0])
 
     # pylint: disable=unused-argument
     def _find_best_move(self, depth: int) -> Optional[MoveBase]:
         """ Analyze the list of candidate moves and pick the highest-scoring one """
 
-        if not self._candidates:
+        if not self._ranked:
             # No moves: must exchange or pass instead
             return None
 
-        if len(self._candidates) == 1:
+        if len(self._ranked) == 1:
             # Only one legal move: play it without further complication
-            return self._candidates[0]
+            return self._candidate_move(self._ranked[0])
 
-        return self._pick_candidate(self._score_candidates())
+        return self._pick_candidate()
 
 
 class AutoPlayer_Custom(AutoPlayer):
 
     """This subclass of AutoPlayer only plays words
-    from a particular vocabulary, if given"""
+    from a particular vocabulary, if given, and picks
+    its move at random from a number of top candidates.
+
+    The moves are generated from the custom vocabulary, while the
+    cross-checks of the main vocabulary still apply. Two-letter words
+    of the main vocabulary are always playable, and are placed on the
+    board separately if they are not in the custom vocabulary.
+    """
+
+    # How many top-scoring candidates to generate,
+    # as a multiple of the number of moves to pick from
+    CANDIDATE_FACTOR = 2
 
     def __init__(self, robot_level: int, state: State, **kwargs: Any) -> None:
         super().__init__(robot_level, state)
@@ -870,6 +1587,20 @@ class AutoPlayer_Custom(AutoPlayer):
         if custom_vocab:
             # This robot constrains itself with a custom vocabulary: load it
             self.vocab = Wordbase.dawg_for_vocab(custom_vocab)
+        # The main dictionary, which the words of the moves must also be in
+        self._main_dawg = self._dawg
+        if self.vocab is not None:
+            assert custom_vocab is not None
+            self._vocab = custom_vocab
+            self._dawg = self.vocab
+            self._gaddag = Wordbase.gaddag_for_vocab(custom_vocab)
+            # Only words that share a letter with the rack can be played
+            rack = self._rack
+            self._extra_words = [
+                w
+                for w in self._main_dawg.two_letter_words()[0]
+                if w not in self.vocab and ("?" in rack or w[0] in rack or w[1] in rack)
+            ]
         # Flag indicating whether this robot adapts to the score difference in the game
         self.adaptive = args.get("adaptive", False)
         # Ratio of best moves to cut off from the top of the candidate list
@@ -880,33 +1611,105 @@ class AutoPlayer_Custom(AutoPlayer):
         p = state.player_to_move()
         self.winning = scores[p] > scores[1 - p]
 
-    def _pick_candidate(self, scored_candidates: MoveList) -> Optional[MoveBase]:
-        """ From a sorted list of >1 scored candidates, pick a move to make """
-        # Custom dictionary
-        vocab = self.vocab
+    def candidate_limit(self) -> int:
+        """Return the number of top-scoring candidates that this robot
+        generates in order to pick a move"""
+        return self.pick_from * self.CANDIDATE_FACTOR
+
+    def add_candidate(
+        self,
+        row: int,
+        col: int,
+        horizontal: bool,
+        word: str,
+        blanks: int,
+        covers: int,
+        score: int,
+    ) -> None:
+        """ Add a candidate move to the AutoPlayer's list """
+        if self.vocab is not None:
+            threshold = self.score_threshold()
+            if threshold is not None and score < threshold:
+                # Not among the top candidates: no need to look further
+                return
+            if word not in self._main_dawg:
+                # Not a valid word, even if it's in the custom vocabulary
+                return
+        super().add_candidate(row, col, horizontal, word, blanks, covers, score)
+
+    def is_found_horizontally(self, row: int, col: int, letter: str) -> bool:
+        """Return True if a move that places a single tile with the given
+        letter on the given square, forming words in both directions,
+        is found as a horizontal move, i.e. if the horizontal word
+        is playable for this robot"""
+        if self.vocab is None:
+            return True
+        letters = self._board.axis_letters(row, True)
+        start = col
+        while start > 0 and letters[start - 1] != " ":
+            start -= 1
+        end = col + 1
+        while end < BOARD_SIZE and letters[end] != " ":
+            end += 1
+        word = letters[start:col] + letter + letters[col + 1 : end]
+        return len(word) == 2 or word in self.vocab
+
+    def _playable_candidates(self) -> List[int]:
+        """Return the indices of up to self.pick_from candidates
+        to pick a move from, in descending score order"""
         pick_from = self.pick_from
-        playable_candidates: MoveList = []
-        num_candidates = len(scored_candidates)
-        # Iterate through the candidates in descending score order
-        # until we have enough playable ones or we have exhausted the list
-        i: int = 0  # Candidate index
+        records = self._records
+        playable_candidates: List[int] = []
         p: int = 0  # Playable index
-        while p < pick_from and i < num_candidates:
-            candidate = scored_candidates[i]
-            m, score = candidate  # Candidate move
-            # We assume that m is a normal tile move
-            assert isinstance(m, Move)
-            w = m.word()  # The principal word being played
-            if len(w) == 2 or vocab is None or w in vocab:
-                # This one is playable - but we still won't put it on
-                # the candidate list if has the same score as the
-                # first (top-scoring) playable word
-                if p == 1 and score == playable_candidates[0].score:
-                    pass
-                else:
-                    playable_candidates.append(candidate)
-                    p += 1
-            i += 1
+        # Iterate through the candidates in descending score order
+        # until we have enough of them or we have exhausted the list
+        for index in self._ranked:
+            # A candidate is not put on the list if it has the same
+            # score as the first (top-scoring) one
+            if p == 1 and records.score(index) == records.score(
+                playable_candidates[0]
+            ):
+                continue
+            playable_candidates.append(index)
+            p += 1
+            if p >= pick_from:
+                break
+        return playable_candidates
+
+    def _pick_candidate(self) -> Optional[MoveBase]:
+        """ From the ranked list of >1 candidates, pick a move to make """
+        playable_candidates = self._playable_candidates()
+        p = len(playable_candidates)
+        deadline = self._deadline
+        if (
+            p < self.pick_from
+            and len(self._ranked) == self._limit
+            and self.completed()
+            and (deadline is None or time.time() < deadline)
+        ):
+            # Too many candidates share the top score: we need more of them.
+            # If we run out of time while generating them, we stick with
+            # the complete list of top candidates that we already have.
+            first_pass = (
+                self._records,
+                self._ranked,
+                self._candidates,
+                self._limit,
+                self._heap,
+            )
+            self._generate_candidates(0, deadline)
+            if self.completed():
+                playable_candidates = self._playable_candidates()
+                p = len(playable_candidates)
+            else:
+                (
+                    self._records,
+                    self._ranked,
+                    self._candidates,
+                    self._limit,
+                    self._heap,
+                ) = first_pass
+                self._completed = True
         # Now we have a list of up to self.pick_from playable moves
         if p == 0:
             # No playable move: give up and do an Exchange or Pass instead
@@ -927,7 +1730,7 @@ class AutoPlayer_Custom(AutoPlayer):
         else:
             cut = 0
         # Pick a move at random from the playable list
-        return random.choice(playable_candidates[cut:]).move
+        return self._candidate_move(random.choice(playable_candidates[cut:]))
 
 
 class AutoPlayer_MiniMax(AutoPlayer):
@@ -937,6 +1740,8 @@ class AutoPlayer_MiniMax(AutoPlayer):
     Currently, this is not used in Netskrafl.
     """
 
+    CANDIDATE_LIMIT = 0
+
     def __init__(self, robot_level: int, state: State) -> None:
         super().__init__(robot_level, state)
 
@@ -945,49 +1750,19 @@ class AutoPlayer_MiniMax(AutoPlayer):
 
         # assert depth >= 0
 
-        if not self._candidates:
+        if not self._ranked:
             # No moves: must exchange or pass instead
             return None
 
-        if len(self._candidates) == 1:
+        if len(self._ranked) == 1:
             # Only one legal move: play it
-            return self._candidates[0]
+            return self._candidate_move(self._ranked[0])
 
         # TBD: Consider looking at exchange moves if there are
         # few and weak candidates
 
-        # Calculate the score of each candidate
-        scored_candidates: MoveList = [
-            MoveTuple(m, self._state.score(m)) for m in self._candidates
-        ]
-
-        def keyfunc(x: MoveTuple) -> Tuple[int, int]:
-            """Sort moves first by descending score;
-            in case of ties prefer shorter words"""
-            # More sophisticated logic could be inserted here,
-            # including whether triple-word-score opportunities
-            # are being opened for the opponent, minimal use
-            # of blank tiles, leaving a good vowel/consonant
-            # balance on the rack, etc.
-            return (-x.score, x.move.num_covers())
-
-        def keyfunc_firstmove(x: MoveTuple) -> Tuple[int, int]:
-            """Special case for first move:
-            Sort moves first by descending score, and in case of ties,
-            try to go to the upper half of the board for a more open game"""
-            # Note: for the Explo board, this extra twist is
-            # not strictly necessary
-            m, sc = x
-            assert isinstance(m, Move)
-            return (-sc, m.row)
-
-        # Sort the candidate moves using the appropriate key function
-        if self._board.is_empty():
-            # First move
-            scored_candidates.sort(key=keyfunc_firstmove)
-        else:
-            # Subsequent moves
-            scored_candidates.sort(key=keyfunc)
+        # The candidates with their scores, sorted by descending score
+        scored_candidates = self._score_candidates()
 
         # If we're not going deeper into the minimax analysis,
         # cut the crap and simply return the top scoring move
@@ -1009,14 +1784,17 @@ class AutoPlayer_MiniMax(AutoPlayer):
         # pylint: disable=superfluous-parens
         print("Looking at {0} top scoring candidate moves".format(NUM_CANDIDATES))
 
+        # A working copy of the game state, where each candidate move
+        # is played and then taken back
+        teststate = State(copy=self._state)  # Copy constructor
+
         # Look at the top scoring candidates
         for m, score in scored_candidates[0:NUM_CANDIDATES]:
 
             print("Candidate move {0} with raw score {1}".format(m, score))
 
-            # Create a game state where the candidate move has been played
-            teststate = State(copy=self._state)  # Copy constructor
-            teststate.apply_move(m)
+            # Play the candidate move in the working state
+            teststate.apply_move(m, undoable=True)
 
             countermoves: List[int] = []
 
@@ -1060,6 +1838,9 @@ class AutoPlayer_MiniMax(AutoPlayer):
                 # TBD: Maybe a median score is better than average?
                 avg_score = float(sum_score) / NUM_TEST_RACKS
 
+            # Take the candidate move back, also restoring the racks and the bag
+            teststate.undo_move()
+
             print(
                 "Average score of {0} countermove racks is {1:.2f}".format(
                     NUM_TEST_RACKS, avg_score
@@ -1006,6 +1006,10 @@ if running_local:
     def admin_loaduser() -> ResponseType:
         return admin.admin_loaduser()
 
+    @web.route("/admin/dawgstats", methods=["GET"])
+    def admin_dawgstats() -> ResponseType:
+        return admin.admin_dawgstats()
+
     @web.route("/admin/main")
     def admin_main() -> ResponseType:
         """Show main administration page"""
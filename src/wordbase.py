@@ -13,14 +13,24 @@ For further information, see https://github.com/mideind/Netskrafl
 
 from __future__ import annotations
 
-from typing import Dict, Optional, Sequence, Tuple, List
+from typing import Dict, Iterable, Mapping, Optional, Sequence, Set, Tuple, List
 
 import os
 import threading
 import logging
 import time
+from collections import OrderedDict
 
-from config import NETSKRAFL
+from config import (
+    NETSKRAFL,
+    DAWG_MMAP,
+    DAWG_LAZY,
+    DAWG_HOT_LOCALES,
+    DAWG_MAX_RESIDENT,
+    DAWG_NODE_CACHE_BYTES,
+    DAWG_DECODE,
+    DAWG_GADDAG,
+)
 from languages import (
     Alphabet,
     IcelandicAlphabet,
@@ -30,7 +40,11 @@ from languages import (
     current_vocabulary,
     vocabulary_for_locale,
 )
-from dawgdictionary import PackedDawgDictionary
+from dawgdictionary import (
+    NodeCacheStats,
+    PackedDawgDictionary,
+    PackedGaddagDictionary,
+)
 
 
 # Type definitions
@@ -86,23 +100,138 @@ else:
     logging.info("Using all available dictionaries")
 
 
+# Robot vocabularies that accompany a main vocabulary, but don't follow
+# the usual 'vocabulary.aml' / 'vocabulary.mid' naming convention
+_COMPANION_DAWGS: Mapping[str, Sequence[str]] = {
+    "ordalisti": ("amlodi", "midlungur"),
+}
+
+# Map DAWG names to their alphabets, for on-demand loading
+_DAWG_ALPHABETS: Mapping[str, Alphabet] = dict(_DAWGS)
+
+
+def _vocabularies_for_locales(locales: Sequence[str]) -> List[str]:
+    """Return the names of the DAWGs needed to serve the given locales,
+    i.e. their main vocabularies and associated robot vocabularies"""
+    result: List[str] = []
+    for lc in locales:
+        vocab = vocabulary_for_locale(lc)
+        companions = _COMPANION_DAWGS.get(vocab, ())
+        for dawg, _ in _DAWGS:
+            if dawg in result:
+                continue
+            if (
+                dawg == vocab
+                or dawg.startswith(vocab + ".")
+                or dawg in companions
+            ):
+                result.append(dawg)
+    return result
+
+
+# The DAWGs that are loaded at startup and never evicted in lazy mode
+_HOT_DAWGS: Sequence[str] = (
+    _vocabularies_for_locales(DAWG_HOT_LOCALES)
+    if DAWG_LAZY
+    else [dawg for dawg, _ in _DAWGS]
+)
+
+
 class Wordbase:
     """Container for singleton instances of the supported dictionaries"""
 
-    _dawg: Dict[str, PackedDawgDictionary] = dict()
+    # Loaded dictionaries, in least-recently-used order (in lazy mode)
+    _dawg: OrderedDict[str, PackedDawgDictionary] = OrderedDict()
+    # DAWGs that were not found on disk, so we don't retry them
+    _missing: Set[str] = set()
+    # Loaded GADDAGs, by vocabulary, and those that were not found on disk.
+    # A GADDAG is only kept while the DAWG of its vocabulary is resident,
+    # and is evicted along with it.
+    _gaddag: Dict[str, PackedGaddagDictionary] = dict()
+    _gaddag_missing: Set[str] = set()
 
+    # Lock for modifications of the above; it is never held while
+    # dictionaries are being loaded from disk
     _lock = threading.Lock()
+    # Locks for loading and modifying each dictionary, by resource name,
+    # so that e.g. a dictionary is only loaded once even if several
+    # threads ask for it at the same time
+    _resource_locks: Dict[str, threading.Lock] = dict()
 
     @staticmethod
     def initialize() -> None:
-        """Load all known dictionaries into memory"""
+        """Load all known dictionaries into memory, or, in lazy mode,
+        only the ones needed for the hot locales"""
+        if not Wordbase._dawg:
+            for dawg in _HOT_DAWGS:
+                Wordbase._load_and_store(dawg)
+
+    @staticmethod
+    def _resource_lock(resource: str) -> threading.Lock:
+        """Return the lock for loading or modifying the given resource"""
         with Wordbase._lock:
-            if not Wordbase._dawg:
-                for dawg, alphabet in _DAWGS:
-                    try:
-                        Wordbase._dawg[dawg] = Wordbase._load_resource(dawg, alphabet)
-                    except FileNotFoundError:
-                        logging.error("Unable to load DAWG {0}".format(dawg))
+            return Wordbase._resource_locks.setdefault(resource, threading.Lock())
+
+    @staticmethod
+    def _load_and_store(dawg: str) -> Optional[PackedDawgDictionary]:
+        """Load a dictionary, unless another thread has already done so,
+        and store it in the resident set, evicting the least recently
+        used ones if we're over budget"""
+        alphabet = _DAWG_ALPHABETS.get(dawg)
+        if alphabet is None:
+            return None
+        with Wordbase._resource_lock(dawg):
+            # Check again, now that we hold the resource lock
+            d = Wordbase._dawg.get(dawg)
+            if d is not None or dawg in Wordbase._missing:
+                return d
+            try:
+                d = Wordbase._load_resource(dawg, alphabet)
+            except FileNotFoundError:
+                logging.error("Unable to load DAWG {0}".format(dawg))
+                with Wordbase._lock:
+                    Wordbase._missing.add(dawg)
+                return None
+            with Wordbase._lock:
+                Wordbase._dawg[dawg] = d
+                if DAWG_LAZY and DAWG_MAX_RESIDENT > 0:
+                    Wordbase._evict()
+        return d
+
+    @staticmethod
+    def _evict() -> None:
+        """Evict least recently used dictionaries until we're within
+        the resident budget. Hot dictionaries are never evicted.
+        Assumes that the caller holds Wordbase._lock."""
+        excess = len(Wordbase._dawg) - DAWG_MAX_RESIDENT
+        if excess <= 0:
+            return
+        # Note that the dictionary objects are not explicitly closed:
+        # they may still be in use by other threads, and will be
+        # released when the last reference to them goes away
+        for dawg in [d for d in Wordbase._dawg if d not in _HOT_DAWGS][:excess]:
+            del Wordbase._dawg[dawg]
+            logging.info("Evicted DAWG {0}".format(dawg))
+            if Wordbase._gaddag.pop(dawg, None) is not None:
+                logging.info("Evicted GADDAG {0}".format(dawg))
+
+    @staticmethod
+    def _get(vocab: str) -> Optional[PackedDawgDictionary]:
+        """Return the dictionary for the given vocabulary,
+        loading it on demand if required"""
+        d = Wordbase._dawg.get(vocab)
+        if d is not None:
+            if DAWG_LAZY:
+                # Mark as recently used. This must not happen while
+                # _evict() is iterating over the dictionaries, and the
+                # dictionary may have been evicted in the meantime.
+                with Wordbase._lock:
+                    if vocab in Wordbase._dawg:
+                        Wordbase._dawg.move_to_end(vocab)
+            return d
+        if not DAWG_LAZY:
+            return None
+        return Wordbase._load_and_store(vocab)
 
     @staticmethod
     def _load_resource(resource: str, alphabet: Alphabet) -> PackedDawgDictionary:
@@ -111,28 +240,138 @@ class Wordbase:
             os.path.join(BASE_PATH, "resources", resource + ".bin.dawg")
         )
         t0 = time.time()
-        dawg = PackedDawgDictionary(alphabet)
-        dawg.load(bname)
+        dawg = PackedDawgDictionary(alphabet, cache_bytes=DAWG_NODE_CACHE_BYTES)
+        dawg.load(bname, use_mmap=DAWG_MMAP, decode=DAWG_DECODE)
         t1 = time.time()
-        logging.info("Loaded DAWG {1} in {0:.2f} seconds".format(t1 - t0, bname))
+        logging.info(
+            "{2} DAWG {1} in {0:.2f} seconds".format(
+                t1 - t0, bname, "Mapped" if dawg.is_mmapped else "Loaded"
+            )
+        )
+        Wordbase._load_overlay(resource, dawg)
         return dawg
 
+    @staticmethod
+    def _read_words(fname: str) -> List[str]:
+        """Read a list of words, one per line, from a text file in the
+        resources directory, returning an empty list if it doesn't exist"""
+        fpath = os.path.abspath(os.path.join(BASE_PATH, "resources", fname))
+        try:
+            with open(fpath, "r", encoding="utf-8") as f:
+                return [w for w in (line.strip() for line in f) if w]
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _load_overlay(resource: str, dawg: PackedDawgDictionary) -> None:
+        """Load the words that have been added to and removed from a
+        vocabulary since its DAWG was built, from the files resource.add.txt
+        and resource.remove.txt, into an overlay on top of the DAWG.
+        Words that have already been folded into the DAWG are ignored."""
+        added = Wordbase._read_words(resource + ".add.txt")
+        removed = Wordbase._read_words(resource + ".remove.txt")
+        if not (added or removed):
+            return
+        dawg.set_overlay(added, removed)
+        overlay = dawg.overlay
+        if overlay is not None:
+            logging.info(
+                "DAWG {0} has an overlay of {1} added and {2} removed words".format(
+                    resource, len(overlay.added), len(overlay.removed)
+                )
+            )
+
+    @staticmethod
+    def update_overlay(
+        vocab: str, add: Iterable[str] = (), remove: Iterable[str] = ()
+    ) -> bool:
+        """Add words to and/or remove words from a vocabulary at run time,
+        through its overlay. The changes only affect the current process;
+        to make them permanent, add the words to the vocab.add.txt and
+        vocab.remove.txt files in the resources directory. Returns False
+        if the vocabulary is not available."""
+        dawg = Wordbase._get(vocab)
+        if dawg is None:
+            return False
+        add_set, remove_set = set(add), set(remove)
+        with Wordbase._resource_lock(vocab + ".overlay"):
+            overlay = dawg.overlay
+            added = set() if overlay is None else set(overlay.added)
+            removed = set() if overlay is None else set(overlay.removed)
+            dawg.set_overlay(
+                (added - remove_set) | add_set, (removed - add_set) | remove_set
+            )
+        return True
+
+    @staticmethod
+    def gaddag() -> Optional[PackedGaddagDictionary]:
+        """Return the GADDAG for the current vocabulary, if enabled and
+        available, for faster robot move generation"""
+        return Wordbase.gaddag_for_vocab(current_vocabulary())
+
+    @staticmethod
+    def gaddag_for_vocab(vocab: str) -> Optional[PackedGaddagDictionary]:
+        """Return the GADDAG associated with the given vocabulary, loading
+        it on demand, or None if GADDAGs are not enabled or not available"""
+        if not DAWG_GADDAG:
+            return None
+        # Load the DAWG if required, also marking it as recently used,
+        # since the GADDAG is resident only as long as its DAWG is
+        if Wordbase._get(vocab) is None:
+            return None
+        g = Wordbase._gaddag.get(vocab)
+        if g is not None or vocab in Wordbase._gaddag_missing:
+            return g
+        alphabet = _DAWG_ALPHABETS[vocab]
+        with Wordbase._resource_lock(vocab + ".gaddag"):
+            # Check again, now that we hold the resource lock
+            g = Wordbase._gaddag.get(vocab)
+            if g is not None or vocab in Wordbase._gaddag_missing:
+                return g
+            bname = os.path.abspath(
+                os.path.join(BASE_PATH, "resources", vocab + ".gaddag.bin.dawg")
+            )
+            t0 = time.time()
+            g = PackedGaddagDictionary(alphabet, cache_bytes=DAWG_NODE_CACHE_BYTES)
+            try:
+                g.load(bname, use_mmap=DAWG_MMAP, decode=DAWG_DECODE)
+            except FileNotFoundError:
+                logging.warning("No GADDAG found for vocabulary {0}".format(vocab))
+                with Wordbase._lock:
+                    Wordbase._gaddag_missing.add(vocab)
+                return None
+            logging.info(
+                "Loaded GADDAG {1} in {0:.2f} seconds".format(time.time() - t0, bname)
+            )
+            with Wordbase._lock:
+                if vocab in Wordbase._dawg:
+                    # Don't keep the GADDAG if its DAWG has been evicted meanwhile
+                    Wordbase._gaddag[vocab] = g
+        return g
+
     @staticmethod
     def dawg() -> PackedDawgDictionary:
         """Return the main dictionary DAWG object, associated with the
         current thread, i.e. the current user's (or game's) locale"""
-        return Wordbase._dawg[current_vocabulary()]
+        vocab = current_vocabulary()
+        d = Wordbase._get(vocab)
+        if d is None:
+            raise KeyError(vocab)
+        return d
 
     @staticmethod
     def dawg_for_locale(locale: str) -> PackedDawgDictionary:
         """Return the DAWG object associated with the given locale"""
         vocab = vocabulary_for_locale(locale)
-        return Wordbase._dawg[vocab]
+        d = Wordbase._get(vocab)
+        if d is None:
+            raise KeyError(vocab)
+        return d
 
     @staticmethod
     def dawg_for_vocab(vocab: str) -> Optional[PackedDawgDictionary]:
         """Return the DAWG object associated with the given vocabulary"""
-        return Wordbase._dawg.get(vocab)
+        return Wordbase._get(vocab)
 
     @staticmethod
     def two_letter_words(
@@ -140,16 +379,29 @@ class Wordbase:
     ) -> Tuple[List[str], List[str]]:
         """Return the two letter word list associated with the
         current vocabulary"""
-        dawg = Wordbase._dawg.get(vocabulary or current_vocabulary())
+        dawg = Wordbase._get(vocabulary or current_vocabulary())
         return ([], []) if dawg is None else dawg.two_letter_words()
 
     @staticmethod
     def is_initialized() -> bool:
-        """Check if all expected dictionaries have been loaded.
+        """Check if all expected dictionaries have been loaded, i.e. all
+        dictionaries or, in lazy mode, those of the hot locales.
         Used by health check endpoints to determine readiness."""
         with Wordbase._lock:
-            # Check that we have loaded the expected number of dictionaries
-            return len(Wordbase._dawg) == len(_DAWGS)
+            return all(dawg in Wordbase._dawg for dawg in _HOT_DAWGS)
+
+    @staticmethod
+    def resident() -> List[str]:
+        """Return the names of the currently loaded dictionaries,
+        in least-recently-used order"""
+        with Wordbase._lock:
+            return list(Wordbase._dawg)
+
+    @staticmethod
+    def cache_stats() -> Dict[str, NodeCacheStats]:
+        """Return the node cache statistics of each loaded dictionary"""
+        with Wordbase._lock:
+            return {vocab: d.cache_stats() for vocab, d in Wordbase._dawg.items()}
 
     @staticmethod
     def warmup() -> bool:
@@ -0,0 +1,169 @@
+"""
+
+    Tests for the packed DAWG dictionary (src/dawgdictionary.py)
+    Copyright © 2026 Miðeind ehf.
+
+    Verifies that the alternative ways of loading and querying a packed
+    DAWG give exactly the same results as the original byte buffer
+    navigation.
+
+"""
+
+from __future__ import annotations
+
+import os
+
+from alphabets import IcelandicAlphabet
+from dawgdictionary import CountedRack, PackedDawgDictionary, PackedGaddagDictionary
+
+DAWG_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "resources", "ordalisti.bin.dawg"
+)
+
+
+def _load(use_mmap: bool) -> PackedDawgDictionary:
+    dawg = PackedDawgDictionary(IcelandicAlphabet)
+    dawg.load(DAWG_PATH, use_mmap=use_mmap)
+    return dawg
+
+
+def test_mmap_load() -> None:
+    """A memory-mapped DAWG answers queries exactly like a buffered one"""
+    buffered = _load(use_mmap=False)
+    mapped = _load(use_mmap=True)
+    assert not buffered.is_mmapped
+    assert mapped.is_mmapped
+    for word in ("halló", "blús", "abs", "eipeði", "nafnskírteinið", ""):
+        assert (word in buffered) == (word in mapped)
+    assert buffered.find_matches("e??st??") == mapped.find_matches("e??st??")
+    assert buffered.find_permutations("pr?óf") == mapped.find_permutations("pr?óf")
+    assert buffered.two_letter_words() == mapped.two_letter_words()
+
+
+def test_vocabularies_for_locales() -> None:
+    """Lazy loading keeps a locale's main and robot vocabularies hot"""
+    from wordbase import _vocabularies_for_locales
+
+    assert _vocabularies_for_locales(["is_IS"]) == [
+        "ordalisti",
+        "amlodi",
+        "midlungur",
+    ]
+
+
+def test_node_cache_budget() -> None:
+    """A tiny node cache evicts nodes but gives identical results"""
+    small = PackedDawgDictionary(IcelandicAlphabet, cache_bytes=4096)
+    small.load(DAWG_PATH)
+    large = _load(use_mmap=False)
+    assert small.find_matches("f?r??t??n") == large.find_matches("f?r??t??n")
+    stats = small.cache_stats()
+    assert stats["misses"] > 0
+    assert stats["evictions"] > 0
+    assert stats["pinned"] > 0
+    assert stats["bytes"] <= stats["max_bytes"] or stats["entries"] == 1
+
+
+def test_decoded_table() -> None:
+    """A DAWG decoded into a node table gives identical results"""
+    packed = _load(use_mmap=False)
+    table = PackedDawgDictionary(IcelandicAlphabet)
+    table.load(DAWG_PATH, decode=True)
+    assert table.is_decoded
+    assert not packed.is_decoded
+    for word in ("halló", "blús", "abs", "eipeði", "nafnskírteinið", "", "a?b"):
+        assert (word in packed) == (word in table)
+    for pattern in ("??", "e??st??", "f?r??t??n", "q?"):
+        assert packed.find_matches(pattern) == table.find_matches(pattern)
+        assert packed.find_matches(pattern, sort=False) == table.find_matches(
+            pattern, sort=False
+        )
+    assert packed.find_permutations("pr?óf") == table.find_permutations("pr?óf")
+    assert packed.two_letter_words() == table.two_letter_words()
+
+
+def test_find_many() -> None:
+    """A batched lookup agrees with individual lookups"""
+    for dawg in (_load(use_mmap=False), _load(use_mmap=True)):
+        words = [
+            "halló", "hall", "hallóið", "blús", "blúsar", "abs",
+            "eipeði", "eipaði", "nafnskírteinið", "", "a?b", "blús",
+        ]  # fmt: skip
+        assert dawg.find_many(words) == [w in dawg for w in words]
+
+
+def test_crosscheck_bits() -> None:
+    """Cross-check bit patterns match the letters found by find_matches()"""
+    for dawg in (_load(use_mmap=False), _load(use_mmap=True)):
+        table = PackedDawgDictionary(IcelandicAlphabet)
+        table.load(DAWG_PATH, decode=True)
+        for above, below in (("", "á"), ("h", ""), ("hú", "ið"), ("x", "q"), ("bl", "s")):
+            matches = dawg.find_matches(above + "?" + below, sort=False)
+            expected = IcelandicAlphabet.bit_pattern(
+                "".join(w[len(above)] for w in matches)
+            )
+            assert dawg.crosscheck_bits(above, below) == expected
+            # Second call is answered from the memo
+            assert dawg.crosscheck_bits(above, below) == expected
+            assert table.crosscheck_bits(above, below) == expected
+
+
+def test_gaddag_strings() -> None:
+    """Each word is represented in a GADDAG by one string per split point"""
+    assert PackedGaddagDictionary.strings("care") == [
+        "c+are",
+        "ac+re",
+        "rac+e",
+        "erac",
+    ]
+    assert PackedGaddagDictionary.strings("á") == ["á"]
+
+
+def test_counted_rack() -> None:
+    """A CountedRack enumerates the states reachable by taking tiles,
+    taking a letter itself in preference to a blank tile"""
+    rack = CountedRack("abba?", IcelandicAlphabet)
+    assert rack.contents(0) == "aabb?"
+    assert rack.size[0] == 5
+    assert rack.bits[0] == IcelandicAlphabet.all_bits_set()
+    after_a = rack.moves[0]["a"]
+    assert rack.contents(after_a) == "abb?"
+    after_x = rack.moves[0]["x"]
+    assert rack.contents(after_x) == "aabb"
+    assert rack.bits[after_x] == IcelandicAlphabet.bit_pattern("ab")
+    assert "x" not in rack.moves[after_x]
+    # The same counts are reached by different paths
+    assert rack.moves[after_a]["x"] == rack.moves[after_x]["a"]
+    state = 0
+    for letter in "abbaé":
+        state = rack.moves[state][letter]
+    assert rack.size[state] == 0 and not rack.moves[state]
+    # States are only created as they are reached
+    rack = CountedRack("abdefghijklmnops", IcelandicAlphabet)
+    assert len(rack.size) == 1 and not rack.moves
+    assert rack.contents(rack.moves[0]["p"]) == "abdefghijklmnos"
+    assert len(rack.size) == 17 and len(rack.moves) == 1
+
+
+def test_overlay() -> None:
+    """Words added and removed at run time are reflected in all queries"""
+    dawg = _load(use_mmap=False)
+    assert "halló" in dawg and "hallóx" not in dawg
+    dawg.set_overlay(["hallóx", "halló", "xx1"], ["halló", "hallóx"])
+    overlay = dawg.overlay
+    assert overlay is not None
+    # Words already in the graph, or not in it, are disregarded
+    assert overlay.added == {"hallóx"}
+    assert overlay.removed == {"halló"}
+    assert "hallóx" in dawg and "halló" not in dawg
+    assert dawg.find_many(["halló", "hallóx", "blús"]) == [False, True, True]
+    matches = dawg.find_matches("hall??")
+    assert "hallóx" in matches and "halló" not in dawg.find_matches("hall?")
+    assert matches == sorted(matches, key=IcelandicAlphabet.sortkey)
+    bits = dawg.crosscheck_bits("hall", "x")
+    assert bits & IcelandicAlphabet.letter_bit["ó"]
+    assert not dawg.crosscheck_bits("hall", "") & IcelandicAlphabet.letter_bit["ó"]
+    assert "hallóx" in dawg.find_permutations("xhlaól")
+    dawg.set_overlay([], [])
+    assert dawg.overlay is None
+    assert "halló" in dawg and "hallóx" not in dawg
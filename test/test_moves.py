@@ -13,7 +13,13 @@
 
 from typing import Any, Dict, List
 
-from utils import CustomClient, login_user
+from utils import (
+    CustomClient,
+    HUN_HESTUR,
+    board_state,
+    login_user,
+    vertical_move,
+)
 
 # An empty 15x15 board, as 15 rows of 15 spaces
 EMPTY_BOARD: List[str] = [" " * 15] * 15
@@ -69,6 +75,45 @@ def test_board_row_strings() -> None:
     assert rows[7][8] == "Ú"
 
 
+def test_board_runs() -> None:
+    """The letters and tiles adjacent to each square agree with
+    a square-by-square walk of the board, also after tiles are
+    removed and the board is copied"""
+    import random
+    from skraflmechanics import Board, BOARD_SIZE
+
+    rnd = random.Random(42)
+    b = Board(board_type="standard")
+    for _ in range(150):
+        row, col = rnd.randrange(BOARD_SIZE), rnd.randrange(BOARD_SIZE)
+        letter = rnd.choice("abcdéðþ  ")
+        b.set_letter(row, col, letter)
+        b.set_tile(row, col, "?" if letter != " " and rnd.random() < 0.2 else letter)
+    b = Board(copy=b)
+    directions = (("above", -1, 0), ("below", 1, 0), ("left", 0, -1), ("right", 0, 1))
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            for name, xd, yd in directions:
+                assert getattr(b, "letters_" + name)(row, col) == Board.adjacent(
+                    row, col, xd, yd, b.letter_at
+                )
+                assert getattr(b, "tiles_" + name)(row, col) == Board.adjacent(
+                    row, col, xd, yd, b.tile_at
+                )
+    assert b.is_empty() == all(
+        not b.is_covered(row, col)
+        for row in range(BOARD_SIZE)
+        for col in range(BOARD_SIZE)
+    )
+    rows = b.row_strings()
+    assert [(r, c, t, ltr) for r, c, t, ltr in b.enum_tiles()] == [
+        (r, c, b.tile_at(r, c), b.letter_at(r, c))
+        for r in range(BOARD_SIZE)
+        for c in range(BOARD_SIZE)
+        if rows[r][c] != "."
+    ]
+
+
 def test_best_moves_equivalence() -> None:
     """The in-process Python engine and the moves service must generate
     the same move set, with the same scores, for the same position.
@@ -119,6 +164,105 @@ def test_best_moves_equivalence() -> None:
     assert python_moves == set(service_moves)
 
 
+def test_incremental_crosschecks() -> None:
+    """Cross-checks that are updated incrementally as moves are applied
+    must match those calculated from scratch for the resulting board"""
+    from skraflmechanics import Move, CrossChecks, BOARD_SIZE
+
+    state = board_state()
+    crosschecks = state.crosschecks()
+    for word, row, col, horiz in (*HUN_HESTUR, ("sæt", 9, 6, True)):
+        move = Move(word, row, col, horiz)
+        move.make_covers(state.board(), word)
+        state.apply_move(move, shallow=True)
+    fresh = CrossChecks(state.board())
+    for index in range(BOARD_SIZE):
+        for horiz in (True, False):
+            assert crosschecks.axis(index, horiz) == fresh.axis(index, horiz)
+            assert crosschecks.adjacent(index, horiz) == fresh.adjacent(index, horiz)
+    assert state.crosschecks() is crosschecks
+
+
+def test_best_moves_top_k() -> None:
+    """Generating only the top candidates must yield the head of the
+    full candidate list, with scores that match Move.score()"""
+    from skraflmechanics import Move
+    from skraflplayer import AutoPlayer
+
+    state = board_state(HUN_HESTUR, "aðei?ns")
+
+    full = AutoPlayer(0, state).generate_best_moves(0)
+    assert len(full) > 10
+    for m, score in full:
+        # Recalculate the score from scratch
+        assert isinstance(m, Move)
+        # pylint: disable=protected-access
+        fresh = Move(m.word(), m.row, m._col, m._horizontal)
+        for c in m.covers():
+            fresh.add_validated_cover(c)
+        assert fresh.score(state) == score
+    top = AutoPlayer(0, state).generate_best_moves(10)
+    assert [(m.summary(state), s) for m, s in top] == [
+        (m.summary(state), s) for m, s in full[:10]
+    ]
+
+
+def test_leftpart_cache() -> None:
+    """Left parts are cached by rack contents, regardless of tile order"""
+    from skraflplayer import AutoPlayer, leftpart_cache_stats
+
+    state = board_state((("hún", 7, 6, True),))
+    p = state.player_to_move()
+    state.set_rack(p, "rðeiaxs")
+    first = AutoPlayer(0, state).generate_best_moves(0)
+    stats = leftpart_cache_stats()
+    state.set_rack(p, "aðeirsx")
+    second = AutoPlayer(0, state).generate_best_moves(0)
+    after = leftpart_cache_stats()
+    if stats["entries"]:
+        # Move generation uses the DAWG, not a GADDAG
+        assert after["hits"] == stats["hits"] + 1
+        assert after["misses"] == stats["misses"]
+    assert [(m.summary(state), s) for m, s in first] == [
+        (m.summary(state), s) for m, s in second
+    ]
+
+
+def test_robot_engine_job() -> None:
+    """A robot move generated from a serialized job, as in a worker
+    process of the robot engine, must equal the in-thread move"""
+    import time
+    from skraflmechanics import decode_move
+    from autoplayers import autoplayer_create, TOP_SCORE
+    from robotengine import RobotJob, _run_job
+
+    locale = "is_IS"
+    state = board_state((("h?ún", 7, 6, True),), "aðeirs?", locale=locale)
+    p = state.player_to_move()
+    state.set_rack(1 - p, "tuklmno")
+    state.recalc_bag()
+
+    job = RobotJob(
+        locale=locale,
+        board_type=state.board_type,
+        tileset=state.tileset,
+        board=state.board().row_strings(),
+        rack=state.rack(p),
+        opponent_rack=state.rack(1 - p),
+        scores=(0, 0),
+        robot_level=TOP_SCORE,
+        deadline=time.time() + 60.0,
+    )
+    summary = _run_job(job)
+    assert summary is not None
+    decoded = decode_move(state.board(), summary)
+    assert decoded is not None
+    expected = autoplayer_create(state, TOP_SCORE).generate_move()
+    assert decoded.summary(state) == expected.summary(state)
+    # An expired job is skipped
+    assert _run_job(job._replace(deadline=time.time() - 1.0)) is None
+
+
 def test_moves_invalid_board(client: CustomClient, u1: str) -> None:
     login_user(client, 1)
     # Wrong number of board rows: rejected locally with a 400 status
@@ -133,3 +277,452 @@ def test_moves_invalid_board(client: CustomClient, u1: str) -> None:
     )
     assert resp.status_code == 400
 
+
+def test_move_deadline() -> None:
+    """Move generation with a deadline returns the candidates found by
+    then, and records whether it went through the whole board"""
+    import time
+    from skraflplayer import AutoPlayer
+
+    state = board_state(HUN_HESTUR, "aðeirs?")
+
+    apl = AutoPlayer(0, state)
+    full = apl.generate_best_moves(0)
+    assert apl.completed()
+    later = apl.generate_best_moves(0, deadline=time.time() + 600.0)
+    assert apl.completed()
+    assert [(m.summary(state), s) for m, s in later] == [
+        (m.summary(state), s) for m, s in full
+    ]
+    # A deadline that has already passed stops the generation
+    # as soon as some candidates have been found
+    truncated = apl.generate_best_moves(0, deadline=time.time() - 1.0)
+    assert not apl.completed()
+    assert 0 < len(truncated) < len(full)
+    found = {m.summary(state) for m, _ in full}
+    assert all(m.summary(state) in found for m, _ in truncated)
+    assert apl.generate_move(deadline=time.time() - 1.0) is not None
+
+
+def test_pick_from_deadline() -> None:
+    """A robot that picks from the top candidates, and needs more of
+    them because too many share the top score, keeps its complete list
+    of top candidates if the deadline passes before or while it
+    generates more of them"""
+    import time
+    from typing import Optional
+    from skraflmechanics import Move
+    from skraflplayer import AutoPlayer, AutoPlayer_Custom
+
+    # All the top candidates are anagrams of 'aeinrst', with the same score
+    state = board_state((("ion", 7, 6, True),), "aeinrst", locale="en_US")
+    full = AutoPlayer(0, state).generate_best_moves(0)
+    best = {m.summary(state) for m, s in full if s == full[0].score}
+    assert len(best) > 4
+
+    def pick(expire_after_first: bool) -> Move:
+        apl = AutoPlayer_Custom(0, state, pick_from=2)
+        generate = apl._generate_candidates  # pylint: disable=protected-access
+        limits: List[int] = []
+
+        def generate_candidates(
+            limit: int = 0, deadline: Optional[float] = None
+        ) -> None:
+            limits.append(limit)
+            if limits[1:] and not expire_after_first:
+                # The deadline passes while we generate more candidates
+                deadline = time.time() - 1.0
+            generate(limit, deadline)
+            if expire_after_first:
+                # The deadline passes right after the first candidates
+                apl._deadline = time.time() - 1.0
+
+        apl._generate_candidates = generate_candidates  # type: ignore
+        move = apl.generate_move(deadline=time.time() + 600.0)
+        assert isinstance(move, Move)
+        assert limits == ([4] if expire_after_first else [4, 0])
+        assert apl.completed() and len(apl._ranked) == 4
+        return move
+
+    assert pick(expire_after_first=True).summary(state) in best
+    assert pick(expire_after_first=False).summary(state) in best
+
+
+def test_custom_vocabulary_moves() -> None:
+    """A robot with a custom vocabulary generates exactly those moves
+    whose words are two-letter words or in the custom vocabulary"""
+    from typing import Sequence, Set, Tuple
+    from skraflmechanics import Move, SummaryTuple
+    from skraflplayer import AutoPlayer, AutoPlayer_Custom
+    from autoplayers import autoplayer_create, COMMON
+
+    def custom_moves(
+        locale: str, words: Sequence[Tuple[str, int, int, bool]], rack: str
+    ) -> Set[SummaryTuple]:
+        state = board_state(words, rack, locale=locale)
+        apl = autoplayer_create(state, COMMON)
+        assert isinstance(apl, AutoPlayer_Custom)
+        vocab = apl.vocab
+        assert vocab is not None
+
+        def playable(word: str) -> bool:
+            return len(word) == 2 or word in vocab
+
+        custom = {(m.summary(state), s) for m, s in apl.generate_best_moves(0)}
+        expected: Set[Tuple[SummaryTuple, int]] = set()
+        for m, s in AutoPlayer(0, state).generate_best_moves(0):
+            if not isinstance(m, Move):
+                continue
+            if playable(m.word()):
+                expected.add((m.summary(state), s))
+            elif len(m.covers()) == 1:
+                # A single tile that forms words in both directions is
+                # found as a horizontal move. If the robot can't play the
+                # horizontal word, it finds the move as a vertical one,
+                # if it can play the vertical word.
+                v = vertical_move(state, m)
+                if v is not None and playable(v.word()):
+                    expected.add((v.summary(state), s))
+        assert len(custom) > 0
+        assert custom == expected
+        return {summary for summary, _ in custom}
+
+    custom_moves("is_IS", HUN_HESTUR, "aðeirs?")
+    # A 't' after 'tea' forms 'teat' horizontally and 'tore' vertically:
+    # the robot doesn't know 'teat', so it finds the move as 'tore'
+    moves = custom_moves(
+        "en_US", (("tea", 7, 6, True), ("ore", 8, 9, False)), "aseirt?"
+    )
+    assert any(coord == "10H" and tiles == "tore" for coord, tiles, _ in moves)
+
+
+def test_single_tile_moves() -> None:
+    """A single tile that forms words in both directions is only
+    found once, as a horizontal move"""
+    from skraflmechanics import Move, SummaryTuple, unique_moves
+    from skraflplayer import AutoPlayer
+
+    state = board_state(HUN_HESTUR, "aðeirs?")
+
+    moves = [m for m, _ in AutoPlayer(0, state).generate_best_moves(0)]
+    singles = [m for m in moves if isinstance(m, Move) and len(m.covers()) == 1]
+    placements = [tuple(m.covers()[0]) for m in singles]
+    assert len(placements) > 0
+    assert len(placements) == len(set(placements))
+    # The square below the 'ú' is found as an extension of the 'e' in 'hestur'
+    assert any(m.summary(state)[0].startswith("I7") for m in singles)
+
+    # The moves sidecar may return single-tile moves in both directions:
+    # unique_moves() keeps the horizontal ones only
+    summaries = [m.summary(state) for m in moves]
+    with_duplicates: List[SummaryTuple] = []
+    for m, summary in zip(moves, summaries):
+        if m in singles and (v := vertical_move(state, m)) is not None:
+            with_duplicates.append(v.summary(state))
+        with_duplicates.append(summary)
+    assert len(with_duplicates) > len(summaries)
+    assert unique_moves(state.board(), with_duplicates) == summaries
+
+
+def test_undo_move() -> None:
+    """Moves applied with undoable=True can be taken back,
+    restoring the board, racks, bag, scores and cross-checks"""
+    from typing import Any, Tuple
+    from skraflmechanics import (
+        State,
+        Move,
+        PassMove,
+        ChallengeMove,
+        ResponseMove,
+        CrossChecks,
+    )
+    from skraflplayer import AutoPlayer
+
+    def snapshot(state: State) -> Tuple[Any, ...]:
+        return (
+            state.board().row_strings(),
+            state.scores(),
+            state.rack(0),
+            state.rack(1),
+            state.bag().contents(),
+            state.player_to_move(),
+            state.num_moves(),
+            state.challenge_score,
+            state.last_rack,
+            state.is_game_over(),
+        )
+
+    state = board_state(drawtiles=True)
+    while not state.is_game_over():
+        before = snapshot(state)
+        move = AutoPlayer(0, state).generate_move()
+        # Try out two moves in a row, then take them back
+        assert state.apply_move(move, undoable=True)
+        if state.apply_move(PassMove(), undoable=True):
+            state.randomize_and_sort_rack()
+            state.undo_move()
+        assert state.undo_move() is move
+        assert snapshot(state) == before
+        # The cross-checks are kept up to date through the undo
+        crosschecks, fresh = state.crosschecks(), CrossChecks(state.board())
+        for index in range(15):
+            for horiz in (True, False):
+                assert crosschecks.axis(index, horiz) == fresh.axis(index, horiz)
+        state.apply_move(move)
+
+    # A successful challenge removes a move from the board;
+    # undoing the response puts it back
+    state = board_state(drawtiles=True, manual_wordcheck=True)
+    state.set_rack(0, "ðþðþaei")
+    move = Move("ðþðþ", 7, 7, True)
+    move.make_covers(state.board(), "ðþðþ")
+    state.apply_move(move)
+    state.apply_move(ChallengeMove())
+    before = snapshot(state)
+    state.apply_move(ResponseMove(), undoable=True)
+    assert state.board().is_empty()
+    state.undo_move()
+    assert snapshot(state) == before
+    assert state.is_challengeable()
+
+
+def test_position_hash() -> None:
+    """Position hashes depend on the contents of the board and the rack,
+    not on the order in which tiles were placed or racks were drawn"""
+    import random
+    from skraflmechanics import Board, State, BOARD_SIZE
+    from config import BoardTypes
+
+    squares = [
+        (7, 6, "h", "h"),
+        (7, 7, "?", "ú"),
+        (7, 8, "n", "n"),
+        (8, 6, "e", "e"),
+        (9, 6, "?", "s"),
+    ]
+    boards: List[Board] = []
+    for seed in range(3):
+        b = Board(board_type="standard")
+        # Place some tiles that are later removed again
+        for col in range(BOARD_SIZE):
+            b.set_letter(0, col, "x")
+            b.set_tile(0, col, "?" if col % 2 else "x")
+        for row, col, tile, letter in random.Random(seed).sample(squares, len(squares)):
+            b.set_tile(row, col, tile)
+            b.set_letter(row, col, letter)
+        for col in range(BOARD_SIZE):
+            b.set_letter(0, col, " ")
+            b.set_tile(0, col, " ")
+        boards.append(b)
+    h = boards[0].position_hash()
+    assert h != 0
+    assert all(b.position_hash() == h for b in boards)
+    assert Board(copy=boards[0]).position_hash() == h
+    assert Board().position_hash() == 0
+    # A blank tile makes a difference
+    b = Board(copy=boards[0])
+    b.set_tile(7, 7, "ú")
+    assert b.position_hash() != h
+    b.set_tile(7, 7, "?")
+    assert b.position_hash() == h
+    # Round trip through the binary format
+    data = boards[0].position_bytes()
+    b = Board()
+    b.load_position_bytes(data)
+    assert b.row_strings() == boards[0].row_strings()
+    assert b.position_hash() == h
+
+    # The position key of a state includes the player's rack, in any order
+    def state_with(rack: str, board_type: BoardTypes = "standard") -> State:
+        state = board_state(board_type=board_type)
+        state.board().load_position_bytes(data)
+        state.set_rack(0, rack)
+        state.set_rack(1, "abc")
+        return state
+
+    key = state_with("aðei?ns").position_key(0)
+    assert state_with("?snieða").position_key(0) == key
+    assert state_with("aðei?nn").position_key(0) != key
+    assert state_with("aðei?n").position_key(0) != key
+    assert state_with("aðei?ns", "explo").position_key(0) != key
+    assert state_with("aðei?ns").position_key(1) != key
+    assert (
+        state_with("?snieða").position_bytes(0)
+        == state_with("aðei?ns").position_bytes(0)
+    )
+
+
+def test_best_move_cache() -> None:
+    """Cached best moves are found for the same position and rack,
+    and for fewer moves than were asked for when they were stored"""
+    from skraflmechanics import State
+    from languages import current_vocabulary
+    from wordbase import Wordbase
+    from movecache import BestMoveCache
+
+    def state_with(rack: str) -> State:
+        state = board_state()
+        rows = ["." * 15] * 15
+        rows[7] = "......hÚn......"
+        state.board().load_row_strings(rows)
+        state.set_rack(0, rack)
+        return state
+
+    cache = BestMoveCache(2, use_redis=False, ttl=0)
+    moves = [("8F", "þhún", 14), ("G7", "að", 8), ("7G", "ah", 7)]
+    state = state_with("aðei?ns")
+    assert cache.get(state, 3) is None
+    cache.put(state, 3, moves)
+    # The same position, with the rack in a different order
+    assert cache.get(state_with("?snieða"), 3) == moves
+    assert cache.get(state, 2) == moves[0:2]
+    # More moves than were stored, or a different rack
+    assert cache.get(state, 5) is None
+    assert cache.get(state, 0) is None
+    assert cache.get(state_with("aðei?nn"), 3) is None
+    # All the moves that there are in a position
+    other = state_with("x")
+    cache.put(other, 10, moves[0:1])
+    assert cache.get(other, 0) == moves[0:1]
+    assert cache.get(other, 20) == moves[0:1]
+    # The least recently used position is evicted
+    cache.put(state_with("abc"), 1, moves[0:1])
+    assert cache.get(state, 1) is None
+    # Changes to the vocabulary at run time make a difference
+    vocab = current_vocabulary()
+    assert Wordbase.update_overlay(vocab, add=["ðððð"])
+    try:
+        assert cache.get(other, 0) is None
+    finally:
+        Wordbase.update_overlay(vocab, remove=["ðððð"])
+    assert cache.get(other, 0) == moves[0:1]
+    stats = cache.stats()
+    assert stats["hits"] == 5
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    # Positions are told apart even if their 64-bit position keys collide
+    position_key = State.position_key
+    State.position_key = lambda self, player: 0  # type: ignore
+    try:
+        assert cache.get(other, 0) == moves[0:1]
+        assert cache.get(state_with("aðei?nn"), 0) is None
+    finally:
+        State.position_key = position_key  # type: ignore
+
+
+def test_state_snapshot() -> None:
+    """A game state restored from a stored snapshot is the same as the
+    state obtained by replaying the stored moves of the game, and the
+    moves are replayed when the move history is needed"""
+    import json
+    from datetime import UTC, datetime
+    from typing import Any, List, Optional, Tuple
+    from skrafldb import Client, GameModel
+    from skraflmechanics import State, Move, ChallengeMove, ResponseMove
+    from skraflplayer import AutoPlayer
+    from skraflgame import Game
+    from languages import set_locale
+
+    locale = "is_IS"
+    set_locale(locale)
+
+    def details(state: Optional[State]) -> Tuple[Any, ...]:
+        assert state is not None
+        return (
+            state.board().row_strings(),
+            state.board().position_hash(),
+            state.scores(),
+            state.rack(0),
+            state.rack(1),
+            sorted(state.bag().contents()),
+            state.player_to_move(),
+            state.num_moves(),
+            state.challenge_score,
+            state.last_rack,
+            state.last_covers,
+            state.is_resigned(),
+            state.is_game_over(),
+        )
+
+    def store(game: Game) -> GameModel:
+        # Store the game as Game._do_store() does, with the snapshot
+        # making a round trip through JSON, as in the database
+        gm = game._to_model()
+        if gm.snapshot is not None:
+            gm.snapshot = json.loads(json.dumps(gm.snapshot))
+        return gm
+
+    def load(gm: GameModel) -> Game:
+        return Game._from_model("snapshot-test", gm)
+
+    def replayed(gm: GameModel) -> Game:
+        # Load the game without its snapshot, replaying the moves
+        snapshot, gm.snapshot = gm.snapshot, None
+        game = load(gm)
+        gm.snapshot = snapshot
+        assert not game._stored_moves
+        return game
+
+    with Client.get_context():
+        game = Game(locale=locale, uuid="snapshot-test")
+        game.player_ids = ["u0", "u1"]
+        game._preferences = {"locale": locale, "manual": True}
+        game.timestamp = datetime.now(UTC)
+        game.state = State(
+            drawtiles=True,
+            manual_wordcheck=True,
+            tileset=game.tileset,
+            locale=locale,
+            board_type=game.board_type,
+        )
+        # Start with a successfully challenged move, then an
+        # unsuccessful challenge
+        game.state.set_rack(0, "ðþðþaei")
+        game.initial_racks = [game.state.rack(0), game.state.rack(1)]
+        move = Move("ðþðþ", 7, 7, True)
+        move.make_covers(game.state.board(), "ðþðþ")
+        moves: List[Any] = [move, ChallengeMove(), ResponseMove()]
+        while not game.state.is_game_over():
+            if not moves:
+                moves.append(AutoPlayer(0, game.state).generate_move())
+            game.register_move(moves.pop(0))
+            if game.num_moves() == 6 and game.state.is_challengeable():
+                moves.extend([ChallengeMove(), ResponseMove()])
+            gm = store(game)
+            assert gm.snapshot is not None
+            assert gm.snapshot["moves"] == len(gm.moves) == game.num_moves()
+            loaded = load(gm)
+            assert loaded._stored_moves
+            assert details(loaded.state) == details(replayed(gm).state)
+
+        # The game was loaded from its snapshot: the moves are
+        # replayed on demand
+        records = game.move_records()
+        assert loaded.num_moves() == len(records) == game.num_moves()
+        assert loaded.move_records(-2) == records[-2:]
+        assert loaded._stored_tile_count == gm.tile_count
+        # Storing the game again doesn't require the moves to be replayed
+        gm2 = store(loaded)
+        assert loaded._stored_moves
+        assert gm2.tile_count == gm.tile_count
+        assert gm2.snapshot == gm.snapshot
+        history = loaded.moves
+        assert not loaded._stored_moves and loaded._stored_tile_count == 0
+        assert loaded.move_records() == records
+        assert [(m.player, m.rack, m.ts) for m in history] == [
+            (m.player, m.rack, m.ts) for m in game.moves
+        ]
+        assert store(loaded).tile_count == gm.tile_count
+
+        # A stale snapshot, not matching the stored moves, is ignored
+        assert gm.snapshot is not None
+        gm.snapshot["moves"] -= 1
+        stale = load(gm)
+        assert not stale._stored_moves and stale.num_moves() == len(records)
+        assert details(stale.state) == details(loaded.state)
+        # As is an invalid one
+        gm.snapshot["moves"] += 1
+        gm.snapshot["v"] = 0
+        invalid = load(gm)
+        assert not invalid._stored_moves and invalid.num_moves() == len(records)
+        assert details(invalid.state) == details(loaded.state)
@@ -8,7 +8,7 @@
 """
 
 import json
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Sequence, Tuple
 
 import sys
 import os
@@ -27,6 +27,7 @@ THIS_PATH = os.path.dirname(__file__)
 sys.path.append(THIS_PATH)
 
 import main  # noqa: E402
+from config import BoardTypes  # noqa: E402
 from skrafldb import (  # noqa: E402
     EloModel,
     UserModel,
@@ -36,6 +37,8 @@ from skrafldb import (  # noqa: E402
     Client,
 )
 from skraflgame import PrefsDict  # noqa: E402
+from skraflmechanics import State, Move  # noqa: E402
+from languages import set_locale, tileset_for_locale  # noqa: E402
 
 
 # Bearer token for testing
@@ -231,3 +234,71 @@ def get_session_dict(client: CustomClient) -> Dict[str, Any]:
     session = decode_cookie(cookie.decoded_value)
     # Obtain the session dictionary from the decoded cookie
     return json.loads(session).get("s", {})
+
+
+# Words placed on the board by board_state(): the tiles, with '?' before
+# a letter made with a blank tile, the row, the column, and whether the
+# word is horizontal
+WordPlacement = Tuple[str, int, int, bool]
+
+# 'hún' across and 'hestur' down from the center square, a position
+# shared by many of the move generation tests
+HUN_HESTUR: Sequence[WordPlacement] = (
+    ("hún", 7, 6, True),
+    ("hestur", 7, 6, False),
+)
+
+
+def board_state(
+    words: Sequence[WordPlacement] = (),
+    rack: str = "",
+    *,
+    locale: str = "is_IS",
+    board_type: BoardTypes = "standard",
+    drawtiles: bool = False,
+    manual_wordcheck: bool = False,
+) -> State:
+    """Set the current thread's locale and return a fresh game state
+    for it, with the given words played on the board and, if given,
+    the rack of the player to move"""
+    set_locale(locale)
+    state = State(
+        tileset=tileset_for_locale(locale),
+        drawtiles=drawtiles,
+        manual_wordcheck=manual_wordcheck,
+        locale=locale,
+        board_type=board_type,
+    )
+    for tiles, row, col, horiz in words:
+        move = Move(tiles.replace("?", ""), row, col, horiz)
+        move.make_covers(state.board(), tiles)
+        state.apply_move(move, shallow=True)
+    if rack:
+        state.set_rack(state.player_to_move(), rack)
+    return state
+
+
+def vertical_move(state: State, move: Move) -> Optional[Move]:
+    """Return a single-tile move described as a vertical move, i.e. the
+    same tile on the same square, forming a word along its column, or
+    None if the tile has no neighbours in the column"""
+    board = state.board()
+    row, col, tile, letter = move.covers()[0]
+    top, bottom = row, row
+    while top > 0 and board.is_covered(top - 1, col):
+        top -= 1
+    while bottom < 14 and board.is_covered(bottom + 1, col):
+        bottom += 1
+    if top == bottom:
+        return None
+    tiles = ""
+    for r in range(top, bottom + 1):
+        if r != row:
+            tiles += board.letter_at(r, col)
+        elif tile == "?":
+            tiles += "?" + letter
+        else:
+            tiles += letter
+    vertical = Move(tiles.replace("?", ""), top, col, False)
+    vertical.make_covers(board, tiles)
+    return vertical
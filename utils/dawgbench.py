@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+
+    Dawgbench
+
+    Copyright © 2026 Miðeind ehf.
+
+    The Creative Commons Attribution-NonCommercial 4.0
+    International Public License (CC-BY-NC 4.0) applies to this software.
+    For further information, see https://github.com/mideind/Netskrafl
+
+
+    This program compares the speed of the two ways of navigating a
+    packed DAWG: decoding nodes from the byte buffer on the fly (the
+    default), and walking an eagerly decoded DawgNodeTable. It times
+    word lookups, pattern matches, permutations of blank-heavy racks and
+    robot move generation in a number of seeded games, and checks that
+    both give identical results. It also reports the hit rate of the
+    node cache after the permutation searches.
+
+    With the -g option, it instead compares robot move generation from
+    the DAWG with move generation from the GADDAG of the vocabulary
+    (built by dawgbuilder.py), in the positions of a number of seeded
+    games, both with the racks as dealt and with blank-heavy racks.
+    It checks that both engines find identical candidate moves.
+
+    Usage: python dawgbench.py
+        [-g (compare DAWG and GADDAG move generation)]
+        [-l locale (default en_US)]
+        [-n number_of_games (default 4)]
+        [-w number_of_words_to_look_up (default 20000)]
+
+"""
+
+from __future__ import annotations
+
+from typing import Callable, List, Optional, Tuple
+
+import getopt
+import os
+import random
+import sys
+import time
+
+base_path = os.path.dirname(__file__)  # Assumed to be in the /utils directory
+
+# Add the ../src directory to the Python path
+sys.path.append(os.path.join(base_path, "../src"))
+
+from languages import (  # noqa: E402
+    set_locale,
+    current_alphabet,
+    current_board_type,
+    current_tileset,
+    current_vocabulary,
+)
+from dawgdictionary import (  # noqa: E402
+    PackedDawgDictionary,
+    PackedGaddagDictionary,
+)
+from skraflmechanics import Bag, PassMove, State, SummaryTuple  # noqa: E402
+from skraflplayer import AutoPlayer  # noqa: E402
+from wordbase import Wordbase  # noqa: E402
+
+
+PATTERNS = ["??", "???", "a??e", "?e?s?", "??i?g", "s??????", "???????s", "?"]
+
+# Racks for the permutation benchmark; blank-heavy racks visit the most nodes
+RACKS = ["??aeirs", "?aeinst", "??einrt"]
+
+
+def load(vocab: str, decode: bool) -> Tuple[PackedDawgDictionary, float]:
+    """Load a vocabulary, returning the dictionary and the load time"""
+    fname = os.path.abspath(
+        os.path.join(base_path, "..", "resources", vocab + ".bin.dawg")
+    )
+    t0 = time.time()
+    dawg = PackedDawgDictionary(current_alphabet())
+    dawg.load(fname, decode=decode)
+    return dawg, time.time() - t0
+
+
+def load_gaddag(vocab: str) -> PackedGaddagDictionary:
+    """Load the GADDAG of a vocabulary"""
+    fname = os.path.abspath(
+        os.path.join(base_path, "..", "resources", vocab + ".gaddag.bin.dawg")
+    )
+    gaddag = PackedGaddagDictionary(current_alphabet())
+    gaddag.load(fname)
+    return gaddag
+
+
+def timed(func: Callable[[], object]) -> Tuple[object, float]:
+    """Call a function, returning its result and the elapsed time"""
+    t0 = time.time()
+    result = func()
+    return result, time.time() - t0
+
+
+def lookup_words(dawg: PackedDawgDictionary, num_words: int) -> List[str]:
+    """Return a list of words to look up, about half of them valid"""
+    rng = random.Random(42)
+    words = dawg.find_matches("?????", sort=False) + dawg.find_matches(
+        "???????", sort=False
+    )
+    words = rng.sample(words, min(num_words // 2, len(words)))
+    # Add a corrupted version of each word, mostly not in the dictionary
+    letters = current_alphabet().order
+    return words + [w[:-2] + rng.choice(letters) + w[-1] for w in words]
+
+
+def play_games(dawg: PackedDawgDictionary, num_games: int) -> List[str]:
+    """Play a number of seeded robot games using the given dictionary,
+    returning a transcript of the moves"""
+    # Install the dictionary as the current vocabulary for the robot
+    Wordbase._dawg[current_vocabulary()] = dawg  # type: ignore
+    transcript: List[str] = []
+    for game in range(num_games):
+        Bag.RNG = random.Random(game)  # type: ignore
+        random.seed(game)
+        state = State(
+            tileset=current_tileset(), drawtiles=True, board_type=current_board_type()
+        )
+        while not state.is_game_over():
+            moves = AutoPlayer(0, state).generate_best_moves(0)
+            move = moves[0].move if moves else PassMove()
+            transcript.append(str(move))
+            state.apply_move(move)
+    return transcript
+
+
+def bench(num_games: int, num_words: int) -> None:
+    """Run the benchmarks for the current locale"""
+    vocab = current_vocabulary()
+    packed, t_packed = load(vocab, decode=False)
+    table, t_table = load(vocab, decode=True)
+    print(f"{'':24}{'packed':>10}{'table':>10}")
+
+    def report(what: str, t0: float, t1: float) -> None:
+        print(f"{what:24}{t0:10.3f}{t1:10.3f}")
+
+    report("load (s)", t_packed, t_table)
+
+    words = lookup_words(packed, num_words)
+    r0, t0 = timed(lambda: [w in packed for w in words])
+    r1, t1 = timed(lambda: [w in table for w in words])
+    assert r0 == r1, "find() results differ"
+    report(f"find x{len(words)} (s)", t0, t1)
+
+    r0, t0 = timed(lambda: [packed.find_matches(p) for p in PATTERNS])
+    r1, t1 = timed(lambda: [table.find_matches(p) for p in PATTERNS])
+    assert r0 == r1, "find_matches() results differ"
+    report(f"find_matches x{len(PATTERNS)} (s)", t0, t1)
+
+    r0, t0 = timed(lambda: [packed.find_permutations(r) for r in RACKS])
+    r1, t1 = timed(lambda: [table.find_permutations(r) for r in RACKS])
+    assert r0 == r1, "find_permutations() results differ"
+    report(f"find_permutations x{len(RACKS)} (s)", t0, t1)
+    stats = packed.cache_stats()
+    lookups = stats["hits"] + stats["misses"]
+    print(
+        f"node cache: {stats['entries'] + stats['pinned']} nodes, "
+        f"{stats['bytes'] / (1024 * 1024):.1f} of "
+        f"{stats['max_bytes'] / (1024 * 1024):.1f} MiB, "
+        f"{100 * stats['hits'] / max(lookups, 1):.0f}% hits, "
+        f"{stats['evictions']} evictions"
+    )
+
+    r0, t0 = timed(lambda: play_games(packed, num_games))
+    r1, t1 = timed(lambda: play_games(table, num_games))
+    assert r0 == r1, "Robot moves differ"
+    report(f"robot games x{num_games} (s)", t0, t1)
+
+
+def collect_positions(num_games: int) -> Tuple[List[State], List[State]]:
+    """Play a number of seeded robot games, returning copies of the
+    positions along the way, with the racks as dealt and with the
+    first two tiles of each rack replaced by blanks"""
+    dealt: List[State] = []
+    blanks: List[State] = []
+    for game in range(num_games):
+        Bag.RNG = random.Random(game)  # type: ignore
+        random.seed(game)
+        state = State(
+            tileset=current_tileset(), drawtiles=True, board_type=current_board_type()
+        )
+        while not state.is_game_over():
+            dealt.append(State(copy=state))
+            blanky = State(copy=state)
+            rack = state.player_rack().contents()
+            blanky.set_rack(state.player_to_move(), "??" + rack[2:])
+            blanks.append(blanky)
+            moves = AutoPlayer(0, state).generate_best_moves(1)
+            state.apply_move(moves[0].move if moves else PassMove())
+    return dealt, blanks
+
+
+def generate_candidates(
+    positions: List[State], gaddag: Optional[PackedGaddagDictionary]
+) -> Tuple[List[List[SummaryTuple]], int, float]:
+    """Generate the candidate moves in each position, using the GADDAG
+    if given, otherwise the DAWG. Returns a summary of the candidates,
+    their total number and the time spent generating them."""
+    summaries: List[List[SummaryTuple]] = []
+    count = 0
+    elapsed = 0.0
+    for ix, state in enumerate(positions):
+        # The axis of the first move is chosen at random
+        random.seed(ix)
+        player = AutoPlayer(0, state)
+        player._gaddag = gaddag  # type: ignore
+        t0 = time.time()
+        player._generate_candidates()  # type: ignore
+        elapsed += time.time() - t0
+        candidates = player.candidates()
+        count += len(candidates)
+        summaries.append([m.summary(state) for m in candidates])
+    return summaries, count, elapsed
+
+
+def bench_gaddag(num_games: int) -> None:
+    """Compare move generation from the DAWG and the GADDAG"""
+    vocab = current_vocabulary()
+    t0 = time.time()
+    gaddag = load_gaddag(vocab)
+    print(f"GADDAG loaded in {time.time() - t0:.3f} s")
+    dealt, blanks = collect_positions(num_games)
+    print(f"{'moves/s':24}{'DAWG':>10}{'GADDAG':>10}")
+    for what, positions in (("dealt racks", dealt), ("blank-heavy racks", blanks)):
+        r0, n, t_dawg = generate_candidates(positions, None)
+        r1, _, t_gaddag = generate_candidates(positions, gaddag)
+        assert r0 == r1, "Candidate moves differ"
+        print(f"{what:24}{n / t_dawg:10.0f}{n / t_gaddag:10.0f}")
+    print(f"{len(dealt)} positions")
+
+
+class Usage(Exception):
+    """Error reporting exception for wrong command line arguments"""
+
+    def __init__(self, msg: getopt.GetoptError) -> None:
+        super().__init__(msg.msg)
+        self.msg = msg
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Guido van Rossum's pattern for a Python main function"""
+
+    if argv is None:
+        argv = sys.argv
+    try:
+        try:
+            opts, _ = getopt.getopt(
+                argv[1:],
+                "hgl:n:w:",
+                ["help", "gaddag", "locale", "numgames", "numwords"],
+            )
+        except getopt.error as msg:
+            raise Usage(msg)
+        locale = "en_US"
+        num_games = 4
+        num_words = 20000
+        gaddag = False
+        for o, a in opts:
+            if o in ("-h", "--help"):
+                print(__doc__)
+                sys.exit(0)
+            elif o in ("-g", "--gaddag"):
+                gaddag = True
+            elif o in ("-l", "--locale"):
+                locale = str(a)
+            elif o in ("-n", "--numgames"):
+                num_games = int(a)
+            elif o in ("-w", "--numwords"):
+                num_words = int(a)
+
+        set_locale(locale)
+        print(f"Benchmarking vocabulary {current_vocabulary()}")
+        if gaddag:
+            bench_gaddag(num_games)
+        else:
+            bench(num_games, num_words)
+
+    except Usage as err:
+        print(err.msg, file=sys.stderr)
+        print("for help use --help", file=sys.stderr)
+        return 2
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -106,7 +106,20 @@
 
 from __future__ import annotations
 
-from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TypedDict
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypedDict,
+)
 
 import os
 import sys
@@ -118,6 +131,9 @@ import binascii
 import struct
 import io
 import functools
+import heapq
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 
 base_path = os.path.dirname(__file__)  # Assumed to be in the /utils directory
 
@@ -156,6 +172,10 @@ NO_MID_VOCAB_SIZE = 32_500  # Norwegian medium robot vocabulary size
 PL_AML_VOCAB_SIZE = 30_000  # Polish easy robot vocabulary size
 PL_MID_VOCAB_SIZE = 60_000  # Polish medium robot vocabulary size
 
+# Input files that are not pre-sorted are sorted in chunks of this many
+# words, spilled to temporary files and merged while building
+SORT_CHUNK_SIZE = 500_000
+
 # Hacky, but OK in this instance: store the current alphabet and its
 # sort key in global variables
 _current_alphabet: Optional[Alphabet] = None
@@ -168,6 +188,47 @@ def set_current_alphabet(alphabet: Alphabet) -> None:
     _current_sortkey = alphabet.sortkey
 
 
+class DawgReport(NamedTuple):
+
+    """Timing and size information about a DAWG that has been built"""
+
+    output: str  # Output file name, without the .bin.dawg suffix
+    words: int  # Number of words in the DAWG
+    nodes: int  # Number of unique graph nodes
+    size: int  # Size of the output file in bytes
+    seconds: float  # Time taken to build and write the DAWG
+
+
+# Reports of the DAWGs built in this process, in order of completion
+_reports: List[DawgReport] = []
+
+
+def print_reports(reports: List[DawgReport], elapsed: float) -> None:
+    """Print a summary of the DAWGs that have been built"""
+    if not reports:
+        return
+    print(
+        "\n{0:<32} {1:>10} {2:>9} {3:>12} {4:>9}".format(
+            "DAWG", "Words", "Nodes", "Bytes", "Seconds"
+        )
+    )
+    for r in reports:
+        print(
+            "{0:<32} {1:>10,} {2:>9,} {3:>12,} {4:>9.2f}".format(
+                r.output + ".bin.dawg", r.words, r.nodes, r.size, r.seconds
+            )
+        )
+    print(
+        "{0} DAWGs, {1:,} bytes, {2:.2f} seconds of build time "
+        "in {3:.2f} seconds".format(
+            len(reports),
+            sum(r.size for r in reports),
+            sum(r.seconds for r in reports),
+            elapsed,
+        )
+    )
+
+
 class _DawgNode:
 
     """A _DawgNode is a node in a Directed Acyclic Word Graph (DAWG).
@@ -637,6 +698,8 @@ class DawgBuilder:
         self._dawg: Optional[_Dawg] = None
         self._encoding = encoding
         self._alphabet = set(encoding)
+        # Number of words in the DAWG, once loaded
+        self._outcount = 0
 
     class _InFile:
         """InFile represents a single sorted input file."""
@@ -702,14 +765,18 @@ class DawgBuilder:
             self._fin = None
 
     class _InFileToBeSorted(_InFile):
-        """InFileToBeSorted represents an input file that should be pre-sorted in memory"""
+        """InFileToBeSorted represents an input file that is not pre-sorted.
+        The file is read in chunks of SORT_CHUNK_SIZE words, which are sorted
+        and spilled to temporary files, and the sorted chunks are then merged
+        as the words are read. A file that fits in a single chunk is
+        simply sorted in memory."""
 
         def _init(self) -> None:
-            """Read the entire file and pre-sort it"""
-            self._list: List[str] = []
-            self._index = 0
+            """Read the file and sort it, chunk by chunk"""
             assert _current_sortkey is not None
             self._sortkey = _current_sortkey
+            self._chunks: List[IO[str]] = []
+            chunk: List[str] = []
             f = self._input_filter
             assert self._fin is not None
             try:
@@ -721,28 +788,48 @@ class DawgBuilder:
                         line = f(line)
                     if line and len(line) < MAXLEN:
                         # Valid word
-                        self._list.append(line)
-            except StopIteration:
-                pass
+                        chunk.append(line)
+                        if len(chunk) >= SORT_CHUNK_SIZE:
+                            self._spill(chunk)
+                            chunk = []
             finally:
                 self._fin.close()
                 self._fin = None
-            self._len = len(self._list)
-            self._list.sort(key=self._sortkey)
+            self._words: Iterator[str]
+            if self._chunks:
+                if chunk:
+                    self._spill(chunk)
+                self._words = heapq.merge(
+                    *((line.rstrip("\n") for line in c) for c in self._chunks),
+                    key=self._sortkey,
+                )
+            else:
+                chunk.sort(key=self._sortkey)
+                self._words = iter(chunk)
             self.read_word()
 
+        def _spill(self, chunk: List[str]) -> None:
+            """Sort a chunk of words and write it to a temporary file"""
+            chunk.sort(key=self._sortkey)
+            tf = tempfile.TemporaryFile("w+", encoding="utf-8", newline="\n")
+            tf.writelines(w + "\n" for w in chunk)
+            tf.seek(0)
+            self._chunks.append(tf)
+
         def read_word(self) -> bool:
-            if self._index >= self._len:
+            word = next(self._words, None)
+            if word is None:
                 self._eof = True
                 return False
-            self._nxt = self._list[self._index]
-            self._key = self._sortkey(self._nxt)
-            self._index += 1
+            self._nxt = word
+            self._key = self._sortkey(word)
             return True
 
         def close(self) -> None:
-            """Close the associated file, if it is still open"""
-            pass
+            """Close and delete the temporary chunk files, if any"""
+            for c in self._chunks:
+                c.close()
+            self._chunks = []
 
     def _load(
         self,
@@ -776,8 +863,8 @@ class DawgBuilder:
         lastword = None
         lastkey = None
         # Open the input files. The first (main) input file is assumed
-        # to be pre-sorted. Other input files are sorted in memory before
-        # being used.
+        # to be pre-sorted. Other input files are sorted before being used,
+        # in memory or in temporary files (see _InFileToBeSorted).
         infiles = [
             DawgBuilder._InFile(relpath, f, input_filter=input_filter)
             if ix == 0
@@ -873,16 +960,84 @@ class DawgBuilder:
         for f in infiles:
             assert not f.has_word()
             f.close()
+        if removal is not None:
+            removal.close()
         # Complete and clean up
         self._dawg.finish()
+        self._outcount = outcount
         print(
             "Finished loading {0} words, output {1} words, {2} duplicates skipped, {3} removed".format(
                 incount, outcount, duplicates, removed
             )
         )
 
-    def _output_binary(self, relpath: str, output: str) -> None:
-        """Write the DAWG to a flattened binary output file with extension '.dawg'"""
+    def _load_gaddag(self, words: List[str]) -> None:
+        """Load the GADDAG strings of a list of words into the graph.
+        The strings are generated and sorted one starting letter at a
+        time, to limit the memory needed for large vocabularies."""
+        from dawgdictionary import GADDAG_SEPARATOR as SEP
+
+        self._dawg = _Dawg()
+        outcount = 0
+        for letter in sorted(set("".join(words))):
+            # All strings starting with this letter, i.e. those where
+            # the reversed part starts at an instance of the letter
+            # (see PackedGaddagDictionary.strings())
+            bucket = [
+                w[i - 1 :: -1] + SEP + w[i:] if i < len(w) else w[::-1]
+                for w in words
+                if letter in w
+                for i in range(1, len(w) + 1)
+                if w[i - 1] == letter
+            ]
+            bucket.sort()
+            for g in bucket:
+                self._dawg.add_word(g)
+            outcount += len(bucket)
+            print("{0}...".format(outcount), end="\r")
+            sys.stdout.flush()
+        self._dawg.finish()
+        self._outcount = len(words)
+        print(
+            "Finished loading {0} words, output {1} GADDAG strings".format(
+                len(words), outcount
+            )
+        )
+
+    def build_gaddag(
+        self, words: List[str], output: str, relpath: str = "resources"
+    ) -> Optional[DawgReport]:
+        """Build a GADDAG from a list of words and write it to
+        a binary output file. The encoding of the builder must
+        include the GADDAG separator character."""
+        print("DawgBuilder starting GADDAG build...")
+        if (not words) or (not output):
+            print("No inputs or no output: Nothing to do")
+            return None
+        t0 = time.time()
+        self._load_gaddag(words)
+        print("Outputting...")
+        size = self._output_binary(relpath, output)
+        print("DawgBuilder done")
+        return self._report(output, size, t0)
+
+    def _report(self, output: str, size: int, t0: float) -> DawgReport:
+        """Create a report on the DAWG just written, and note it
+        in the list of reports for this process"""
+        assert self._dawg is not None
+        report = DawgReport(
+            output,
+            self._outcount,
+            self._dawg.num_unique_nodes(),
+            size,
+            time.time() - t0,
+        )
+        _reports.append(report)
+        return report
+
+    def _output_binary(self, relpath: str, output: str) -> int:
+        """Write the DAWG to a flattened binary output file with extension
+        '.dawg' and return the size of the file in bytes"""
         assert self._dawg is not None
         f = io.BytesIO()
         # Create a packer to flatten the tree onto a binary stream
@@ -893,8 +1048,9 @@ class DawgBuilder:
         with open(
             os.path.abspath(os.path.join(relpath, output + ".bin.dawg")), "wb"
         ) as of:
-            of.write(f.getvalue())
+            size = of.write(f.getvalue())
         f.close()
+        return size
 
     def _output_text(self, relpath: str, output: str) -> None:
         """Write the DAWG to a text output file with extension '.text.dawg'"""
@@ -912,12 +1068,14 @@ class DawgBuilder:
         word_filter: Optional[Callable[[str], bool]] = None,
         removals: Optional[str] = None,
         input_filter: Optional[Callable[[str], str]] = None,
-    ):
+    ) -> Optional[DawgReport]:
         """Build a DAWG from input file(s) and write it to the output file(s)
         (potentially in multiple formats).
-        The input files are assumed to be individually sorted in correct
-        ascending alphabetical order. They will be merged in parallel into
-        a single sorted stream and added to the DAWG.
+        The first input file is assumed to be sorted in correct ascending
+        alphabetical order; the others are sorted as they are read.
+        They will be merged in parallel into a single sorted stream and
+        added to the DAWG. Returns a report on the DAWG, or None if
+        there was nothing to do.
         """
         # inputs is a list of input file names
         # output is an output file name without file type suffix (extension);
@@ -927,14 +1085,16 @@ class DawgBuilder:
         if (not inputs) or (not output):
             # Nothing to do
             print("No inputs or no output: Nothing to do")
-            return
+            return None
+        t0 = time.time()
         self._load(relpath, inputs, removals, word_filter, input_filter)
         # print("Dumping...")
         # self._dawg.dump()
         print("Outputting...")
         # self._output_text(relpath, output)
-        self._output_binary(relpath, output)
+        size = self._output_binary(relpath, output)
         print("DawgBuilder done")
+        return self._report(output, size, t0)
 
 
 # Filter functions
@@ -960,6 +1120,45 @@ def filter_common(word: str) -> bool:
     return len(word) <= COMMON_MAXLEN
 
 
+# A job is a unit of work, such as building a single DAWG, that can
+# run in this process or be handed to a worker process (see run_parallel())
+Job = Callable[[], None]
+# A task is one of the run_*() functions that can be invoked from
+# the command line
+Task = Callable[[], None]
+
+
+class BuildJob(NamedTuple):
+
+    """A job that builds a single DAWG from word list files"""
+
+    title: str  # Shown in the progress output
+    alphabet: str  # Name of an Alphabet instance in alphabets.py
+    inputs: List[str]  # Input files to be merged
+    output: str  # Output file name, without the .bin.dawg suffix
+    word_filter: Optional[Callable[[str], bool]] = None
+    removals: Optional[str] = None  # File of words to remove
+    full_order: bool = False  # Encode using the full order of the alphabet
+
+    def __call__(self) -> None:
+        import alphabets
+
+        print("Starting DAWG build for {0}".format(self.title))
+        alphabet: Alphabet = getattr(alphabets, self.alphabet)
+        set_current_alphabet(alphabet)
+        db = DawgBuilder(
+            encoding=alphabet.full_order if self.full_order else alphabet.order
+        )
+        report = db.build(
+            self.inputs,
+            self.output,
+            word_filter=self.word_filter,
+            removals=self.removals,
+        )
+        if report is not None:
+            print("Build took {0:.2f} seconds".format(report.seconds))
+
+
 def run_test() -> None:
     """Build a DAWG from the files listed"""
     # This creates a DAWG from a single file named testwords.txt
@@ -1095,88 +1294,215 @@ def run_nynorsk2024() -> None:
     print("Build took {0:.2f} seconds".format(t1 - t0))
 
 
-def run_skrafl() -> None:
-    """Build a DAWG from the files listed"""
-    # This creates a DAWG from the full database of Icelandic words in
+def skrafl_jobs() -> List[Job]:
+    """The DAWG builds for the Icelandic vocabulary and its
+    robot vocabularies, Miðlungur and Amlóði"""
+    # The full vocabulary is created from the database of Icelandic words in
     # 'Beygingarlýsing íslensks nútímamáls' (BIN), except abbreviations,
     # 'skammstafanir', and proper names, 'sérnöfn'.
     # The words in ordalisti.add.txt are added to BIN, and words in
     # ordalisti.remove.txt (known errors) are removed.
     # The result is about 2.3 million words, generating >100,000 graph nodes
-    print("Starting DAWG build for skraflhjalp/netskrafl.appspot.com")
-    set_current_alphabet(IcelandicAlphabet)
-    assert _current_alphabet is not None
+    return [
+        BuildJob(
+            "skraflhjalp/netskrafl.appspot.com",
+            "IcelandicAlphabet",
+            # Input files to be merged
+            ["ordalisti.full.sorted.txt", "ordalisti.add.txt"],
+            "ordalisti",  # Output file - full name will be ordalisti.bin.dawg
+            word_filter=filter_skrafl,  # Word filter function to apply
+            removals="ordalisti.remove.txt",  # Words to remove
+        ),
+        BuildJob(
+            "Miðlungur",
+            "IcelandicAlphabet",
+            ["ordalisti.mid.sorted.txt", "ordalisti.add.txt"],
+            "midlungur",  # Output file - full name will be midlungur.bin.dawg
+            word_filter=filter_skrafl,
+            removals="ordalisti.remove.txt",
+        ),
+        BuildJob(
+            "Amlóði",
+            "IcelandicAlphabet",
+            ["ordalisti.aml.filtered.txt"],
+            "amlodi",  # Output file - full name will be amlodi.bin.dawg
+            word_filter=filter_common,
+        ),
+    ]
 
-    db = DawgBuilder(encoding=_current_alphabet.order)
-    t0 = time.time()
-    db.build(
-        ["ordalisti.full.sorted.txt", "ordalisti.add.txt"],  # Input files to be merged
-        "ordalisti",  # Output file - full name will be ordalisti.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-        removals="ordalisti.remove.txt",  # Words to remove
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
 
-    # Process Miðlungur vocabulary
+def check_skrafl() -> None:
+    """Test loading of the Icelandic DAWGs"""
+    from dawgdictionary import PackedDawgDictionary
 
-    print("Starting DAWG build for Miðlungur")
-    db = DawgBuilder(encoding=_current_alphabet.order)
-    t0 = time.time()
-    # "isl"/"is_IS" specifies Icelandic sorting order - modify this for other languages
-    db.build(
-        ["ordalisti.mid.sorted.txt", "ordalisti.add.txt"],  # Input files to be merged
-        "midlungur",  # Output file - full name will be midlungur.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-        removals="ordalisti.remove.txt",  # Words to remove
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
+    for fname in ("ordalisti.bin.dawg", "midlungur.bin.dawg", "amlodi.bin.dawg"):
+        dawg = PackedDawgDictionary(IcelandicAlphabet)
+        t0 = time.time()
+        dawg.load(rpath(fname))
+        t1 = time.time()
+        print("{0} loaded in {1:.2f} seconds".format(fname, t1 - t0))
 
-    # Process Amlóði vocabulary
 
-    print("Starting DAWG build for Amlóði")
-    db = DawgBuilder(encoding=_current_alphabet.order)
-    t0 = time.time()
-    # "isl"/"is_IS" specifies Icelandic sorting order - modify this for other languages
-    db.build(
-        ["ordalisti.aml.filtered.txt"],  # Input files to be merged
-        "amlodi",  # Output file - full name will be amlodi.bin.dawg
-        word_filter=filter_common,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
+def run_skrafl() -> None:
+    """Build the DAWGs for skraflhjalp/netskrafl.appspot.com"""
+    print("Starting DAWG build for skraflhjalp/netskrafl.appspot.com")
+    for job in skrafl_jobs():
+        job()
+    check_skrafl()
+    print("DAWG builder run complete")
+
 
-    # Test loading of DAWG
+def _dawg_words(fpath: str, alphabet: Alphabet, minlen: int = 1) -> List[str]:
+    """Return all words of at least minlen letters in a previously built
+    DAWG, in no particular order"""
     from dawgdictionary import PackedDawgDictionary
 
-    dawg = PackedDawgDictionary(_current_alphabet)
-    fpath = rpath("ordalisti.bin.dawg")
-    t0 = time.time()
-    dawg.load(fpath)
-    t1 = time.time()
+    dawg = PackedDawgDictionary(alphabet)
+    dawg.load(fpath, decode=True)
+    return [
+        w
+        for n in range(minlen, MAXLEN)
+        for w in dawg.find_matches("?" * n, sort=False)
+    ]
 
-    print("ordalisti.bin.dawg loaded in {0:.2f} seconds".format(t1 - t0))
 
-    # Test loading of Miðlungur DAWG
-    dawg = PackedDawgDictionary(_current_alphabet)
-    fpath = rpath("midlungur.bin.dawg")
-    t0 = time.time()
+def _sorted_dawg_words(fpath: str, alphabet: Alphabet) -> Iterator[str]:
+    """Generate all words in a previously built DAWG in sorted order,
+    without holding them in memory. Edges are stored in alphabet order,
+    so a depth-first walk of the graph yields the words in order."""
+    from dawgdictionary import PackedDawgDictionary
+
+    dawg = PackedDawgDictionary(alphabet)
     dawg.load(fpath)
-    t1 = time.time()
+    edges, final = dawg.graph()
+    order = alphabet.order
 
-    print("midlungur.bin.dawg loaded in {0:.2f} seconds".format(t1 - t0))
+    def walk(node: int, prefix: str) -> Iterator[str]:
+        for codes, nextnode in edges(node):
+            word = prefix
+            last = len(codes) - 1
+            for j, code in enumerate(codes):
+                word += order[code & 0x7F]
+                if code & 0x80 or (j == last and final[nextnode] & 0x80):
+                    yield word
+            if nextnode:
+                yield from walk(nextnode, word)
 
-    # Test loading of Amlóði DAWG
-    dawg = PackedDawgDictionary(_current_alphabet)
-    fpath = rpath("amlodi.bin.dawg")
+    return walk(0, "")
+
+
+def _vocabularies() -> List[Tuple[str, str]]:
+    """Return the (vocabulary, alphabet name) tuples of _ALL_DAWGS in
+    wordbase.py, without importing wordbase.py, which would require
+    the full application configuration"""
+    from list_dawgs import dawg_entries
+
+    return dawg_entries(os.path.join(base_path, "..", "src", "wordbase.py"))
+
+
+def _build_gaddag(vocab: str, alphabet_name: str) -> None:
+    """Build the GADDAG of a vocabulary from its previously built DAWG"""
+    import alphabets
+    from dawgdictionary import GADDAG_SEPARATOR
+
+    global _current_sortkey
+
+    fpath = rpath(vocab + ".bin.dawg")
+    print("Starting GADDAG build for {0}".format(vocab))
+    alphabet: Alphabet = getattr(alphabets, alphabet_name)
+    set_current_alphabet(alphabet)
     t0 = time.time()
-    dawg.load(fpath)
+    words = [w for w in _dawg_words(fpath, alphabet, 2) if len(w) <= WORD_MAXLEN]
+    # The separator sorts after all letters of the alphabet
+    encoding = alphabet.order + GADDAG_SEPARATOR
+
+    def sortkey(s: str) -> List[int]:
+        return [encoding.index(c) for c in s if c != "|"]
+
+    _current_sortkey = sortkey
+    db = DawgBuilder(encoding=encoding)
+    db.build_gaddag(words, vocab + ".gaddag")
     t1 = time.time()
+    print("Build took {0:.2f} seconds".format(t1 - t0))
 
-    print("amlodi.bin.dawg loaded in {0:.2f} seconds".format(t1 - t0))
 
-    print("DAWG builder run complete")
+def gaddag_jobs() -> List[Job]:
+    """The GADDAG builds for the vocabularies whose DAWGs have been built"""
+    jobs: List[Job] = []
+    for vocab, alphabet_name in _vocabularies():
+        if not os.path.exists(rpath(vocab + ".bin.dawg")):
+            print("Skipping GADDAG build for {0}: DAWG not found".format(vocab))
+            continue
+        jobs.append(functools.partial(_build_gaddag, vocab, alphabet_name))
+    return jobs
+
+
+def run_gaddags() -> None:
+    """Build a GADDAG for each vocabulary in _ALL_DAWGS in wordbase.py,
+    from its previously built DAWG. The GADDAG of vocabulary 'name' is
+    written to name.gaddag.bin.dawg."""
+    for job in gaddag_jobs():
+        job()
+
+
+def _compact(vocab: str, alphabet_name: str) -> None:
+    """Rebuild the DAWG of a vocabulary with its overlay folded in"""
+    import alphabets
+
+    additions = vocab + ".add.txt"
+    removals = vocab + ".remove.txt"
+    has_additions = os.path.exists(rpath(additions))
+    has_removals = os.path.exists(rpath(removals))
+    print("Starting compaction of {0}".format(vocab))
+    alphabet: Alphabet = getattr(alphabets, alphabet_name)
+    set_current_alphabet(alphabet)
+    t0 = time.time()
+    # Stream the words of the current DAWG, in sorted order, to an input
+    # file to be merged with the additions and filtered by the removals
+    sorted_name = vocab + ".compact.sorted.txt"
+    with open(rpath(sorted_name), "w", encoding="utf-8", newline="\n") as f:
+        for w in _sorted_dawg_words(rpath(vocab + ".bin.dawg"), alphabet):
+            f.write(w + "\n")
+    db = DawgBuilder(encoding=alphabet.order)
+    try:
+        db.build(
+            [sorted_name] + ([additions] if has_additions else []),
+            vocab,
+            relpath=rpath(),
+            removals=removals if has_removals else None,
+        )
+    finally:
+        os.remove(rpath(sorted_name))
+    t1 = time.time()
+    print("Compaction took {0:.2f} seconds".format(t1 - t0))
+
+
+def compact_jobs() -> List[Job]:
+    """The compactions of the vocabularies that have overlay files"""
+    jobs: List[Job] = []
+    for vocab, alphabet_name in _vocabularies():
+        if not (
+            os.path.exists(rpath(vocab + ".add.txt"))
+            or os.path.exists(rpath(vocab + ".remove.txt"))
+        ):
+            continue
+        if not os.path.exists(rpath(vocab + ".bin.dawg")):
+            print("Skipping compaction of {0}: DAWG not found".format(vocab))
+            continue
+        jobs.append(functools.partial(_compact, vocab, alphabet_name))
+    return jobs
+
+
+def run_compact() -> None:
+    """Fold the overlay of each vocabulary in _ALL_DAWGS in wordbase.py,
+    i.e. the words in its vocab.add.txt and vocab.remove.txt files, into
+    a freshly built DAWG, vocab.bin.dawg. Until then, the overlay is
+    applied at run time on top of the existing DAWG (see DawgOverlay in
+    dawgdictionary.py). Once the new DAWG has been deployed, the words in
+    the overlay files are already in (or absent from) the DAWG, so they
+    are ignored at run time and the files can be pruned at leisure."""
+    for job in compact_jobs():
+        job()
 
 
 def run_icelandic_filter() -> None:
@@ -1330,146 +1656,133 @@ def run_english_filter() -> None:
     print(f"English filtering done after reading {cnt} lines from source")
 
 
+def english_robot_vocab_jobs() -> List[Job]:
+    """The DAWG builds for the English robot vocabularies"""
+    return [
+        BuildJob(
+            "Sif/otcwl2014",
+            "EnglishAlphabet",
+            ["otcwl2014.aml.sorted.txt"],  # Input files to be merged
+            "otcwl2014.aml",  # Output file - full name will be otcwl2014.aml.bin.dawg
+            word_filter=filter_skrafl,  # Word filter function to apply
+        ),
+        BuildJob(
+            "Frigg/otcwl2014",
+            "EnglishAlphabet",
+            ["otcwl2014.mid.sorted.txt"],
+            "otcwl2014.mid",
+            word_filter=filter_skrafl,
+        ),
+        BuildJob(
+            "Sif/sowpods",
+            "EnglishAlphabet",
+            ["sowpods.aml.sorted.txt"],
+            "sowpods.aml",
+            word_filter=filter_skrafl,
+        ),
+        BuildJob(
+            "Frigg/sowpods",
+            "EnglishAlphabet",
+            ["sowpods.mid.sorted.txt"],
+            "sowpods.mid",
+            word_filter=filter_skrafl,
+        ),
+    ]
+
+
 def run_english_robot_vocabs() -> None:
     """Build DAWGS for English robot vocabularies"""
     print("Starting DAWG build for English robot vocabularies")
-
-    set_current_alphabet(EnglishAlphabet)
-    assert _current_alphabet is not None
-
-    print("Starting DAWG build for Sif/otcwl2014")
-    db = DawgBuilder(encoding=_current_alphabet.order)
-    t0 = time.time()
-    db.build(
-        ["otcwl2014.aml.sorted.txt"],  # Input files to be merged
-        "otcwl2014.aml",  # Output file - full name will be otcwl2014.aml.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
-
-    print("Starting DAWG build for Frigg/otcwl2014")
-    db = DawgBuilder(encoding=_current_alphabet.order)
-    t0 = time.time()
-    db.build(
-        ["otcwl2014.mid.sorted.txt"],  # Input files to be merged
-        "otcwl2014.mid",  # Output file - full name will be otcwl2014.mid.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
-
-    print("Starting DAWG build for Sif/sowpods")
-    db = DawgBuilder(encoding=_current_alphabet.order)
-    t0 = time.time()
-    db.build(
-        ["sowpods.aml.sorted.txt"],  # Input files to be merged
-        "sowpods.aml",  # Output file - full name will be sowpods.aml.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
-
-    print("Starting DAWG build for Frigg/sowpods")
-    db = DawgBuilder(encoding=_current_alphabet.order)
-    t0 = time.time()
-    db.build(
-        ["sowpods.mid.sorted.txt"],  # Input files to be merged
-        "sowpods.mid",  # Output file - full name will be sowpods.mid.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
+    for job in english_robot_vocab_jobs():
+        job()
+
+
+def polish_robot_vocab_jobs() -> List[Job]:
+    """The DAWG builds for the Polish robot vocabularies"""
+    return [
+        BuildJob(
+            "Wisława/osps37",
+            "PolishAlphabet",
+            [f"polish_top_{PL_AML_VOCAB_SIZE}.txt"],  # Input files to be merged
+            "osps37.aml",  # Output file - full name will be osps37.aml.bin.dawg
+            word_filter=filter_skrafl,  # Word filter function to apply
+        ),
+        BuildJob(
+            "Stefan/osps37",
+            "PolishAlphabet",
+            [f"polish_top_{PL_MID_VOCAB_SIZE}.txt"],
+            "osps37.mid",
+            word_filter=filter_skrafl,
+        ),
+    ]
 
 
 def run_polish_robot_vocabs() -> None:
     """Build DAWGS for Polish robot vocabularies"""
     print("Starting DAWG build for Polish robot vocabularies")
-
-    set_current_alphabet(PolishAlphabet)
-    assert _current_alphabet is not None
-
-    print("Starting DAWG build for Wisława/osps37")
-    db = DawgBuilder(encoding=_current_alphabet.order)
-    t0 = time.time()
-    db.build(
-        [f"polish_top_{PL_AML_VOCAB_SIZE}.txt"],  # Input files to be merged
-        "osps37.aml",  # Output file - full name will be osps37.aml.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
-
-    print("Starting DAWG build for Stefan/osps37")
-    db = DawgBuilder(encoding=_current_alphabet.order)
-    t0 = time.time()
-    db.build(
-        [f"polish_top_{PL_MID_VOCAB_SIZE}.txt"],  # Input files to be merged
-        "osps37.mid",  # Output file - full name will be osps37.mid.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
+    for job in polish_robot_vocab_jobs():
+        job()
+
+
+def norwegian_robot_vocab_jobs() -> List[Job]:
+    """The DAWG builds for the Norwegian bokmål robot vocabularies"""
+    return [
+        BuildJob(
+            "Sif/nsf2023",
+            "NorwegianAlphabet",
+            # Input files to be merged
+            [f"norwegian_bokmål_top_{NO_AML_VOCAB_SIZE}.txt"],
+            "nsf2023.aml",  # Output file - full name will be nsf2023.aml.bin.dawg
+            word_filter=filter_skrafl,  # Word filter function to apply
+            full_order=True,
+        ),
+        BuildJob(
+            "Frigg/nsf2023",
+            "NorwegianAlphabet",
+            [f"norwegian_bokmål_top_{NO_MID_VOCAB_SIZE}.txt"],
+            "nsf2023.mid",
+            word_filter=filter_skrafl,
+            full_order=True,
+        ),
+    ]
 
 
 def run_norwegian_robot_vocabs() -> None:
     """Build DAWGS for Norwegian bokmål robot vocabularies"""
     print("Starting DAWG build for Norwegian robot vocabularies")
-
-    set_current_alphabet(NorwegianAlphabet)
-    assert _current_alphabet is not None
-
-    print("Starting DAWG build for Sif/nsf2023")
-    db = DawgBuilder(encoding=_current_alphabet.full_order)
-    t0 = time.time()
-    db.build(
-        [f"norwegian_bokmål_top_{NO_AML_VOCAB_SIZE}.txt"],  # Input files to be merged
-        "nsf2023.aml",  # Output file - full name will be nsf2023.aml.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
-
-    print("Starting DAWG build for Frigg/nsf2023")
-    db = DawgBuilder(encoding=_current_alphabet.full_order)
-    t0 = time.time()
-    db.build(
-        [f"norwegian_bokmål_top_{NO_MID_VOCAB_SIZE}.txt"],  # Input files to be merged
-        "nsf2023.mid",  # Output file - full name will be nsf2023.mid.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
+    for job in norwegian_robot_vocab_jobs():
+        job()
+
+
+def nynorsk_robot_vocab_jobs() -> List[Job]:
+    """The DAWG builds for the Norwegian Nynorsk robot vocabularies"""
+    return [
+        BuildJob(
+            "Sif/nynorsk2024",
+            "NorwegianAlphabet",
+            # Input files to be merged
+            [f"norwegian_nynorsk_top_{NO_AML_VOCAB_SIZE}.txt"],
+            # Output file - full name will be nynorsk2024.aml.bin.dawg
+            "nynorsk2024.aml",
+            word_filter=filter_skrafl,  # Word filter function to apply
+            full_order=True,
+        ),
+        BuildJob(
+            "Frigg/nynorsk2024",
+            "NorwegianAlphabet",
+            [f"norwegian_nynorsk_top_{NO_MID_VOCAB_SIZE}.txt"],
+            "nynorsk2024.mid",
+            word_filter=filter_skrafl,
+            full_order=True,
+        ),
+    ]
 
 
 def run_nynorsk_robot_vocabs() -> None:
     """Build DAWGS for Norwegian Nynorsk robot vocabularies"""
     print("Starting DAWG build for Norwegian Nynorsk robot vocabularies")
-
-    set_current_alphabet(NorwegianAlphabet)
-    assert _current_alphabet is not None
-
-    print("Starting DAWG build for Sif/nynorsk2024")
-    db = DawgBuilder(encoding=_current_alphabet.full_order)
-    t0 = time.time()
-    db.build(
-        [f"norwegian_nynorsk_top_{NO_AML_VOCAB_SIZE}.txt"],  # Input files to be merged
-        "nynorsk2024.aml",  # Output file - full name will be nynorsk2024.aml.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
-
-    print("Starting DAWG build for Frigg/nynorsk2024")
-    db = DawgBuilder(encoding=_current_alphabet.full_order)
-    t0 = time.time()
-    db.build(
-        [f"norwegian_nynorsk_top_{NO_MID_VOCAB_SIZE}.txt"],  # Input files to be merged
-        "nynorsk2024.mid",  # Output file - full name will be nynorsk2024.mid.bin.dawg
-        word_filter=filter_skrafl,  # Word filter function to apply
-    )
-    t1 = time.time()
-    print("Build took {0:.2f} seconds".format(t1 - t0))
+    for job in nynorsk_robot_vocab_jobs():
+        job()
 
 
 def run_norwegian_filter(
@@ -1616,6 +1929,99 @@ def run_norwegian_nynorsk_filter() -> None:
     )
 
 
+# Tasks whose jobs, typically one per DAWG, can run in separate worker
+# processes, mapped to the functions that return their jobs. Other
+# tasks run as a single job.
+TASK_JOBS: Dict[Task, Callable[[], List[Job]]] = {
+    run_skrafl: skrafl_jobs,
+    run_english_robot_vocabs: english_robot_vocab_jobs,
+    run_polish_robot_vocabs: polish_robot_vocab_jobs,
+    run_norwegian_robot_vocabs: norwegian_robot_vocab_jobs,
+    run_nynorsk_robot_vocabs: nynorsk_robot_vocab_jobs,
+    run_compact: compact_jobs,
+    run_gaddags: gaddag_jobs,
+}
+
+# Checks to run once all jobs of a task have completed
+TASK_CHECKS: Dict[Task, Callable[[], None]] = {
+    run_skrafl: check_skrafl,
+}
+
+# Tasks that read files written by other tasks
+TASK_DEPENDENCIES: Dict[Task, Tuple[Task, ...]] = {
+    run_skrafl: (run_icelandic_filter,),
+    run_english_filter: (run_otcwl2014, run_sowpods),
+    run_norwegian_bokmål_filter: (run_nsf2023,),
+    run_norwegian_nynorsk_filter: (run_nynorsk2024,),
+    run_english_robot_vocabs: (run_english_filter,),
+    run_norwegian_robot_vocabs: (run_norwegian_bokmål_filter,),
+    run_nynorsk_robot_vocabs: (run_norwegian_nynorsk_filter,),
+}
+
+# Tasks that work on the DAWGs built by all tasks that precede them
+BARRIER_TASKS: FrozenSet[Task] = frozenset((run_compact, run_gaddags))
+
+
+def _run_job(job: Job) -> List[DawgReport]:
+    """Run a job in a worker process and return reports
+    on the DAWGs that it built"""
+    del _reports[:]
+    job()
+    return list(_reports)
+
+
+def run_parallel(tasks: List[Task], workers: int) -> List[DawgReport]:
+    """Run tasks in a pool of worker processes. The jobs of a task are
+    submitted to the pool once the tasks that it depends on, if they
+    are among the given tasks, have completed. Independent tasks, and
+    the individual DAWG builds within a task, thus run concurrently.
+    Returns the reports on the DAWGs built, in order of completion."""
+    selected = frozenset(tasks)
+
+    def prerequisites(task: Task) -> FrozenSet[Task]:
+        if task in BARRIER_TASKS:
+            return frozenset(tasks[: tasks.index(task)])
+        return selected.intersection(TASK_DEPENDENCIES.get(task, ()))
+
+    reports: List[DawgReport] = []
+    waiting = list(tasks)
+    completed: Set[Task] = set()
+    # The task of each running job, and the number of unfinished jobs per task
+    running: Dict[Future[List[DawgReport]], Task] = dict()
+    unfinished: Dict[Task, int] = dict()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            while waiting or running:
+                for task in [t for t in waiting if prerequisites(t) <= completed]:
+                    waiting.remove(task)
+                    jobs_func = TASK_JOBS.get(task)
+                    jobs = [task] if jobs_func is None else jobs_func()
+                    if not jobs:
+                        completed.add(task)
+                        continue
+                    unfinished[task] = len(jobs)
+                    for job in jobs:
+                        running[pool.submit(_run_job, job)] = task
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    # This raises an exception if the job failed
+                    reports.extend(future.result())
+                    unfinished[task] -= 1
+                    if not unfinished[task]:
+                        check = TASK_CHECKS.get(task)
+                        if check is not None:
+                            check()
+                        completed.add(task)
+        except BaseException:
+            # Don't start any more jobs, but let the running ones finish
+            pool.shutdown(cancel_futures=True)
+            raise
+    return reports
+
+
 def upload_dawgs_to_spaces() -> None:
     """Upload all DAWG files to Digital Ocean Spaces.
 
@@ -1719,7 +2125,8 @@ if __name__ == "__main__":
 
     print(f"DawgBuilder - project {os.environ['PROJECT_ID']}")
 
-    ALL_TASKS = [
+    # All tasks, in the order in which they run
+    TASKS = [
         run_icelandic_filter,  # Remove rare Icelandic words from robot vocabularies
         run_skrafl,  # Icelandic
         run_osps37,  # Polish
@@ -1735,13 +2142,23 @@ if __name__ == "__main__":
         run_polish_robot_vocabs,
         run_norwegian_robot_vocabs,
         run_nynorsk_robot_vocabs,
+        run_compact,  # Fold vocab.add.txt/vocab.remove.txt overlays into the DAWGs
+        run_gaddags,  # GADDAGs for all of the above
     ]
 
+    # Tasks that only run when asked for by name, not as part of 'all'.
+    # The overlay files of ordalisti are also inputs to run_skrafl, so
+    # a full build already includes them, and compacting would only
+    # build the same DAWG a second time.
+    ON_DEMAND_TASKS = frozenset((run_compact,))
+
+    ALL_TASKS = [t for t in TASKS if t not in ON_DEMAND_TASKS]
+
     def name(t: Callable[[], None]) -> str:
         """Cut the 'run_' prefix from the task name"""
         return t.__name__[4:]
 
-    alltasks = frozenset(name(t) for t in ALL_TASKS)
+    alltasks = frozenset(name(t) for t in TASKS)
 
     # Parse command line arguments
     parser = argparse.ArgumentParser(
@@ -1753,6 +2170,9 @@ Available tasks: {', '.join(sorted(alltasks))}
 Examples:
   %(prog)s all                    Build all vocabularies
   %(prog)s skrafl                 Build Icelandic vocabulary only
+  %(prog)s compact gaddags        Fold word overlays into the DAWGs
+                                  (not included in 'all')
+  %(prog)s all --jobs 8           Build all, running up to 8 builds at a time
   %(prog)s all --upload           Build all and upload to DO Spaces
   %(prog)s --upload-only          Upload existing files without building
 
@@ -1769,6 +2189,13 @@ Environment variables for upload:
         nargs="*",
         help="Tasks to run (use 'all' for all tasks)",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes for concurrent DAWG builds (default: 1)",
+    )
     parser.add_argument(
         "--upload",
         action="store_true",
@@ -1803,11 +2230,17 @@ Environment variables for upload:
             print(f"Available tasks: {', '.join(sorted(alltasks))}")
             sys.exit(1)
         # Keep original task order
-        tasks = [t for t in ALL_TASKS if name(t) in task_set]
+        tasks = [t for t in TASKS if name(t) in task_set]
 
     # Run the tasks
-    for task in tasks:
-        task()
+    t0 = time.time()
+    if args.jobs > 1:
+        reports = run_parallel(tasks, args.jobs)
+    else:
+        for task in tasks:
+            task()
+        reports = _reports
+    print_reports(reports, time.time() - t0)
 
     # Upload if requested
     if args.upload:
@@ -24,7 +24,7 @@ sys.path.append(os.path.join(base_path, "../src"))
 
 from alphabets import IcelandicAlphabet, PolishAlphabet  # noqa: E402
 from languages import set_locale  # noqa: E402
-from dawgdictionary import PackedDawgDictionary  # noqa: E402
+from dawgdictionary import PackedDawgDictionary, FindNavigator  # noqa: E402
 
 
 class DawgTester:
@@ -33,17 +33,27 @@ class DawgTester:
         self._dawg: Optional[PackedDawgDictionary] = None
         self._fpath = os.path.abspath(os.path.join(relpath, fname + ".bin.dawg"))
 
+    def _check_fast_path(self, word: str) -> None:
+        """Verify that the fast find() agrees with a FindNavigator"""
+        assert self._dawg is not None
+        nav = FindNavigator(word)
+        self._dawg.navigate(nav)
+        if nav.is_found() != self._dawg.find(word):
+            print("Error: find() and FindNavigator disagree on \"{0}\"".format(word))
+
     def _test(self, word: str) -> None:
         assert self._dawg is not None
         print("\"{0}\" is {1}found".format(word, "" if word in self._dawg else u"not "))
 
     def _test_true(self, word: str) -> None:
         assert self._dawg is not None
+        self._check_fast_path(word)
         if word not in self._dawg:
             print("Error: \"{0}\" was not found".format(word))
 
     def _test_false(self, word: str) -> None:
         assert self._dawg is not None
+        self._check_fast_path(word)
         if word in self._dawg:
             # Tests the __contains__ operator
             print("Error: \"{0}\" was found".format(word))
@@ -54,7 +54,7 @@
 
 from __future__ import annotations
 
-from typing import List
+from typing import List, Tuple
 
 import ast
 import sys
@@ -69,16 +69,24 @@ def dawg_names(source_path: str) -> List[str]:
     """Extract the DAWG file names from the _ALL_DAWGS literal in the
     given wordbase.py source file, without importing it.
 
+    Anything that does not match the expected shape is skipped, and the
+    caller treats an empty result as an error - if wordbase.py is ever
+    restructured, the build must fail loudly rather than silently
+    download nothing."""
+    return [name + DAWG_SUFFIX for name, _ in dawg_entries(source_path)]
+
+
+def dawg_entries(source_path: str) -> List[Tuple[str, str]]:
+    """Extract (vocabulary name, alphabet name) tuples from the _ALL_DAWGS
+    literal in the given wordbase.py source file, without importing it.
+
     _ALL_DAWGS is an annotated assignment of a list of (name, alphabet)
     tuples, so we look for an ast.AnnAssign whose target is that name and
-    read the first element of each tuple. Anything that does not match
-    that exact shape is skipped, and the caller treats an empty result as
-    an error - if wordbase.py is ever restructured, the build must fail
-    loudly rather than silently download nothing."""
+    read the elements of each tuple."""
     with open(source_path, "r", encoding="utf-8") as f:
         tree = ast.parse(f.read(), filename=source_path)
 
-    names: List[str] = []
+    entries: List[Tuple[str, str]] = []
     for node in ast.walk(tree):
         if not isinstance(node, ast.AnnAssign):
             continue
@@ -93,9 +101,11 @@ def dawg_names(source_path: str) -> List[str]:
                 continue
             first = elt.elts[0]
             if isinstance(first, ast.Constant) and isinstance(first.value, str):
-                names.append(first.value + DAWG_SUFFIX)
+                second = elt.elts[1] if len(elt.elts) > 1 else None
+                alphabet = second.id if isinstance(second, ast.Name) else ""
+                entries.append((first.value, alphabet))
 
-    return names
+    return entries
 
 
 def main() -> int: